@@ -0,0 +1,108 @@
+import json
+import os
+import httpx
+
+AGENT_APP_NAME = "smartsolve"
+
+# Connection pool to the ADK agent service
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", 200))
+AGENT_KEEPALIVE_CONNECTIONS = int(os.getenv("AGENT_KEEPALIVE_CONNECTIONS", 50))
+
+# Per-request timeouts in seconds
+AGENT_CONNECT_TIMEOUT = float(os.getenv("AGENT_CONNECT_TIMEOUT", 5))
+AGENT_POOL_TIMEOUT = float(os.getenv("AGENT_POOL_TIMEOUT", 10))
+AGENT_SESSION_TIMEOUT = float(os.getenv("AGENT_SESSION_TIMEOUT", 10))
+AGENT_RUN_TIMEOUT = float(os.getenv("AGENT_RUN_TIMEOUT", 30))
+# Longest gap allowed between two streamed events
+AGENT_STREAM_READ_TIMEOUT = float(os.getenv("AGENT_STREAM_READ_TIMEOUT", 60))
+
+class SessionNotFound(RuntimeError):
+    """The agent has no session with the given ID, usually after a restart."""
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class AgentClient:
+    """Async client for the ADK agent service backed by one keep-alive pool.
+
+    Call start() once at app startup and close() at shutdown. HTTP/2 is
+    used when the h2 package is installed and the agent URL is https.
+    """
+    def __init__(self, base_url=None):
+        self.base_url = base_url or os.getenv("AGENT_URL", "http://localhost:8080")
+        self._client = None
+
+    async def start(self):
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=AGENT_POOL_SIZE,
+                max_keepalive_connections=AGENT_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(
+                AGENT_RUN_TIMEOUT, connect=AGENT_CONNECT_TIMEOUT, pool=AGENT_POOL_TIMEOUT
+            )
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            raise RuntimeError("AgentClient.start() has not been called")
+        return self._client
+
+    async def create_session(self, user_email, session_id):
+        return await self.client.post(
+            f"/apps/{AGENT_APP_NAME}/users/{user_email}/sessions/{session_id}",
+            json={},
+            timeout=AGENT_SESSION_TIMEOUT
+        )
+
+    async def run(self, user_email, session_id, message):
+        return await self.client.post(
+            "/run",
+            json=run_payload(user_email, session_id, message),
+            timeout=AGENT_RUN_TIMEOUT
+        )
+
+    async def stream_run(self, user_email, session_id, message):
+        """Yield ADK events from the /run_sse endpoint as they arrive.
+
+        The response body is read line by line, so nothing is buffered beyond
+        the current event. Closing the generator closes the upstream request.
+        """
+        payload = run_payload(user_email, session_id, message)
+        payload["streaming"] = True
+        timeout = httpx.Timeout(
+            AGENT_STREAM_READ_TIMEOUT, connect=AGENT_CONNECT_TIMEOUT, pool=AGENT_POOL_TIMEOUT
+        )
+        async with self.client.stream("POST", "/run_sse", json=payload, timeout=timeout) as response:
+            if response.status_code == 404:
+                raise SessionNotFound(session_id)
+            if response.status_code != 200:
+                raise RuntimeError(f"ADK request failed: {response.status_code}")
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    yield json.loads(line[5:])
+
+def run_payload(user_email, session_id, message):
+    return {
+        "appName": AGENT_APP_NAME,
+        "userId": user_email,
+        "sessionId": session_id,
+        "newMessage": {
+            "role": "user",
+            "parts": [{"text": message}]
+        }
+    }
@@ -0,0 +1,167 @@
+"""Persistent ADK session service that keeps per-turn history bounded.
+
+Sessions are stored in SQLite, so they survive restarts. When the runner
+loads a session, only the newest AGENT_SESSION_MAX_EVENTS events are read,
+starting at a user turn so no tool response is left without its call.
+Tool responses older than the last AGENT_SESSION_KEEP_RECENT events that
+are larger than AGENT_SESSION_TOOL_RESPONSE_BYTES are replaced with a short
+preview. The database keeps at most AGENT_SESSION_RETAIN_EVENTS events per
+session; older ones are deleted.
+
+register() adds the compacting-sqlite:// scheme to the ADK service
+registry. session_service_uri() falls back to plain sqlite:// on ADK
+versions without the registry or SqliteSessionService.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+from urllib.parse import urlparse
+
+try:
+    from google.adk.sessions.base_session_service import GetSessionConfig
+    from google.adk.sessions.sqlite_session_service import SqliteSessionService
+except ImportError:
+    SqliteSessionService = None
+
+AGENT_SESSION_DB = os.getenv("AGENT_SESSION_DB", "data/agent_sessions.db")
+# Events loaded into each turn's prompt
+AGENT_SESSION_MAX_EVENTS = int(os.getenv("AGENT_SESSION_MAX_EVENTS", 60))
+# Newest events whose tool responses are never shortened
+AGENT_SESSION_KEEP_RECENT = int(os.getenv("AGENT_SESSION_KEEP_RECENT", 12))
+AGENT_SESSION_TOOL_RESPONSE_BYTES = int(os.getenv("AGENT_SESSION_TOOL_RESPONSE_BYTES", 2000))
+# Events kept on disk per session
+AGENT_SESSION_RETAIN_EVENTS = int(os.getenv("AGENT_SESSION_RETAIN_EVENTS", 500))
+
+COMPACTING_SCHEME = "compacting-sqlite"
+# Characters of a shortened tool response kept as its preview
+PREVIEW_CHARS = 300
+
+# The service created by the registry factory, for metrics
+active_service = None
+
+def compact_events(events, keep_recent=AGENT_SESSION_KEEP_RECENT, max_bytes=AGENT_SESSION_TOOL_RESPONSE_BYTES):
+    """Shorten bulky tool responses in place, except in the newest events.
+
+    Returns the number of bytes removed.
+    """
+    trimmed = 0
+    for event in events[:max(len(events) - keep_recent, 0)]:
+        for part in (event.content.parts or []) if event.content else []:
+            response = part.function_response
+            if response is None or response.response is None:
+                continue
+            payload = json.dumps(response.response, default=str)
+            if len(payload) <= max_bytes:
+                continue
+            response.response = {"compacted": True, "preview": payload[:PREVIEW_CHARS]}
+            trimmed += len(payload) - PREVIEW_CHARS
+    return trimmed
+
+def start_at_user_turn(events):
+    """Drop leading events until the first message typed by the user."""
+    for i, event in enumerate(events):
+        if event.author == 'user' and event.content and any(part.text for part in event.content.parts or []):
+            return events[i:]
+    return events
+
+if SqliteSessionService is not None:
+    class CompactingSessionService(SqliteSessionService):
+        def __init__(self, db_path=AGENT_SESSION_DB, max_events=AGENT_SESSION_MAX_EVENTS,
+                     retain_events=AGENT_SESSION_RETAIN_EVENTS):
+            if os.path.dirname(db_path):
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            super().__init__(db_path=db_path)
+            self.db_path = db_path
+            self.max_events = max_events
+            self.retain_events = retain_events
+            self.counters = {"compacted_bytes": 0, "dropped_events": 0, "pruned_events": 0}
+
+        async def get_session(self, *, app_name, user_id, session_id, config=None):
+            # Explicit configs (e.g. the dev UI asking for full history) are honoured
+            window = config is None
+            if window:
+                config = GetSessionConfig(num_recent_events=self.max_events)
+            session = await super().get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id, config=config
+            )
+            if session is None or not window:
+                return session
+
+            loaded = len(session.events)
+            session.events = start_at_user_turn(session.events)
+            self.counters["dropped_events"] += loaded - len(session.events)
+            self.counters["compacted_bytes"] += compact_events(session.events)
+            if loaded >= self.max_events:
+                # The window is full, so older rows exist; trim what is kept on disk
+                self.counters["pruned_events"] += await asyncio.to_thread(
+                    self._prune, app_name, user_id, session.id
+                )
+            return session
+
+        def _connect(self):
+            return sqlite3.connect(self.db_path, timeout=5)
+
+        def _prune(self, app_name, user_id, session_id):
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(
+                        "SELECT timestamp FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+                        "ORDER BY timestamp DESC LIMIT 1 OFFSET ?",
+                        (app_name, user_id, session_id, self.retain_events - 1)
+                    ).fetchone()
+                    if row is None:
+                        return 0
+                    return conn.execute(
+                        "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND timestamp < ?",
+                        (app_name, user_id, session_id, row[0])
+                    ).rowcount
+            finally:
+                conn.close()
+
+        def _stored_totals(self):
+            conn = self._connect()
+            try:
+                sessions = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+                events, event_bytes = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(event_data)), 0) FROM events"
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # Tables are created on first use
+                sessions, events, event_bytes = 0, 0, 0
+            finally:
+                conn.close()
+            return {"sessions": sessions, "events": events, "event_bytes": event_bytes}
+
+        async def metrics(self):
+            """Stored session, event and byte counts plus compaction counters."""
+            totals = await asyncio.to_thread(self._stored_totals)
+            totals["db_bytes"] = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+            return dict(totals, **self.counters)
+
+def _factory(uri, **kwargs):
+    global active_service
+    path = urlparse(uri).path
+    active_service = CompactingSessionService(db_path=path[1:] if path.startswith('/') else path)
+    return active_service
+
+def register():
+    """Register compacting-sqlite:// with the ADK service registry; False if unsupported."""
+    if SqliteSessionService is None:
+        return False
+    try:
+        from google.adk.cli.service_registry import get_service_registry
+    except ImportError:
+        return False
+    get_service_registry().register_session_service(COMPACTING_SCHEME, _factory)
+    return True
+
+def session_service_uri(db_path=AGENT_SESSION_DB):
+    """The URI to pass to get_fast_api_app, registering the compacting service if possible."""
+    if register():
+        return f"{COMPACTING_SCHEME}:///{db_path}"
+    print("DEBUG: ADK session registry unavailable, using plain SQLite sessions without compaction")
+    if os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    return f"sqlite:///{db_path}"
@@ -0,0 +1,389 @@
+import asyncio
+import atexit
+import functools
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+import httplib2
+from googleapiclient.errors import HttpError
+from metrics import (GOOGLE_API_CALLS, GOOGLE_API_CIRCUIT, GOOGLE_API_LATENCY, GOOGLE_API_QUOTA_USED,
+                     GOOGLE_API_RETRIES, GOOGLE_API_THROTTLED, google_api_name, labeled_gauge_lines)
+
+# Upper bound on blocking Google API calls in flight per process
+GOOGLE_API_MAX_WORKERS = int(os.getenv("GOOGLE_API_MAX_WORKERS", 16))
+
+# Requests per second each user may make to each API, as api=rate pairs.
+# Defaults follow Google's per-user quotas (Gmail's 15,000 units a minute
+# is about 50 reads a second; People allows 90 reads a minute).
+GOOGLE_API_RATES = os.getenv("GOOGLE_API_RATES", "gmail=50,calendar=10,tasks=10,drive=20,people=1.5")
+GOOGLE_API_DEFAULT_RATE = float(os.getenv("GOOGLE_API_DEFAULT_RATE", 10))
+# Bucket capacity, in seconds of the rate, that can be spent at once.
+# Google counts these quotas per minute, so bursts such as a first
+# mailbox sync fit; anything beyond them gets a 429 and backs off.
+GOOGLE_API_BURST_SECONDS = float(os.getenv("GOOGLE_API_BURST_SECONDS", 30))
+# Longest a request waits for its bucket before failing fast
+GOOGLE_API_MAX_WAIT = float(os.getenv("GOOGLE_API_MAX_WAIT", 10))
+GOOGLE_API_BUCKET_LIMIT = int(os.getenv("GOOGLE_API_BUCKET_LIMIT", 10000))
+
+GOOGLE_API_MAX_RETRIES = int(os.getenv("GOOGLE_API_MAX_RETRIES", 4))
+GOOGLE_API_BACKOFF_BASE = float(os.getenv("GOOGLE_API_BACKOFF_BASE", 0.5))
+# Longest single wait between attempts; a longer Retry-After is not waited out
+GOOGLE_API_BACKOFF_MAX = float(os.getenv("GOOGLE_API_BACKOFF_MAX", 20))
+
+# Consecutive outage failures (5xx or network) that open an API's circuit
+GOOGLE_API_BREAKER_THRESHOLD = int(os.getenv("GOOGLE_API_BREAKER_THRESHOLD", 5))
+GOOGLE_API_BREAKER_COOLDOWN = float(os.getenv("GOOGLE_API_BREAKER_COOLDOWN", 30))
+
+# Users seen within this many seconds count as active in the usage gauges
+ACTIVE_USER_WINDOW = 3600
+# 403 reasons that mean "slow down" rather than "not allowed"
+RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+# Retry reasons meaning Google turned the request away before acting on it
+REJECTED_REASONS = ("429", "403")
+IDEMPOTENT_HTTP_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+# POST methods that are safe to send twice
+IDEMPOTENT_POST_METHODS = (
+    "calendar.freebusy.query", "gmail.users.messages.batchModify"
+)
+
+_executor = ThreadPoolExecutor(max_workers=GOOGLE_API_MAX_WORKERS, thread_name_prefix="google-api")
+atexit.register(_executor.shutdown, wait=False)
+
+class QuotaExceededError(Exception):
+    """The user's request budget for an API is spent for now."""
+    def __init__(self, api, retry_after):
+        super().__init__(f"Google {api} rate limit reached for this user; try again in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+class CircuitOpenError(Exception):
+    """The API failed repeatedly and calls are paused."""
+    def __init__(self, api, retry_after):
+        super().__init__(f"Google {api} is unavailable right now; try again in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+def parse_rates(text):
+    rates = {}
+    for pair in filter(None, (item.strip() for item in text.split(","))):
+        api, _, rate = pair.partition("=")
+        rates[api.strip()] = float(rate)
+    return rates
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, cost, max_wait):
+        """Return how long to wait before cost tokens are available.
+
+        The tokens are taken right away, borrowing from the future, unless
+        the wait is longer than max_wait; then nothing is taken.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = max(cost - self.tokens, 0) / self.rate
+        if wait <= max_wait:
+            self.tokens -= cost
+        return wait
+
+class QuotaLimiter:
+    """Per-user, per-API token buckets, kept in a bounded LRU."""
+    def __init__(self, rates=None, default_rate=GOOGLE_API_DEFAULT_RATE, burst_seconds=GOOGLE_API_BURST_SECONDS,
+                 max_wait=GOOGLE_API_MAX_WAIT, limit=GOOGLE_API_BUCKET_LIMIT):
+        self.rates = parse_rates(GOOGLE_API_RATES) if rates is None else rates
+        self.default_rate = default_rate
+        self.burst_seconds = burst_seconds
+        self.max_wait = max_wait
+        self.limit = limit
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, user_email, api, cost=1):
+        """Return the seconds to wait before sending, or raise QuotaExceededError."""
+        if not user_email:
+            GOOGLE_API_QUOTA_USED.inc(api, amount=cost)
+            return 0.0
+        key = (user_email, api)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate = self.rates.get(api, self.default_rate)
+                bucket = self._buckets[key] = TokenBucket(rate, rate * self.burst_seconds)
+                while len(self._buckets) > self.limit:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            # A batch may cost more than a full bucket; it waits for a full one
+            wait = bucket.reserve(min(cost, bucket.capacity), self.max_wait)
+        if wait > self.max_wait:
+            GOOGLE_API_THROTTLED.inc(api, "rejected")
+            raise QuotaExceededError(api, wait)
+        GOOGLE_API_QUOTA_USED.inc(api, amount=cost)
+        if wait > 0:
+            GOOGLE_API_THROTTLED.inc(api, "delayed")
+        return wait
+
+    def active_users(self):
+        """Users per API that sent a request within ACTIVE_USER_WINDOW."""
+        cutoff = time.monotonic() - ACTIVE_USER_WINDOW
+        counts = {}
+        with self._lock:
+            for (_, api), bucket in self._buckets.items():
+                if bucket.updated >= cutoff:
+                    counts[api] = counts.get(api, 0) + 1
+        return counts
+
+class CircuitBreaker:
+    """Stops calls to an API after repeated outages, then lets one probe through.
+
+    Closed: calls pass. Open: calls fail fast until the cooldown ends.
+    Half-open: a single probe is sent; only a successful call closes the
+    circuit, and an outage opens it again. When the probe fails for
+    another reason (a 404, a 429) the next call becomes the probe. A probe
+    that never reports back is replaced after another cooldown.
+    """
+    def __init__(self, api, threshold=GOOGLE_API_BREAKER_THRESHOLD, cooldown=GOOGLE_API_BREAKER_COOLDOWN):
+        self.api = api
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            remaining = self.opened_at + self.cooldown - now
+            if remaining <= 0:
+                self.opened_at = now
+                self._set_state("half_open")
+                return
+            raise CircuitOpenError(self.api, max(remaining, 1))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != "closed":
+                self._set_state("closed")
+
+    def record_outage(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                if self.state != "open":
+                    self._set_state("open")
+
+    def record_inconclusive(self):
+        """The API answered, but with an error that says nothing about its health."""
+        with self._lock:
+            if self.state == "half_open":
+                self.opened_at = time.monotonic() - self.cooldown
+
+    def _set_state(self, state):
+        self.state = state
+        GOOGLE_API_CIRCUIT.inc(self.api, state)
+        print(f"DEBUG: Google {self.api} circuit {state}")
+
+quota = QuotaLimiter()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def breaker_for(api):
+    breaker = _breakers.get(api)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(api, CircuitBreaker(api))
+    return breaker
+
+def request_user(request):
+    """The user a request is made for, as stamped by google_services."""
+    return getattr(request, 'user_email', None)
+
+def is_idempotent(request):
+    """Whether sending the request twice has the same effect as once.
+
+    Inserts and sends are not, so a timeout after Google acted on them
+    must not be retried. Batch objects are unknown and count as unsafe.
+    """
+    method = getattr(request, 'method', None)
+    return method in IDEMPOTENT_HTTP_METHODS or getattr(request, 'methodId', None) in IDEMPOTENT_POST_METHODS
+
+def may_retry(reason, idempotent):
+    return bool(reason) and (idempotent or reason in REJECTED_REASONS)
+
+def _retry_after(error):
+    """Seconds from a Retry-After header (delta or HTTP date), or None."""
+    value = error.resp.get('retry-after') if isinstance(error, HttpError) else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def classify(error):
+    """Return (retry reason or None, whether it counts as an outage)."""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status >= 500:
+            return str(status), True
+        if status == 429:
+            return "429", False
+        if status == 403 and any(reason in (error.content or b"") for reason in RATE_LIMIT_REASONS):
+            return "403", False
+        return None, False
+    if isinstance(error, (OSError, httplib2.HttpLib2Error)):
+        return "network", True
+    return None, False
+
+def backoff_delay(attempt, error=None):
+    """Wait before the next attempt: Retry-After if given, else full-jitter exponential backoff.
+
+    Returns None when the server asks for a longer wait than
+    GOOGLE_API_BACKOFF_MAX, so the caller fails instead of blocking.
+    """
+    retry_after = _retry_after(error) if error is not None else None
+    if retry_after is not None:
+        return retry_after if retry_after <= GOOGLE_API_BACKOFF_MAX else None
+    return random.uniform(0, min(GOOGLE_API_BACKOFF_BASE * 2 ** attempt, GOOGLE_API_BACKOFF_MAX))
+
+def _execute(request, user_email, api, cost, idempotent, admitted=False):
+    breaker = breaker_for(api)
+    attempt = 0
+    while True:
+        breaker.before_call()
+        if not admitted:
+            time.sleep(quota.acquire(user_email, api, cost))
+        admitted = False
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = request.execute()
+            outcome = "ok"
+            breaker.record_success()
+            return result
+        except Exception as e:
+            reason, outage = classify(e)
+            if outage:
+                breaker.record_outage()
+            else:
+                breaker.record_inconclusive()
+            retry = may_retry(reason, idempotent) and attempt < GOOGLE_API_MAX_RETRIES
+            delay = backoff_delay(attempt, e) if retry else None
+            if delay is None:
+                raise
+            GOOGLE_API_RETRIES.inc(api, reason)
+        finally:
+            GOOGLE_API_LATENCY.observe(time.perf_counter() - start, api)
+            GOOGLE_API_CALLS.inc(api, outcome)
+        attempt += 1
+        time.sleep(delay)
+
+def execute(request, user_email=None, api=None, cost=1, idempotent=None):
+    """Execute a Google API request or batch request on the calling thread.
+
+    The request waits for the user's token bucket for its API and fails
+    fast while the API's circuit is open. It is retried with backoff on
+    429 and rate-limit 403, and also on 5xx and network errors when it is
+    idempotent. Batches pass the user and API of their parts, cost one
+    token per part, and are idempotent only when every part is.
+    """
+    if idempotent is None:
+        idempotent = is_idempotent(request)
+    return _execute(request, user_email or request_user(request), api or google_api_name(request), cost,
+                    idempotent)
+
+def execute_batch(service, requests, batch_size=50):
+    """Execute many requests through the service's batch endpoint.
+
+    Requests are sent batch_size at a time. Parts that fail with a
+    retryable error are sent again in a later batch after backing off;
+    non-idempotent parts only when Google rejected them for rate limits.
+    Returns one (response, exception) pair per request, in the order
+    given, so callers can report partial failures item by item.
+    """
+    results = [(None, None)] * len(requests)
+    if not requests:
+        return results
+    user_email = request_user(requests[0])
+    api = google_api_name(requests[0])
+
+    def collect(request_id, response, exception):
+        results[int(request_id)] = (response, exception)
+
+    pending = list(range(len(requests)))
+    attempt = 0
+    while True:
+        # Chunks whose whole batch call failed; execute already retried them
+        abandoned = set()
+        for i in range(0, len(pending), batch_size):
+            chunk = pending[i:i + batch_size]
+            batch = service.new_batch_http_request(callback=collect)
+            for j in chunk:
+                batch.add(requests[j], request_id=str(j))
+            try:
+                execute(batch, user_email=user_email, api=api, cost=len(chunk),
+                        idempotent=all(is_idempotent(requests[j]) for j in chunk))
+            except Exception as e:
+                # Earlier chunks already reached Google, so keep going and
+                # report the failure against every request in this one
+                for j in chunk:
+                    results[j] = (None, e)
+                abandoned.update(chunk)
+        failed = [(j, results[j][1]) for j in pending if j not in abandoned
+                  and may_retry(classify(results[j][1])[0], is_idempotent(requests[j]))]
+        if not failed or attempt >= GOOGLE_API_MAX_RETRIES:
+            return results
+        delays = [backoff_delay(attempt, error) for _, error in failed]
+        if None in delays:
+            return results
+        for _, error in failed:
+            GOOGLE_API_RETRIES.inc(api, classify(error)[0])
+        pending = [j for j, _ in failed]
+        attempt += 1
+        time.sleep(max(delays))
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call on the bounded Google API worker pool.
+
+    Keeps the event loop free while the call waits on the network. Calls
+    beyond GOOGLE_API_MAX_WORKERS queue up instead of opening more threads.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+async def execute_async(request):
+    """Execute a Google API request without blocking the event loop.
+
+    The first wait for the token bucket happens on the event loop, so a
+    throttled request does not hold a worker thread.
+    """
+    user_email = request_user(request)
+    api = google_api_name(request)
+    await asyncio.sleep(quota.acquire(user_email, api))
+    return await run_blocking(_execute, request, user_email, api, 1, is_idempotent(request), admitted=True)
+
+def quota_metric_lines():
+    """Gauges for /metrics: active users per API and open circuits."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return (
+        labeled_gauge_lines("smartsolve_google_api_active_users", "Users that called the API in the last hour.",
+                    sorted(quota.active_users().items()), "api")
+        + labeled_gauge_lines("smartsolve_google_api_circuit_open", "1 while calls to the API are paused.",
+                      [(breaker.api, int(breaker.state == "open")) for breaker in breakers], "api")
+    )
@@ -1,15 +1,29 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import google_auth_oauthlib.flow
-from googleapiclient.discovery import build
-from token_vault import TokenVault
+from token_vault import get_vault
+from client_registry import get_firestore_client, registry
+from google_services import build_service, get_service
+from tasks_store import tasklist_id_of, tasks_store
+from calendar_store import calendar_store
+from agent_client import AgentClient, SessionNotFound
+from optimize_cache import create_optimize_cache, fingerprint
+from prompt_serializer import serialize_schedule
+from session_store import create_session_store
+from api_executor import quota_metric_lines, run_blocking
+import metrics
+import asyncio
+import hashlib
 import uuid
+import weakref
+import json
+from contextlib import aclosing
 import os
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import uvicorn
-import requests
 from typing import List, Dict, Any
 
 # Load environment variables
@@ -26,10 +40,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-vault = TokenVault()
+metrics.add_http_metrics(app)
+vault = get_vault()
+agent = AgentClient()
+optimize_cache = create_optimize_cache()
 
-# Session storage
-user_sessions = {}
+# User -> ADK session ID, shared between workers when backed by SQLite or Redis
+session_store = create_session_store()
+# Per-user creation locks; entries disappear once no request holds them
+_session_locks = weakref.WeakValueDictionary()
 
 REDIRECT_URI = os.getenv("REDIRECT_URI", "http://localhost:5000/callback")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
@@ -63,7 +82,20 @@ def auth():
 
 @app.get('/health')
 def health():
-    return {"status": "OK"}
+    return {"status": "OK", "clients": registry.stats()}
+
+@app.get('/metrics', response_class=PlainTextResponse)
+def prometheus_metrics():
+    return metrics.render(quota_metric_lines())
+
+@app.on_event("startup")
+async def open_agent_client():
+    await agent.start()
+
+@app.on_event("shutdown")
+async def close_clients():
+    await agent.close()
+    registry.close_all()
 
 @app.get('/callback')
 def callback(request: Request):
@@ -75,7 +107,7 @@ def callback(request: Request):
         
         # Get user info to use email as key
         credentials = flow.credentials
-        user_info_service = build("oauth2", "v2", credentials=credentials)
+        user_info_service = build_service(credentials.token, "oauth2", "v2")
         user_info = user_info_service.userinfo().get().execute()
         user_email = user_info.get('email')
         
@@ -95,22 +127,120 @@ def get_token(user_email: str):
         return {"access_token": credentials.token}
     raise HTTPException(status_code=404, detail="Token not found")
 
+def read_priority_tasks(user_email):
+    db = get_firestore_client()
+    doc_ref = db.collection('priority_tasks').document(user_email)
+    metrics.FIRESTORE_OPS.inc('priority_tasks', 'read')
+    doc = doc_ref.get()
+    return doc.to_dict().get("tasks", []) if doc.exists else []
+
 @app.get('/priority_tasks/{user_email}')
 def get_priority_tasks(user_email: str):
     try:
-        from google.cloud import firestore
-        db = firestore.Client(database='smartsolve')
-        doc_ref = db.collection('priority_tasks').document(user_email)
-        doc = doc_ref.get()
-        
-        if doc.exists:
-            data = doc.to_dict()
-            return {"tasks": data.get("tasks", [])}
-        else:
-            return {"tasks": []}
+        return {"tasks": read_priority_tasks(user_email)}
     except Exception as e:
         return {"error": f"Failed to fetch priority tasks: {str(e)}"}
 
+@app.get('/tasks/{user_email}')
+def get_tasks(user_email: str, status: str = None, due_within_days: int = None, limit: int = 100):
+    """Query the user's synced tasks, e.g. incomplete and due this week."""
+    credentials = vault.get_token(user_email)
+    if not credentials:
+        raise HTTPException(status_code=404, detail="Token not found")
+    try:
+        service = get_service(user_email, credentials.token, 'tasks', 'v1')
+        tasks_store.sync(user_email, service)
+        due_before = None
+        if due_within_days is not None:
+            due_before = (datetime.now() + timedelta(days=due_within_days)).timestamp()
+        return {"tasks": tasks_store.query(user_email, status=status, due_before=due_before, limit=limit)}
+    except Exception as e:
+        return {"error": f"Failed to fetch tasks: {str(e)}"}
+
+# What the dashboard shows: the next few events, open tasks and a done count
+DASHBOARD_EVENT_LIMIT = 5
+DASHBOARD_TASK_LIMIT = 50
+DASHBOARD_COMPLETED_LIMIT = 100
+
+def event_times(value):
+    return {key: value[key] for key in ('dateTime', 'date') if key in value}
+
+def event_summary(event):
+    return {
+        "id": event['id'],
+        "summary": event.get('summary', 'No Title'),
+        "start": event_times(event.get('start', {})),
+        "end": event_times(event.get('end', {}))
+    }
+
+def task_summary(task):
+    return {
+        "id": task['id'],
+        "tasklist": tasklist_id_of(task),
+        "title": task.get('title', ''),
+        "notes": task.get('notes', ''),
+        "due": task.get('due', '')
+    }
+
+def entity_tag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+@app.get('/dashboard/{user_email}')
+async def dashboard(user_email: str, request: Request, refresh: bool = False):
+    """Everything the dashboard shows, in one response.
+
+    Events and tasks come from the synced stores, so an unchanged account
+    costs one incremental sync per store. The body is serialized
+    deterministically and carries a strong ETag; a matching If-None-Match
+    gets an empty 304. refresh=true skips the stores' freshness window and
+    fetches changes right away, e.g. after the browser edited a task
+    directly; it is still an incremental sync.
+    """
+    credentials = await run_blocking(vault.get_token, user_email)
+    if not credentials:
+        raise HTTPException(status_code=404, detail="Token not found")
+    calendar_service = get_service(user_email, credentials.token, 'calendar', 'v3')
+    tasks_service = get_service(user_email, credentials.token, 'tasks', 'v1')
+    calendar_sync, tasks_sync, priority_tasks = await asyncio.gather(
+        run_blocking(calendar_store.sync, user_email, calendar_service, force=refresh),
+        run_blocking(tasks_store.sync, user_email, tasks_service, force=refresh),
+        run_blocking(read_priority_tasks, user_email),
+        return_exceptions=True
+    )
+
+    # A failed sync still serves what the store already holds
+    stale = [name for name, result in (("calendar", calendar_sync), ("tasks", tasks_sync))
+             if isinstance(result, Exception)]
+    for name in stale:
+        print(f"DEBUG: Dashboard {name} sync failed for {user_email}")
+    if isinstance(priority_tasks, Exception):
+        print(f"DEBUG: Dashboard priority tasks failed: {str(priority_tasks)}")
+        priority_tasks = []
+        stale.append("priority_tasks")
+
+    payload = {
+        "events": [event_summary(e) for e in calendar_store.upcoming(user_email, limit=DASHBOARD_EVENT_LIMIT)],
+        "tasks": [task_summary(t) for t in tasks_store.query(user_email, status='needsAction',
+                                                               limit=DASHBOARD_TASK_LIMIT)],
+        "completed_count": len(tasks_store.query(user_email, status='completed', limit=DASHBOARD_COMPLETED_LIMIT)),
+        "priority_tasks": priority_tasks,
+        "stale": stale
+    }
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str).encode()
+    etag = entity_tag(body)
+    # no-cache lets the browser keep the body but revalidate it on every load
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 class CreateSessionRequest(BaseModel):
     user_email: str
 
@@ -125,115 +255,138 @@ class OptimizeRequest(BaseModel):
     events: List[Dict[str, Any]]
     user_email: str
 
-@app.post('/create_session')
-def create_session(request: CreateSessionRequest):
+def last_model_text(events):
+    """Extract text from the last model response in an ADK event list."""
+    for event in reversed(events):
+        if event.get("content", {}).get("role") == "model":
+            parts = event.get("content", {}).get("parts", [])
+            for part in parts:
+                if "text" in part:
+                    return part["text"]
+    return None
+
+async def new_session(user_email):
     session_id = str(uuid.uuid4())
-    user_sessions[request.user_email] = session_id
-    
+    response = await agent.create_session(user_email, session_id)
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to create ADK session: {response.status_code}")
+    await session_store.set(user_email, session_id)
+    return session_id
+
+async def ensure_session(user_email):
+    """Return the user's ADK session, creating it once if there is none."""
+    session_id = await session_store.get(user_email)
+    if session_id:
+        return session_id
+    lock = _session_locks.get(user_email)
+    if lock is None:
+        lock = _session_locks[user_email] = asyncio.Lock()
+    async with lock:
+        # Another request may have created it while we waited
+        session_id = await session_store.get(user_email)
+        return session_id or await new_session(user_email)
+
+@app.post('/create_session')
+async def create_session(request: CreateSessionRequest):
     # Create session with ADK agent
-    agent_url = os.getenv("AGENT_URL", "http://localhost:8080")
     try:
-        response = requests.post(
-            f"{agent_url}/apps/smartsolve/users/{request.user_email}/sessions/{session_id}",
-            json={},
-            timeout=10
-        )
-        if response.status_code == 200:
-            return {"session_id": session_id}
-        else:
-            return {"error": f"Failed to create ADK session: {response.status_code}"}
+        return {"session_id": await new_session(request.user_email)}
+    except RuntimeError as e:
+        return {"error": str(e)}
     except Exception as e:
         return {"error": f"ADK connection error: {str(e)}"}
 
 @app.post('/chat')
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest):
     try:
         # Get or create session
-        session_id = request.session_id or user_sessions.get(request.user_email)
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            user_sessions[request.user_email] = session_id
+        session_id = request.session_id or await ensure_session(request.user_email)
         
         # Send message to ADK agent using /run endpoint
-        agent_url = os.getenv("AGENT_URL", "http://localhost:8080")
-        response = requests.post(
-            f"{agent_url}/run",
-            json={
-                "appName": "smartsolve",
-                "userId": request.user_email,
-                "sessionId": session_id,
-                "newMessage": {
-                    "role": "user",
-                    "parts": [{"text": request.message}]
-                }
-            },
-            timeout=30
-        )
+        response = await agent.run(request.user_email, session_id, request.message)
         
+        if response.status_code == 404:
+            # The agent no longer has the session; the next request creates a new one
+            await session_store.delete(request.user_email)
+            return {"error": "Session expired, please retry"}
         if response.status_code == 200:
-            events = response.json()
-            # Extract text from the last model response
-            for event in reversed(events):
-                if event.get("content", {}).get("role") == "model":
-                    parts = event.get("content", {}).get("parts", [])
-                    for part in parts:
-                        if "text" in part:
-                            return {"content": part["text"]}
-            return {"content": "No response from agent"}
+            text = last_model_text(response.json())
+            return {"content": text if text is not None else "No response from agent"}
         else:
             return {"error": f"ADK request failed: {response.status_code}"}
             
     except Exception as e:
         return {"error": f"Chat error: {str(e)}"}
 
-@app.post('/optimize')
-def optimize(request: OptimizeRequest):
+def sse_frame(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def relay_frames(event):
+    """Translate one ADK event into the compact frames sent to the browser.
+
+    Tool responses are reduced to their name so large payloads never reach
+    the client.
+    """
+    content = event.get("content") or {}
+    if content.get("role") != "model":
+        for part in content.get("parts") or []:
+            if "functionResponse" in part:
+                yield sse_frame("tool", {"name": part["functionResponse"].get("name"), "status": "finished"})
+        return
+    for part in content.get("parts") or []:
+        if "functionCall" in part:
+            yield sse_frame("tool", {"name": part["functionCall"].get("name"), "status": "started"})
+        elif part.get("text"):
+            # Partial events carry new text; the final event repeats the whole reply
+            yield sse_frame("text" if event.get("partial") else "message", {"text": part["text"]})
+
+@app.post('/chat/stream')
+async def chat_stream(request: ChatRequest, http_request: Request):
+    async def relay():
+        # StreamingResponse waits for each frame to be sent before pulling the
+        # next one, so a slow client slows reads from the agent as well.
+        try:
+            # Get or create session
+            session_id = request.session_id or await ensure_session(request.user_email)
+            # aclosing() closes the upstream /run_sse request as soon as we stop
+            # reading, including when the client goes away
+            async with aclosing(agent.stream_run(request.user_email, session_id, request.message)) as events:
+                async for event in events:
+                    if await http_request.is_disconnected():
+                        return
+                    if event.get("error"):
+                        yield sse_frame("error", {"error": event["error"]})
+                        continue
+                    for frame in relay_frames(event):
+                        yield frame
+            yield sse_frame("done", {"session_id": session_id})
+        except SessionNotFound:
+            # Same reset as /chat: the next request creates a new session
+            await session_store.delete(request.user_email)
+            yield sse_frame("error", {"error": "Session expired, please retry"})
+        except Exception as e:
+            yield sse_frame("error", {"error": f"Chat error: {str(e)}"})
+    
+    return StreamingResponse(
+        relay(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def run_optimize(request: OptimizeRequest):
     try:
-        # Get or create session
-        session_id = user_sessions.get(request.user_email)
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            user_sessions[request.user_email] = session_id
-            
-            # Create session with ADK
-            agent_url = os.getenv("AGENT_URL", "http://localhost:8080")
-            requests.post(
-                f"{agent_url}/apps/smartsolve/users/{request.user_email}/sessions/{session_id}",
-                json={},
-                timeout=10
-            )
+        session_id = await ensure_session(request.user_email)
         
         # Send optimization request to ADK agent
-        optimize_message = f"Analyze and optimize this schedule: Tasks: {request.tasks}, Events: {request.events}"
-        agent_url = os.getenv("AGENT_URL", "http://localhost:8080")
-        response = requests.post(
-            f"{agent_url}/run",
-            json={
-                "appName": "smartsolve",
-                "userId": request.user_email,
-                "sessionId": session_id,
-                "newMessage": {
-                    "role": "user",
-                    "parts": [{"text": optimize_message}]
-                }
-            },
-            timeout=30
-        )
+        optimize_message = "Analyze and optimize this schedule:\n" + serialize_schedule(request.tasks, request.events)
+        response = await agent.run(request.user_email, session_id, optimize_message)
         
+        if response.status_code == 404:
+            await session_store.delete(request.user_email)
         if response.status_code == 200:
-            events = response.json()
-            # Extract text from the last model response
-            for event in reversed(events):
-                if event.get("content", {}).get("role") == "model":
-                    parts = event.get("content", {}).get("parts", [])
-                    for part in parts:
-                        if "text" in part:
-                            return {
-                                "message": part["text"],
-                                "type": "Optimization Suggestion"
-                            }
+            text = last_model_text(response.json())
             return {
-                "message": "No optimization available",
+                "message": text if text is not None else "No optimization available",
                 "type": "Optimization Suggestion"
             }
         else:
@@ -242,5 +395,11 @@ def optimize(request: OptimizeRequest):
     except Exception as e:
         return {"error": f"Optimization error: {str(e)}"}
 
+@app.post('/optimize')
+async def optimize(request: OptimizeRequest):
+    # Unchanged schedules are answered from the cache instead of the LLM
+    key = fingerprint(request.user_email, request.tasks, request.events)
+    return await optimize_cache.get_or_compute(key, lambda: run_optimize(request))
+
 if __name__ == '__main__':
     uvicorn.run("backend:app", host="0.0.0.0", port=5000, reload=True)
\ No newline at end of file
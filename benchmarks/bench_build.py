@@ -0,0 +1,47 @@
+"""Micro-benchmark for per-call service construction.
+
+Compares googleapiclient's build() against google_services.get_service()
+for the APIs the agent tools use. No network access is needed: build()
+reads the static discovery documents bundled with googleapiclient.
+
+    python benchmarks/bench_build.py [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+import google_services
+
+APIS = [('gmail', 'v1'), ('calendar', 'v3'), ('tasks', 'v1'), ('drive', 'v3'), ('people', 'v1')]
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations * 1000
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"{'api':<10}{'build()':>12}{'new token':>12}{'cached':>12}   (ms per call)")
+    for api, version in APIS:
+        baseline = timed(
+            lambda i: build(api, version, credentials=Credentials(token="token"), static_discovery=True),
+            iterations
+        )
+        # A new token each call rebuilds the Resource but reuses the parsed document
+        rebuilt = timed(
+            lambda i: google_services.get_service("bench@example.com", f"token-{i}", api, version),
+            iterations
+        )
+        cached = timed(
+            lambda i: google_services.get_service("bench@example.com", "token", api, version),
+            iterations
+        )
+        print(f"{api:<10}{baseline:>12.3f}{rebuilt:>12.3f}{cached:>12.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Prompt size for /optimize: raw repr versus the compact serializer.
+
+Builds tasks and events shaped like real Tasks and Calendar API
+responses (etags, links, creator blocks, daily recurring meetings) and
+compares the original f-string prompt with serialize_schedule, in bytes
+and estimated tokens.
+
+    python benchmarks/bench_prompt_size.py [tasks] [event days]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_serializer import PROMPT_TOKEN_BUDGET, estimate_tokens, serialize_schedule
+
+TITLES = ['Finish quarterly report', 'Review budget draft', 'Email landlord', 'Book dentist',
+          'Prepare launch slides', 'Renew passport', 'Call insurance', 'Plan team offsite']
+MEETINGS = ['1:1 with manager', 'Design review', 'Customer call', 'Lunch with Sam', 'Sprint planning']
+
+def fixture_task(i, rng, now):
+    due = now + timedelta(days=rng.randint(-5, 40))
+    tasklist = "MDk4NzY1NDMyMTA5ODc2NTQzMjE6MDow"
+    task = {
+        "kind": "tasks#task",
+        "id": f"dGFzay1pZC0{i:06d}",
+        "etag": f"\"LTE{rng.randint(10**9, 10**10)}\"",
+        "title": rng.choice(TITLES),
+        "updated": (now - timedelta(hours=rng.randint(1, 500))).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        "selfLink": f"https://www.googleapis.com/tasks/v1/lists/{tasklist}/tasks/dGFzay1pZC0{i:06d}",
+        "position": f"{i:020d}",
+        "status": "completed" if rng.random() < 0.3 else "needsAction",
+        "links": [],
+        "webViewLink": f"https://tasks.google.com/task/dGFzay1pZC0{i:06d}",
+    }
+    if rng.random() < 0.7:
+        task["due"] = due.strftime('%Y-%m-%dT00:00:00.000Z')
+    if rng.random() < 0.4:
+        task["notes"] = "Follow up with the team about the open questions from last week and attach the latest numbers."
+    return task
+
+def fixture_event(event_id, summary, start, end, recurring_id=None):
+    event = {
+        "kind": "calendar#event",
+        "etag": "\"3391234567890000\"",
+        "id": event_id,
+        "status": "confirmed",
+        "htmlLink": f"https://www.google.com/calendar/event?eid={event_id}",
+        "created": "2026-01-05T10:00:00.000Z",
+        "updated": "2026-09-30T08:12:45.123Z",
+        "summary": summary,
+        "creator": {"email": "someone@example.com", "self": True},
+        "organizer": {"email": "someone@example.com", "self": True},
+        "start": {"dateTime": start.isoformat(), "timeZone": "America/Los_Angeles"},
+        "end": {"dateTime": end.isoformat(), "timeZone": "America/Los_Angeles"},
+        "iCalUID": f"{event_id}@google.com",
+        "sequence": 0,
+        "reminders": {"useDefault": True},
+        "eventType": "default",
+    }
+    if recurring_id:
+        event["recurringEventId"] = recurring_id
+    return event
+
+def fixtures(n_tasks, days, seed=11):
+    rng = random.Random(seed)
+    now = datetime.now(timezone(timedelta(hours=-7))).replace(minute=0, second=0, microsecond=0)
+    tasks = [fixture_task(i, rng, now) for i in range(n_tasks)]
+    events = []
+    for day in range(days):
+        base = now.replace(hour=9) + timedelta(days=day)
+        # A daily standup plus a few one-off meetings
+        events.append(fixture_event(f"standup_{day}", "Daily standup", base, base + timedelta(minutes=15),
+                                    recurring_id="standup"))
+        for j in range(rng.randint(1, 3)):
+            start = base + timedelta(hours=rng.randint(1, 8))
+            events.append(fixture_event(f"evt{day}x{j}", rng.choice(MEETINGS), start, start + timedelta(minutes=45)))
+    return tasks, events
+
+def main():
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 14
+    tasks, events = fixtures(n_tasks, days)
+
+    raw = f"Analyze and optimize this schedule: Tasks: {tasks}, Events: {events}"
+    start = time.perf_counter()
+    compact = "Analyze and optimize this schedule:\n" + serialize_schedule(tasks, events)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    raw_bytes, compact_bytes = len(raw.encode()), len(compact.encode())
+    raw_tokens, compact_tokens = estimate_tokens(raw), estimate_tokens(compact)
+    print(f"{len(tasks)} tasks, {len(events)} events, budget {PROMPT_TOKEN_BUDGET} tokens")
+    print(f"raw repr prompt:  {raw_bytes:8d} bytes  ~{raw_tokens:6d} tokens")
+    print(f"compact prompt:   {compact_bytes:8d} bytes  ~{compact_tokens:6d} tokens  ({elapsed:.2f} ms)")
+    print(f"reduction:        {1 - compact_bytes / raw_bytes:8.1%} bytes  {1 - compact_tokens / raw_tokens:7.1%} tokens")
+    print("\n" + compact)
+
+if __name__ == "__main__":
+    main()
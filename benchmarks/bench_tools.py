@@ -0,0 +1,134 @@
+"""Offline latency, API call and allocation profile of the agent tools.
+
+Runs each tool against the fakes in benchmarks/fakes.py, so no network,
+OAuth or Firestore project is needed. Google API round trips take
+--latency ms, to stand in for the network. Reported per tool:
+
+- cold: the first call, with empty caches and stores
+- p50 / p95: later calls, in ms
+- http / ops: HTTP round trips and API operations per call (a batch
+  is one round trip carrying many operations)
+- fs: Firestore document reads and writes per call
+- alloc: tracemalloc peak per call in KB, measured in a separate pass
+
+--cold sets the calendar, tasks and Gmail mirror max ages to 0, so each
+call resyncs.
+
+    python benchmarks/bench_tools.py [--iterations N] [--latency MS] [--messages N] [--events N]
+                                     [--tasks N] [--cold] [--tools a,b]
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import USER_EMAIL, FakeGoogleData, install
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=20.0, help="Google API round trip in ms")
+    parser.add_argument("--jitter", type=float, default=5.0, help="extra random latency in ms")
+    parser.add_argument("--firestore-latency", type=float, default=5.0, help="Firestore operation in ms")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--tasks", type=int, default=600)
+    parser.add_argument("--cold", action="store_true", help="resync stores on every call")
+    parser.add_argument("--tools", default="", help="comma-separated subset of tools")
+    return parser.parse_args()
+
+def configure_env(args):
+    # Read at import time by the stores, so set before importing the agent
+    os.environ["GMAIL_MIRROR_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-tools-"), "mirror.db")
+    os.environ["PRECOMPUTE_ENABLED"] = "false"
+    if args.cold:
+        for name in ("CALENDAR_SYNC_MAX_AGE", "TASKS_SYNC_MAX_AGE", "GMAIL_MIRROR_MAX_AGE"):
+            os.environ[name] = "0"
+
+def tool_calls(agent):
+    """Tool name -> zero-argument callable, with arguments a model would typically pass."""
+    return {
+        "get_gmail_messages": lambda: agent.get_gmail_messages(USER_EMAIL, max_results=50),
+        "get_gmail_messages_query": lambda: agent.get_gmail_messages(USER_EMAIL, query="budget", max_results=20),
+        "get_calendar_events": lambda: agent.get_calendar_events(USER_EMAIL, max_results=20),
+        "find_free_slots": lambda: agent.find_free_slots(USER_EMAIL),
+        "get_tasks": lambda: agent.get_tasks(USER_EMAIL, max_results=30),
+        "search_drive_files": lambda: agent.search_drive_files(USER_EMAIL, "notes", max_results=20),
+        "get_contacts": lambda: agent.get_contacts(USER_EMAIL),
+        "get_priority_tasks": lambda: agent.get_priority_tasks(USER_EMAIL),
+        "generate_priority_tasks": lambda: agent.generate_priority_tasks(USER_EMAIL),
+    }
+
+def call(fn):
+    result = fn()
+    if inspect.isawaitable(result):
+        result = asyncio.run(result)
+    if isinstance(result, dict) and "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def profile(name, fn, fakes, iterations):
+    fakes.reset_counts()
+    start = time.perf_counter()
+    call(fn)
+    cold = (time.perf_counter() - start) * 1000
+
+    fakes.reset_counts()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call(fn)
+        samples.append((time.perf_counter() - start) * 1000)
+    http = sum(fakes.http.calls.values()) / iterations
+    ops = sum(fakes.http.operations.values()) / iterations
+    firestore_ops = sum(getattr(fakes.firestore, "operations", {}).values()) / iterations
+
+    # Allocations are measured apart from timing, since tracing slows everything down
+    peaks = []
+    for _ in range(min(iterations, 5)):
+        tracemalloc.start()
+        call(fn)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+
+    return [name, cold, statistics.median(samples), percentile(samples, 0.95),
+            http, ops, firestore_ops, statistics.median(peaks)]
+
+def main():
+    args = parse_args()
+    configure_env(args)
+    data = FakeGoogleData(messages=args.messages, events=args.events, tasks=args.tasks)
+    fakes = install(data, latency_ms=args.latency, jitter_ms=args.jitter,
+                    firestore_latency_ms=args.firestore_latency)
+
+    from smartsolve import agent
+
+    calls = tool_calls(agent)
+    selected = [name.strip() for name in args.tools.split(",") if name.strip()] or list(calls)
+    print(f"{args.messages} messages, {args.events} events, {args.tasks} tasks, "
+          f"{args.latency:g}+{args.jitter:g} ms API latency, {args.firestore_latency:g} ms Firestore"
+          f"{', cold stores' if args.cold else ''}")
+    print(f"{'tool':<26}{'cold':>9}{'p50':>9}{'p95':>9}{'http':>7}{'ops':>7}{'fs':>6}{'alloc KB':>10}")
+    for name in selected:
+        try:
+            row = profile(name, calls[name], fakes, args.iterations)
+        except Exception as e:
+            print(f"{name:<26}failed: {str(e)}")
+            continue
+        print(f"{row[0]:<26}{row[1]:>9.1f}{row[2]:>9.1f}{row[3]:>9.1f}{row[4]:>7.1f}{row[5]:>7.1f}"
+              f"{row[6]:>6.1f}{row[7]:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""Local stand-ins for Google APIs and Firestore used by the benchmarks.
+
+FakeGoogleHttp takes the place of httplib2.Http under googleapiclient, in
+the same way as googleapiclient.http.HttpMock, but routes each request to
+a generated Gmail, Calendar, Tasks, Drive or People dataset. It also
+answers batch requests, adds a configurable round-trip latency and
+counts calls. FakeFirestore keeps documents in memory.
+Set FIRESTORE_EMULATOR_HOST to use the real client against the emulator.
+
+    fakes = install(FakeGoogleData(messages=2000), latency_ms=40)
+    ... call tools ...
+    fakes.http.calls   # Counter of (api, method) round trips
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email.parser import BytesParser
+from urllib.parse import parse_qs, urlparse
+
+USER_EMAIL = "bench@example.com"
+
+SUBJECT_WORDS = ['budget', 'review', 'invoice', 'launch', 'newsletter', 'team', 'sync', 'report',
+                 'urgent', 'deadline', 'action required', 'hello', 'weekly', 'update']
+
+class FakeGoogleData:
+    """A deterministic mailbox, calendar, task set, Drive and contact list."""
+    def __init__(self, messages=1000, events=300, task_lists=3, tasks=400, files=200, contacts=300, seed=3):
+        rng = random.Random(seed)
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.history_id = 100000
+        self.messages = []
+        for i in range(messages):
+            sent = now - timedelta(minutes=rng.randint(0, 60 * 24 * 45))
+            labels = ['INBOX'] + (['UNREAD'] if rng.random() < 0.3 else []) + (['IMPORTANT'] if rng.random() < 0.1 else [])
+            self.messages.append({
+                "id": f"m{i:07d}", "threadId": f"t{i // 3:07d}", "labelIds": labels,
+                "snippet": "Quick note about " + " ".join(rng.sample(SUBJECT_WORDS, 4)),
+                "internalDate": str(int(sent.timestamp() * 1000)),
+                "payload": {"headers": [
+                    {"name": "Subject", "value": " ".join(rng.sample(SUBJECT_WORDS, 3)).capitalize()},
+                    {"name": "From", "value": f"Sender {rng.randint(1, 80)} <sender{rng.randint(1, 80)}@example.com>"},
+                    {"name": "Date", "value": sent.strftime('%a, %d %b %Y %H:%M:%S +0000')},
+                ]},
+            })
+        self.messages.sort(key=lambda m: m["internalDate"], reverse=True)
+        self.messages_by_id = {m["id"]: m for m in self.messages}
+
+        self.events = []
+        for i in range(events):
+            start = (now + timedelta(hours=rng.randint(-24 * 20, 24 * 30))).replace(minute=rng.choice([0, 30]), second=0)
+            end = start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90]))
+            self.events.append({
+                "kind": "calendar#event", "id": f"e{i:06d}", "status": "confirmed",
+                "etag": f"\"{rng.randint(10**15, 10**16)}\"", "summary": " ".join(rng.sample(SUBJECT_WORDS, 2)).title(),
+                "htmlLink": f"https://www.google.com/calendar/event?eid=e{i:06d}",
+                "start": {"dateTime": start.isoformat()}, "end": {"dateTime": end.isoformat()},
+            })
+
+        self.task_lists = [{"id": f"list{i}", "title": f"List {i}"} for i in range(task_lists)]
+        self.tasks = {tasklist["id"]: [] for tasklist in self.task_lists}
+        for i in range(tasks):
+            tasklist = self.task_lists[i % task_lists]["id"]
+            task = {
+                "kind": "tasks#task", "id": f"task{i:06d}", "title": " ".join(rng.sample(SUBJECT_WORDS, 3)).capitalize(),
+                "status": "completed" if rng.random() < 0.3 else "needsAction",
+                "updated": now.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                "selfLink": f"https://www.googleapis.com/tasks/v1/lists/{tasklist}/tasks/task{i:06d}",
+            }
+            if rng.random() < 0.7:
+                task["due"] = (now + timedelta(days=rng.randint(-5, 30))).strftime('%Y-%m-%dT00:00:00.000Z')
+            self.tasks[tasklist].append(task)
+
+        self.files = [{"id": f"f{i:05d}", "name": f"{rng.choice(SUBJECT_WORDS)} notes {i}",
+                       "mimeType": "application/vnd.google-apps.document",
+                       "modifiedTime": now.isoformat()} for i in range(files)]
+        self.contacts = [{"resourceName": f"people/c{i}", "names": [{"displayName": f"Contact {i}"}],
+                          "emailAddresses": [{"value": f"contact{i}@example.com"}]} for i in range(contacts)]
+
+def _page(items, params, key, default_size):
+    size = int(params.get("maxResults", params.get("pageSize", [default_size]))[0])
+    start = int(params.get("pageToken", ["0"])[0])
+    page = {key: items[start:start + size]}
+    if start + size < len(items):
+        page["nextPageToken"] = str(start + size)
+    return page
+
+def _gmail_date(term):
+    return datetime.strptime(term, '%Y/%m/%d').replace(tzinfo=timezone.utc).timestamp() * 1000
+
+class FakeGoogleHttp:
+    """httplib2.Http stand-in answering from a FakeGoogleData."""
+    def __init__(self, data, latency_ms=0.0, jitter_ms=0.0):
+        self.data = data
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.calls = Counter()       # (api, method) -> HTTP round trips
+        self.operations = Counter()  # (api, method) -> API operations, batch parts included
+        self._lock = threading.Lock()
+        self.routes = [
+            ("GET", r"/gmail/v1/users/me/profile$", "gmail", self.gmail_profile),
+            ("GET", r"/gmail/v1/users/me/messages$", "gmail", self.gmail_list),
+            ("GET", r"/gmail/v1/users/me/messages/(?P<id>[^/]+)$", "gmail", self.gmail_get),
+            ("GET", r"/gmail/v1/users/me/history$", "gmail", self.gmail_history),
+            ("POST", r"/gmail/v1/users/me/messages/batch(Modify|Delete)$", "gmail", self.empty),
+            ("GET", r"/calendar/v3/calendars/[^/]+/events$", "calendar", self.calendar_list),
+            ("POST", r"/calendar/v3/calendars/[^/]+/events$", "calendar", self.echo),
+            ("GET", r"/calendar/v3/calendars/[^/]+$", "calendar", self.calendar_get),
+            ("POST", r"/calendar/v3/freeBusy$", "calendar", self.freebusy),
+            ("GET", r"/tasks/v1/users/@me/lists$", "tasks", self.tasklists),
+            ("GET", r"/tasks/v1/lists/(?P<list>[^/]+)/tasks$", "tasks", self.tasks_list),
+            ("POST", r"/tasks/v1/lists/(?P<list>[^/]+)/tasks$", "tasks", self.echo),
+            ("GET", r"/drive/v3/files$", "drive", self.drive_files),
+            ("GET", r"/v1/people/me/connections$", "people", self.people),
+        ]
+
+    # httplib2.Http interface
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        import httplib2
+        if self.latency:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        parsed = urlparse(uri)
+        if parsed.path.startswith("/batch"):
+            return self._batch(parsed.path, body, headers or {})
+        api, status, payload = self._dispatch(method, parsed.path, parse_qs(parsed.query), body)
+        with self._lock:
+            self.calls[(api, method)] += 1
+        content = b"" if payload is None else json.dumps(payload).encode()
+        return httplib2.Response({"status": status, "content-type": "application/json"}), content
+
+    def close(self):
+        pass
+
+    def _dispatch(self, method, path, params, body):
+        for route_method, pattern, api, handler in self.routes:
+            match = re.search(pattern, path) if route_method == method else None
+            if match:
+                with self._lock:
+                    self.operations[(api, method)] += 1
+                payload = json.loads(body) if body else None
+                return api, 200, handler(params, payload, **match.groupdict())
+        return "unknown", 404, {"error": {"code": 404, "message": f"No fake for {method} {path}"}}
+
+    def _batch(self, path, body, headers):
+        import httplib2
+        if isinstance(body, str):
+            body = body.encode()
+        content_type = headers.get("content-type") or headers.get("Content-Type")
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        boundary = "fake_batch_boundary"
+        parts = []
+        api = "batch"
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, url, _ = request_line.strip().split(" ", 2)
+            _, _, request_body = rest.replace("\r\n", "\n").partition("\n\n")
+            parsed = urlparse(url)
+            api, status, payload = self._dispatch(method, parsed.path, parse_qs(parsed.query), request_body.strip() or None)
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n"
+            )
+        with self._lock:
+            self.calls[(api, "BATCH")] += 1
+        content = ("".join(parts) + f"--{boundary}--").encode()
+        return httplib2.Response({"status": 200, "content-type": f"multipart/mixed; boundary={boundary}"}), content
+
+    # Handlers
+    def empty(self, params, body):
+        return None
+
+    def echo(self, params, body, **_):
+        return dict(body or {}, id=f"new{random.randint(0, 10**9)}",
+                    selfLink=f"https://www.googleapis.com/tasks/v1/lists/{_.get('list', '@default')}/tasks/x")
+
+    def gmail_profile(self, params, body):
+        return {"emailAddress": USER_EMAIL, "historyId": str(self.data.history_id)}
+
+    def gmail_list(self, params, body):
+        query = params.get("q", [""])[0]
+        after = re.search(r"after:(\d{4}/\d{2}/\d{2})", query)
+        before = re.search(r"before:(\d{4}/\d{2}/\d{2})", query)
+        lo = _gmail_date(after.group(1)) if after else 0
+        hi = _gmail_date(before.group(1)) if before else float("inf")
+        matches = [{"id": m["id"], "threadId": m["threadId"]} for m in self.data.messages
+                   if lo <= int(m["internalDate"]) < hi]
+        return _page(matches, params, "messages", 100)
+
+    def gmail_get(self, params, body, id):
+        return self.data.messages_by_id[id]
+
+    def gmail_history(self, params, body):
+        return {"historyId": str(self.data.history_id)}
+
+    def calendar_list(self, params, body):
+        if "syncToken" in params:
+            return {"items": [], "nextSyncToken": "sync-1", "timeZone": "UTC"}
+        page = _page(self.data.events, params, "items", 250)
+        page["timeZone"] = "UTC"
+        if "nextPageToken" not in page:
+            page["nextSyncToken"] = "sync-1"
+        return page
+
+    def calendar_get(self, params, body):
+        return {"id": "primary", "timeZone": "UTC"}
+
+    def freebusy(self, params, body):
+        return {"calendars": {"primary": {"busy": [
+            {"start": e["start"]["dateTime"], "end": e["end"]["dateTime"]} for e in self.data.events
+        ]}}}
+
+    def tasklists(self, params, body):
+        return _page(self.data.task_lists, params, "items", 100)
+
+    def tasks_list(self, params, body, list):
+        if "updatedMin" in params:
+            return {"items": []}
+        return _page(self.data.tasks.get(list, []), params, "items", 100)
+
+    def drive_files(self, params, body):
+        return _page(self.data.files, params, "files", 100)
+
+    def people(self, params, body):
+        return _page(self.data.contacts, params, "connections", 100)
+
+class FakeConnection:
+    """One thread's handle on a FakeGoogleHttp, like that thread's httplib2.Http.
+
+    httplib2.Http is not thread-safe, so use from any other thread fails.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.owner = threading.get_ident()
+
+    def request(self, *args, **kwargs):
+        if threading.get_ident() != self.owner:
+            raise RuntimeError("httplib2.Http used from a thread other than its own")
+        return self.server.request(*args, **kwargs)
+
+    def close(self):
+        pass
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+class FakeDocument:
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+        self.id = path[-1]
+
+    def get(self, transaction=None, **kwargs):
+        return FakeSnapshot(self.id, self._store.read(self.path))
+
+    def set(self, data, merge=False):
+        self._store.write(self.path, data, merge)
+
+    def update(self, data):
+        self._store.write(self.path, data, merge=True)
+
+    def delete(self):
+        self._store.write(self.path, None)
+
+class FakeCollection:
+    def __init__(self, store, name):
+        self._store = store
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocument(self._store, (self.name, doc_id))
+
+class FakeTransaction:
+    """Applies writes immediately; enough for single-process benchmarks."""
+    def set(self, ref, data, merge=False):
+        ref.set(data, merge)
+
+    def update(self, ref, data):
+        ref.update(data)
+
+class FakeFirestore:
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.documents = {}
+        self.operations = Counter()
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def transaction(self, **kwargs):
+        return FakeTransaction()
+
+    def close(self):
+        pass
+
+    def read(self, path):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.operations[(path[0], "read")] += 1
+            data = self.documents.get(path)
+            return dict(data) if data is not None else None
+
+    def write(self, path, data, merge=False):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.operations[(path[0], "write")] += 1
+            if data is None:
+                self.documents.pop(path, None)
+            elif merge and path in self.documents:
+                self.documents[path] = dict(self.documents[path], **data)
+            else:
+                self.documents[path] = dict(data)
+
+class Fakes:
+    def __init__(self, http, firestore):
+        self.http = http
+        self.firestore = firestore
+
+    def reset_counts(self):
+        self.http.calls.clear()
+        self.http.operations.clear()
+        if isinstance(self.firestore, FakeFirestore):
+            self.firestore.operations.clear()
+
+def install(data, latency_ms=0.0, jitter_ms=0.0, firestore_latency_ms=0.0, user_email=USER_EMAIL):
+    """Point the shared Google and Firestore clients at the fakes and seed a user's token.
+
+    Must run before anything creates the Firestore client.
+    """
+    import google_services
+    from client_registry import registry
+
+    http = FakeGoogleHttp(data, latency_ms, jitter_ms)
+    local = threading.local()
+
+    def thread_http():
+        connection = getattr(local, 'http', None)
+        if connection is None:
+            connection = local.http = FakeConnection(http)
+        return connection
+
+    google_services._thread_http = thread_http
+
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        from client_registry import get_firestore_client
+        db = get_firestore_client()
+    else:
+        from google.cloud import firestore
+        db = registry.get('firestore', lambda: FakeFirestore(firestore_latency_ms))
+        # The stand-in has no server-side transactions; run the function once
+        firestore.transactional = lambda fn: (lambda transaction, *args, **kwargs: fn(transaction, *args, **kwargs))
+
+    seed_user(db, user_email)
+    return Fakes(http, db)
+
+def seed_user(db, user_email, priority_tasks=None):
+    """Store an unexpired token, and optionally priority tasks, for a user."""
+    db.collection('user_tokens').document(user_email).set({
+        "access_token": "fake-token", "refresh_token": "fake-refresh",
+        "token_uri": "https://oauth2.googleapis.com/token", "client_id": "fake", "client_secret": "fake",
+        "expires_at": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+    })
+    if priority_tasks is not None:
+        db.collection('priority_tasks').document(user_email).set({"tasks": priority_tasks})
@@ -0,0 +1,252 @@
+"""Load test for backend.py against a stub ADK agent.
+
+Starts two child processes: a stub agent that answers session creation
+and /run after a configurable delay and with a configurable reply size,
+and the backend itself, pointed at the stub, with Firestore replaced by
+the in-memory stand-in from benchmarks/fakes.py. Then it sends a weighted
+mix of /chat, /optimize, /token and /priority_tasks requests from
+--concurrency workers for --duration seconds.
+
+It reports throughput, p50/p95/p99 latency and error rate per route,
+and the backend's resident memory before, during and after the run. A
+200 response whose JSON body has an "error" key counts as an error.
+
+    python benchmarks/load_backend.py [--concurrency 50] [--duration 30] [--users 500]
+        [--agent-latency 800] [--agent-reply-bytes 2000] [--mix chat=4,optimize=2,token=2,priority_tasks=2]
+
+Run one side alone with `stub --port N` or `backend --port N --agent-url URL`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "chat=4,optimize=2,token=2,priority_tasks=2"
+
+def user_email(i):
+    return f"load{i:05d}@example.com"
+
+def run_stub(args):
+    """Serve the two agent routes backend.py calls."""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+    import uvicorn
+
+    app = FastAPI()
+    reply = ("All done. " * (args.agent_reply_bytes // 10 + 1))[:args.agent_reply_bytes]
+
+    @app.post("/apps/{app_name}/users/{user_id}/sessions/{session_id}")
+    async def create_session(app_name: str, user_id: str, session_id: str):
+        await asyncio.sleep(args.session_latency / 1000)
+        return {"id": session_id, "appName": app_name, "userId": user_id, "state": {}, "events": []}
+
+    @app.post("/run")
+    async def run(request: Request):
+        body = await request.json()
+        await asyncio.sleep(max(random.gauss(args.agent_latency, args.agent_latency * 0.25), 0) / 1000)
+        if random.random() < args.agent_error_rate:
+            return JSONResponse({"detail": "stub failure"}, status_code=500)
+        return [
+            {"author": "user", "content": {"role": "user", "parts": body["newMessage"]["parts"]}},
+            {"author": "smartsolve", "content": {"role": "model", "parts": [{"text": reply}]}},
+        ]
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+def run_backend(args):
+    """Serve backend.app with Firestore and Google APIs replaced by the fakes."""
+    from fakes import FakeGoogleData, install, seed_user
+    import uvicorn
+
+    os.environ["AGENT_URL"] = args.agent_url
+    fakes = install(FakeGoogleData(messages=0, events=0, tasks=0, files=0, contacts=0))
+    tasks = [{"title": "Finish quarterly report", "priority": "high", "score": 90}] * 5
+    for i in range(args.users):
+        seed_user(fakes.firestore, user_email(i), priority_tasks=tasks)
+
+    import backend
+    uvicorn.run(backend.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+def rss_mb(pid):
+    """Resident set size of a process in MB, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+def optimize_body(rng, email, variant):
+    # A few schedules per user, so some requests hit the optimize cache
+    local = random.Random(f"{email}-{variant}")
+    return {
+        "user_email": email,
+        "tasks": [{"title": f"Task {local.randint(1, 500)}", "status": "needsAction",
+                   "due": "2026-10-20T00:00:00.000Z"} for _ in range(20)],
+        "events": [{"summary": f"Meeting {local.randint(1, 500)}",
+                    "start": {"dateTime": "2026-10-20T10:00:00+00:00"},
+                    "end": {"dateTime": "2026-10-20T11:00:00+00:00"}} for _ in range(15)],
+    }
+
+def build_request(route, rng, args):
+    email = user_email(rng.randrange(args.users))
+    if route == "chat":
+        return "POST", "/chat", {"user_email": email, "message": "What should I work on next?"}
+    if route == "optimize":
+        return "POST", "/optimize", optimize_body(rng, email, rng.randrange(args.optimize_variants))
+    if route == "token":
+        return "GET", f"/token/{email}", None
+    return "GET", f"/priority_tasks/{email}", None
+
+async def worker(client, routes, weights, args, deadline, results, seed):
+    import httpx
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        route = rng.choices(routes, weights)[0]
+        method, path, body = build_request(route, rng, args)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            ok = response.status_code == 200
+            if ok:
+                payload = response.json()
+                ok = not (isinstance(payload, dict) and "error" in payload)
+        except (httpx.HTTPError, json.JSONDecodeError):
+            ok = False
+        results[route].append((time.perf_counter() - start) * 1000 if ok else None)
+
+async def sample_rss(pid, samples, stop):
+    while not stop.is_set():
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            pass
+
+async def drive(args, backend_pid):
+    import httpx
+    mix = dict(item.split("=") for item in args.mix.split(","))
+    routes = list(mix)
+    weights = [float(mix[route]) for route in routes]
+    results = {route: [] for route in routes}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.backend_url, limits=limits, timeout=args.timeout) as client:
+        rss_before = rss_mb(backend_pid)
+        rss_samples = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_rss(backend_pid, rss_samples, stop))
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            worker(client, routes, weights, args, deadline, results, seed) for seed in range(args.concurrency)
+        ))
+        elapsed = time.monotonic() - started
+        stop.set()
+        await sampler
+        rss_after = rss_mb(backend_pid)
+    return results, elapsed, rss_before, rss_samples, rss_after
+
+def report(results, elapsed, rss_before, rss_samples, rss_after):
+    total = sum(len(samples) for samples in results.values())
+    print(f"{'route':<16}{'requests':>10}{'req/s':>9}{'errors':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}   (ms)")
+    for route, samples in list(results.items()) + [("all", [s for v in results.values() for s in v])]:
+        ok = sorted(s for s in samples if s is not None)
+        errors = len(samples) - len(ok)
+        error_rate = errors / len(samples) * 100 if samples else 0.0
+        if ok:
+            quantiles = statistics.quantiles(ok, n=100) if len(ok) > 1 else ok * 99
+            latency = f"{statistics.median(ok):>9.1f}{quantiles[94]:>9.1f}{quantiles[98]:>9.1f}{ok[-1]:>9.1f}"
+        else:
+            latency = f"{'-':>9}" * 4
+        print(f"{route:<16}{len(samples):>10}{len(samples) / elapsed:>9.1f}{error_rate:>8.1f}%{latency}")
+    print(f"{total} requests in {elapsed:.1f} s")
+    if rss_before is not None and rss_after is not None:
+        peak = max(rss_samples, default=rss_after)
+        print(f"backend RSS: {rss_before:.1f} MB before, {peak:.1f} MB peak, {rss_after:.1f} MB after "
+              f"({rss_after - rss_before:+.1f} MB)")
+    else:
+        print("backend RSS: unavailable on this platform")
+
+async def wait_ready(url, timeout=60):
+    import httpx
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout} s")
+
+def spawn(*argv):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), *argv], stdout=subprocess.DEVNULL)
+
+def run_load(args):
+    children = []
+    try:
+        stub_url = f"http://127.0.0.1:{args.stub_port}"
+        children.append(spawn(
+            "stub", "--port", str(args.stub_port), "--agent-latency", str(args.agent_latency),
+            "--agent-reply-bytes", str(args.agent_reply_bytes), "--agent-error-rate", str(args.agent_error_rate),
+            "--session-latency", str(args.session_latency)
+        ))
+        backend = spawn("backend", "--port", str(args.backend_port), "--agent-url", stub_url,
+                        "--users", str(args.users))
+        children.append(backend)
+        args.backend_url = f"http://127.0.0.1:{args.backend_port}"
+        asyncio.run(wait_ready(f"{stub_url}/docs"))
+        asyncio.run(wait_ready(f"{args.backend_url}/health"))
+        print(f"{args.concurrency} concurrent clients, {args.users} users, {args.duration:g} s, mix {args.mix}; "
+              f"stub agent {args.agent_latency:g} ms, {args.agent_reply_bytes} B replies, "
+              f"{args.agent_error_rate:.0%} failures")
+        report(*asyncio.run(drive(args, backend.pid)))
+    finally:
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.wait()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("mode", nargs="?", default="run", choices=["run", "stub", "backend"])
+    parser.add_argument("--port", type=int, default=0, help="port for stub or backend mode")
+    parser.add_argument("--stub-port", type=int, default=18080)
+    parser.add_argument("--backend-port", type=int, default=15000)
+    parser.add_argument("--agent-url", default="http://127.0.0.1:18080")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="route=weight pairs")
+    parser.add_argument("--optimize-variants", type=int, default=3, help="distinct schedules per user")
+    parser.add_argument("--agent-latency", type=float, default=800, help="mean stub /run delay in ms")
+    parser.add_argument("--session-latency", type=float, default=20, help="stub session creation delay in ms")
+    parser.add_argument("--agent-reply-bytes", type=int, default=2000)
+    parser.add_argument("--agent-error-rate", type=float, default=0.0, help="fraction of /run calls failing")
+    parser.add_argument("--timeout", type=float, default=60, help="client timeout in seconds")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.mode == "stub":
+        run_stub(args)
+    elif args.mode == "backend":
+        run_backend(args)
+    else:
+        run_load(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Per-user calendar event store kept current with Calendar sync tokens.
+
+Each user's primary calendar is loaded once with a full events.list and
+then refreshed with the returned syncToken, so later reads only pull
+changed or deleted events. A 410 GONE from the API means the token has
+expired and triggers a full resync.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+from api_executor import execute
+from metrics import cache_result
+
+# Seconds a synced calendar is served without asking the API for changes
+CALENDAR_SYNC_MAX_AGE = int(os.getenv("CALENDAR_SYNC_MAX_AGE", 30))
+# How far back the full sync reaches
+CALENDAR_SYNC_PAST_DAYS = int(os.getenv("CALENDAR_SYNC_PAST_DAYS", 30))
+
+def event_time(value, tz=None):
+    """Convert an event start/end object to a Unix timestamp.
+
+    All-day events carry only a date, which starts at midnight in the
+    calendar's time zone tz (the process's own zone if None).
+    """
+    if 'dateTime' in value:
+        return datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00')).timestamp()
+    return datetime.strptime(value['date'], '%Y-%m-%d').replace(tzinfo=tz).timestamp()
+
+def is_declined(event):
+    """Whether the user declined the event, which leaves them free."""
+    return any(
+        attendee.get('self') and attendee.get('responseStatus') == 'declined'
+        for attendee in event.get('attendees', [])
+    )
+
+class UserCalendar:
+    """One user's synced events plus a start-time index."""
+    def __init__(self):
+        self.events = {}
+        self.sync_token = None
+        self.time_zone = None
+        self.synced_at = 0.0
+        # (sorted start timestamps, matching (start, end, id) entries)
+        self.index = ([], [])
+        self.max_span = 0.0
+
+    @property
+    def tz(self):
+        return ZoneInfo(self.time_zone) if self.time_zone else None
+
+    def apply(self, event):
+        if event.get('status') == 'cancelled':
+            self.events.pop(event['id'], None)
+        else:
+            self.events[event['id']] = event
+
+    def reindex(self):
+        index = []
+        max_span = 0.0
+        tz = self.tz
+        for event in self.events.values():
+            try:
+                start = event_time(event['start'], tz)
+                end = event_time(event['end'], tz)
+            except (KeyError, ValueError):
+                continue
+            index.append((start, end, event['id']))
+            max_span = max(max_span, end - start)
+        index.sort()
+        # Swapped as one tuple; readers keep the old lists until they finish
+        self.index = ([entry[0] for entry in index], index)
+        self.max_span = max_span
+
+class CalendarStore:
+    def __init__(self, calendar_id='primary', max_age=CALENDAR_SYNC_MAX_AGE):
+        self.calendar_id = calendar_id
+        self.max_age = max_age
+        self._calendars = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _lock_for(self, user_email):
+        with self._lock:
+            return self._locks.setdefault(user_email, threading.Lock())
+
+    def sync(self, user_email, service, force=False):
+        """Bring the user's events up to date unless synced within max_age seconds."""
+        calendar = self._calendars.get(user_email)
+        fresh = bool(calendar and not force and time.time() - calendar.synced_at < self.max_age)
+        cache_result("calendar_store", fresh)
+        if fresh:
+            return calendar
+
+        with self._lock_for(user_email):
+            calendar = self._calendars.get(user_email)
+            if calendar and not force and time.time() - calendar.synced_at < self.max_age:
+                return calendar
+            if calendar is None or calendar.sync_token is None:
+                calendar = self._full_sync(user_email, service)
+            else:
+                try:
+                    self._incremental_sync(calendar, service)
+                except HttpError as e:
+                    if e.resp.status != 410:
+                        raise
+                    print(f"DEBUG: Calendar sync token expired for {user_email}, resyncing")
+                    calendar = self._full_sync(user_email, service)
+            return calendar
+
+    def _full_sync(self, user_email, service):
+        calendar = UserCalendar()
+        time_min = (datetime.utcnow() - timedelta(days=CALENDAR_SYNC_PAST_DAYS)).isoformat() + 'Z'
+        page_token = None
+        while True:
+            result = execute(service.events().list(
+                calendarId=self.calendar_id, singleEvents=True, timeMin=time_min,
+                maxResults=2500, pageToken=page_token
+            ))
+            for event in result.get('items', []):
+                calendar.apply(event)
+            calendar.time_zone = result.get('timeZone', calendar.time_zone)
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                calendar.sync_token = result.get('nextSyncToken')
+                break
+        calendar.reindex()
+        calendar.synced_at = time.time()
+        self._calendars[user_email] = calendar
+        return calendar
+
+    def _incremental_sync(self, calendar, service):
+        page_token = None
+        sync_token = calendar.sync_token
+        changed = False
+        while True:
+            result = execute(service.events().list(
+                calendarId=self.calendar_id, singleEvents=True, syncToken=sync_token,
+                maxResults=2500, pageToken=page_token
+            ))
+            for event in result.get('items', []):
+                calendar.apply(event)
+                changed = True
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                calendar.sync_token = result.get('nextSyncToken')
+                break
+        if changed:
+            calendar.reindex()
+        calendar.synced_at = time.time()
+
+    def record(self, user_email, event):
+        """Apply an event the agent just created or changed, without waiting for the next sync."""
+        calendar = self._calendars.get(user_email)
+        if calendar is None:
+            return
+        with self._lock_for(user_email):
+            calendar.apply(event)
+            calendar.reindex()
+
+    def between(self, user_email, start_ts, end_ts):
+        """Return events overlapping [start_ts, end_ts), ordered by start time."""
+        calendar = self._calendars.get(user_email)
+        if calendar is None:
+            return []
+        starts, index = calendar.index
+        lo = bisect_left(starts, start_ts - calendar.max_span)
+        hi = bisect_right(starts, end_ts)
+        return [
+            calendar.events[event_id]
+            for start, end, event_id in index[lo:hi]
+            if end > start_ts and start < end_ts and event_id in calendar.events
+        ]
+
+    def upcoming(self, user_email, limit=10, now=None):
+        """Return the next events that have not ended yet."""
+        calendar = self._calendars.get(user_email)
+        if calendar is None:
+            return []
+        now = now if now is not None else time.time()
+        starts, index = calendar.index
+        upcoming = []
+        for start, end, event_id in index[bisect_left(starts, now - calendar.max_span):]:
+            if end > now and event_id in calendar.events:
+                upcoming.append(calendar.events[event_id])
+                if len(upcoming) >= limit:
+                    break
+        return upcoming
+
+    def time_zone(self, user_email):
+        """The calendar's IANA time zone, if known."""
+        calendar = self._calendars.get(user_email)
+        return calendar.time_zone if calendar else None
+
+    def conflicts(self, user_email, start_ts, end_ts, ignore_id=None):
+        """Return busy events that overlap the given range.
+
+        As in a freebusy query, all-day events count unless they are
+        marked free, which is the default for new all-day events.
+        """
+        return [
+            event for event in self.between(user_email, start_ts, end_ts)
+            if event.get('transparency') != 'transparent'
+            and not is_declined(event)
+            and event['id'] != ignore_id
+        ]
+
+calendar_store = CalendarStore()
@@ -0,0 +1,90 @@
+import atexit
+import os
+import threading
+import requests
+from google.auth.transport.requests import Request
+from google.cloud import firestore
+
+class ClientRegistry:
+    """Process-wide registry of lazily constructed API clients.
+
+    Each client is created once on first use and shared by every thread,
+    so gRPC channels and HTTP connection pools are reused across tool calls.
+    """
+    def __init__(self):
+        self._clients = {}
+        self._channel_counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, factory, channels=None):
+        """Return the client registered under name, creating it with factory on first use.
+
+        channels is an optional callable that reports how many open
+        channels or connections the client currently holds.
+        """
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    print(f"DEBUG: Creating shared client: {name}")
+                    client = factory()
+                    self._clients[name] = client
+                    if channels:
+                        self._channel_counters[name] = channels
+        return client
+
+    def stats(self):
+        with self._lock:
+            clients = dict(self._clients)
+            counters = dict(self._channel_counters)
+        channels = {}
+        for name, client in clients.items():
+            counter = counters.get(name)
+            try:
+                channels[name] = counter(client) if counter else 0
+            except Exception:
+                channels[name] = 0
+        return {
+            "clients": len(clients),
+            "channels": sum(channels.values()),
+            "by_client": channels
+        }
+
+    def close_all(self):
+        with self._lock:
+            clients = self._clients
+            self._clients = {}
+            self._channel_counters = {}
+        for name, client in clients.items():
+            try:
+                client.close()
+            except Exception as e:
+                print(f"DEBUG: Failed to close client {name}: {str(e)}")
+
+registry = ClientRegistry()
+atexit.register(registry.close_all)
+
+def _create_firestore_client():
+    # Set the path to the firestore key file
+    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'firestore-key.json'
+    return firestore.Client(database='smartsolve')
+
+def _firestore_channels(client):
+    # The gRPC transport is only opened on the first request
+    return 1 if getattr(client, '_firestore_api_internal', None) is not None else 0
+
+def _session_channels(session):
+    return sum(len(adapter.poolmanager.pools) for adapter in session.adapters.values())
+
+def get_firestore_client():
+    """Return the shared Firestore client for the smartsolve database."""
+    return registry.get('firestore', _create_firestore_client, _firestore_channels)
+
+def get_http_session():
+    """Return the shared keep-alive requests session."""
+    return registry.get('http_session', requests.Session, _session_channels)
+
+def get_auth_request():
+    """Return a google-auth transport that reuses the shared HTTP session for token refreshes."""
+    return Request(session=get_http_session())
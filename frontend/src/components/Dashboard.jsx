@@ -5,7 +5,7 @@ export default function Dashboard({ user, navigate, accessToken, userEmail }) {
     const profilePic = user?.picture || "https://lh3.googleusercontent.com/aida-public/AB6AXuDsaIY-rrWv3iY4SOq8FXdMQDPvBWlWzH7D1rk_2pQaftvsT-nDtFIPc71Y4olgtmoojaQtxna7e4akwz1kM87LrQOVqTYOgY6VcaNIehm36hlnfs5L6WNamcLTrrXZulm_WC79L2xtndUPxWUIHxiiM3A4-HYX_i9ju76jyDr6OH-s2xUOOTfMe_8weDIdZof76l_QtQlt_miuf9aj_WSOaprctkwOvi_X4nVKGqYhwBj2Pz3OAiLVQCOBuD-FfWnYX4LKkYwT_Nk";
 
     const [tasks, setTasks] = useState([]);
-    const [completedTasks, setCompletedTasks] = useState([]);
+    const [completedTasksCount, setCompletedTasksCount] = useState(0);
     const [events, setEvents] = useState([]);
     const [loadingData, setLoadingData] = useState(false);
     const [loadingEvents, setLoadingEvents] = useState(false);
@@ -40,7 +40,9 @@ export default function Dashboard({ user, navigate, accessToken, userEmail }) {
         setCompletingTasks(prev => new Set(prev).add(taskId));
         setTaskError(null);
         try {
-            const res = await fetch(`https://tasks.googleapis.com/tasks/v1/lists/@default/tasks/${taskId}`, {
+            const taskToComplete = tasks.find(t => t.id === taskId);
+            const tasklist = taskToComplete?.tasklist || '@default';
+            const res = await fetch(`https://tasks.googleapis.com/tasks/v1/lists/${tasklist}/tasks/${taskId}`, {
                 method: 'PATCH',
                 headers: {
                     'Authorization': `Bearer ${accessToken}`,
@@ -50,11 +52,10 @@ export default function Dashboard({ user, navigate, accessToken, userEmail }) {
             });
 
             if (res.ok) {
-                // Optimistic UI update: remove from tasks and add to completed
-                const taskToComplete = tasks.find(t => t.id === taskId);
+                // Optimistic UI update: remove from tasks and count as completed
                 setTasks(prev => prev.filter(t => t.id !== taskId));
                 if (taskToComplete) {
-                    setCompletedTasks(prev => [taskToComplete, ...prev]);
+                    setCompletedTasksCount(prev => prev + 1);
                 }
                 // Sync with server after a short delay to ensure Google's database is updated
                 setTimeout(() => fetchTasks(true), 1500);
@@ -75,54 +76,33 @@ export default function Dashboard({ user, navigate, accessToken, userEmail }) {
         }
     };
 
-    const fetchEvents = async (silent = false) => {
-        if (!accessToken) return [];
-        if (!silent) setLoadingEvents(true);
+    // One request for events, tasks and priority tasks. The backend sends an
+    // ETag and no-cache, so the browser revalidates and reuses its cached copy
+    // when nothing changed. refresh asks the backend to fetch changes from Google first.
+    const fetchDashboard = async ({ refresh = false, setLoading = null } = {}) => {
+        if (!userEmail) return null;
+        if (setLoading) setLoading(true);
         try {
-            const now = new Date().toISOString();
-            const calendarRes = await fetch(`https://www.googleapis.com/calendar/v3/calendars/primary/events?orderBy=startTime&singleEvents=true&timeMin=${now}&maxResults=5`, {
-                headers: { 'Authorization': `Bearer ${accessToken}` }
-            });
-            const calendarData = await calendarRes.json();
-            const fetchedEvents = calendarData.items || [];
-            setEvents(fetchedEvents);
-            return fetchedEvents;
+            const res = await fetch(`${API_URL}/dashboard/${encodeURIComponent(userEmail)}${refresh ? '?refresh=true' : ''}`);
+            if (!res.ok) throw new Error(`Dashboard request failed: ${res.status}`);
+            const data = await res.json();
+            setEvents(data.events);
+            setTasks(data.tasks);
+            setCompletedTasksCount(data.completed_count);
+            setPriorityTasks(data.priority_tasks);
+            return data;
         } catch (error) {
-            console.error("Error fetching events:", error);
-            return [];
+            console.error("Error fetching dashboard:", error);
+            return null;
         } finally {
-            if (!silent) setLoadingEvents(false);
+            if (setLoading) setLoading(false);
         }
     };
 
-    const fetchTasks = async (silent = false) => {
-        if (!accessToken) return [];
-        if (!silent) setLoadingTasks(true);
-        try {
-            // Pending Tasks
-            const tasksRes = await fetch(`https://tasks.googleapis.com/tasks/v1/lists/@default/tasks?showCompleted=false&maxResults=50`, {
-                headers: { 'Authorization': `Bearer ${accessToken}` }
-            });
-            const tasksData = await tasksRes.json();
-            const fetchedTasks = tasksData.items || [];
-            setTasks(fetchedTasks);
+    const fetchEvents = () => fetchDashboard({ refresh: true, setLoading: setLoadingEvents });
 
-            // Completed Tasks
-            const compTasksRes = await fetch(`https://tasks.googleapis.com/tasks/v1/lists/@default/tasks?showCompleted=true&showHidden=true&maxResults=100`, {
-                headers: { 'Authorization': `Bearer ${accessToken}` }
-            });
-            const compTasksData = await compTasksRes.json();
-            const fetchedCompTasks = compTasksData.items || [];
-            setCompletedTasks(fetchedCompTasks);
-
-            return fetchedTasks;
-        } catch (error) {
-            console.error("Error fetching tasks:", error);
-            return [];
-        } finally {
-            if (!silent) setLoadingTasks(false);
-        }
-    };
+    const fetchTasks = (silent = false) =>
+        fetchDashboard({ refresh: true, setLoading: silent ? null : setLoadingTasks });
 
     useEffect(() => {
         if (!accessToken || fetchInProgress.current) return;
@@ -131,16 +111,10 @@ export default function Dashboard({ user, navigate, accessToken, userEmail }) {
             fetchInProgress.current = true;
             setLoadingData(true);
             try {
-                const [evts, tsks] = await Promise.all([
-                    fetchEvents(true),
-                    fetchTasks(true)
-                ]);
-
-                // Fetch priority tasks
-                fetchPriorityTasks();
+                const data = await fetchDashboard();
 
-                if (evts.length > 0 || tsks.length > 0) {
-                    await fetchInsight(tsks, evts);
+                if (data && (data.events.length > 0 || data.tasks.length > 0)) {
+                    await fetchInsight(data.tasks, data.events);
                 }
             } catch (error) {
                 console.error("Initialization error:", error);
@@ -188,21 +162,7 @@ export default function Dashboard({ user, navigate, accessToken, userEmail }) {
         }
     };
 
-    const fetchPriorityTasks = async () => {
-        if (!userEmail) return;
-        setLoadingPriorityTasks(true);
-        try {
-            const res = await fetch(`${API_URL}/priority_tasks/${userEmail}`);
-            const data = await res.json();
-            if (data.tasks) {
-                setPriorityTasks(data.tasks);
-            }
-        } catch (error) {
-            console.error("Error fetching priority tasks:", error);
-        } finally {
-            setLoadingPriorityTasks(false);
-        }
-    };
+    const fetchPriorityTasks = () => fetchDashboard({ setLoading: setLoadingPriorityTasks });
 
     const handleHomeSubmit = (e) => {
         e.preventDefault();
@@ -212,7 +172,6 @@ export default function Dashboard({ user, navigate, accessToken, userEmail }) {
 
     // Derived Stats
     const pendingTasksCount = tasks.length;
-    const completedTasksCount = completedTasks.length;
     const totalTasks = pendingTasksCount + completedTasksCount;
 
     // Efficiency Score: Base 50% + dynamic (completed/total * 50)
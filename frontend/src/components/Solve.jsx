@@ -62,46 +62,92 @@ const Solve = ({ navigate, accessToken, initialQuery, userEmail, onClearQuery, u
         }
     };
 
+    // Read the backend's server-sent events, calling onText with the reply so far
+    const streamAgentReply = async (body, onText) => {
+        const res = await fetch(`${API_URL}/chat/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body)
+        });
+        if (!res.ok || !res.body) throw new Error(`Chat stream failed: ${res.status}`);
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+            for (const frame of frames) {
+                const lines = frame.split('\n');
+                const eventLine = lines.find(l => l.startsWith('event:'));
+                const dataLine = lines.find(l => l.startsWith('data:'));
+                if (!dataLine) continue;
+                const type = eventLine ? eventLine.slice(6).trim() : 'message';
+                const data = JSON.parse(dataLine.slice(5));
+                if (type === 'text') {
+                    text += data.text;
+                    onText(text);
+                } else if (type === 'message') {
+                    // Final reply replaces the partial text streamed so far
+                    text = data.text;
+                    onText(text);
+                } else if (type === 'error') {
+                    throw new Error(data.error);
+                }
+            }
+        }
+        return text;
+    };
+
     const sendMessageToAgent = async (message, currentSessionId = null, isIntro = false) => {
         const useSessionId = currentSessionId || sessionId;
+        const baseId = Date.now();
+        const aiId = baseId + 1;
         setIsThinking(true);
-        try {
-            const res = await fetch(`${API_URL}/chat`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    message: message,
-                    user_email: userEmail,
-                    session_id: useSessionId,
-                    history: messages.map(m => ({ role: m.role, content: m.content }))
-                })
-            });
-            const data = await res.json();
 
-            if (data.content) {
-                const aiResponse = {
-                    id: Date.now() + 1,
-                    role: 'assistant',
-                    name: 'SmartSolve',
-                    content: data.content,
-                    time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
-                };
+        if (!isIntro) {
+            // For regular messages, show the user message right away
+            const userMessage = {
+                id: baseId,
+                role: 'user',
+                content: message,
+                time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
+            };
+            setMessages(prev => [...prev, userMessage]);
+        }
 
-                if (isIntro) {
-                    // For intro, only add AI response
-                    setMessages([aiResponse]);
-                } else {
-                    // For regular messages, add user message first, then AI response
-                    const userMessage = {
-                        id: Date.now(),
-                        role: 'user',
-                        content: message,
-                        time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
-                    };
-                    setMessages(prev => [...prev, userMessage, aiResponse]);
+        const showReply = (content) => {
+            setIsThinking(false);
+            const aiResponse = {
+                id: aiId,
+                role: 'assistant',
+                name: 'SmartSolve',
+                content: content,
+                time: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
+            };
+            setMessages(prev => {
+                if (prev.some(m => m.id === aiId)) {
+                    return prev.map(m => m.id === aiId ? aiResponse : m);
                 }
-            } else {
-                throw new Error(data.error || "Failed to get AI response");
+                // For intro, only the AI response is shown
+                return isIntro ? [aiResponse] : [...prev, aiResponse];
+            });
+        };
+
+        try {
+            const reply = await streamAgentReply({
+                message: message,
+                user_email: userEmail,
+                session_id: useSessionId,
+                history: messages.map(m => ({ role: m.role, content: m.content }))
+            }, showReply);
+
+            if (!reply) {
+                throw new Error("Failed to get AI response");
             }
         } catch (error) {
             console.error("Chat Error:", error);
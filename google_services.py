@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+import google_auth_httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import HttpRequest, build_http
+from metrics import cache_result
+
+# Maximum number of per-user service objects kept alive
+SERVICE_CACHE_SIZE = int(os.getenv("SERVICE_CACHE_SIZE", 256))
+
+_documents = {}
+_documents_lock = threading.Lock()
+
+_services = OrderedDict()
+_services_lock = threading.Lock()
+
+_local = threading.local()
+
+def get_discovery_document(api, version):
+    """Return the parsed discovery document bundled with googleapiclient.
+
+    Documents are parsed once per process and shared by every service object.
+    """
+    key = (api, version)
+    document = _documents.get(key)
+    if document is None:
+        with _documents_lock:
+            document = _documents.get(key)
+            if document is None:
+                content = get_static_doc(api, version)
+                if content is None:
+                    raise ValueError(f"No bundled discovery document for {api} {version}")
+                document = json.loads(content)
+                _documents[key] = document
+    return document
+
+def _thread_http():
+    # httplib2.Http is not thread-safe, so each worker thread keeps its own
+    # connection and shares it between users and services. build_http sets
+    # the client library's socket timeout, so a hung connection raises.
+    http = getattr(_local, 'http', None)
+    if http is None:
+        http = _local.http = build_http()
+    return http
+
+class _ThreadLocalHttp:
+    """Stands in for an httplib2.Http and forwards to the running thread's own.
+
+    Requests are often built on the event loop thread and executed on a
+    worker, so the connection is looked up when the request is sent,
+    not when it is built.
+    """
+    def request(self, *args, **kwargs):
+        return _thread_http().request(*args, **kwargs)
+
+    def close(self):
+        _thread_http().close()
+
+    def __getattr__(self, name):
+        return getattr(_thread_http(), name)
+
+_shared_http = _ThreadLocalHttp()
+
+def _authorized_http(credentials):
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=_shared_http)
+
+def _request_builder(credentials, user_email):
+    def build_request(http, *args, **kwargs):
+        request = HttpRequest(_authorized_http(credentials), *args, **kwargs)
+        # Read by api_executor to pick the user's rate limit bucket
+        request.user_email = user_email
+        return request
+    return build_request
+
+def build_service(token, api, version, user_email=None):
+    """Build a service object for an access token from the cached discovery document."""
+    credentials = Credentials(token=token)
+    return build_from_document(
+        get_discovery_document(api, version),
+        http=_authorized_http(credentials),
+        requestBuilder=_request_builder(credentials, user_email)
+    )
+
+def get_service(user_email, token, api, version):
+    """Return a cached service object for this user and API.
+
+    The cache is a bounded LRU keyed by user and API. An entry is rebuilt
+    when the user's access token changes.
+    """
+    key = (user_email, api, version)
+    with _services_lock:
+        entry = _services.get(key)
+        if entry and entry[0] == token:
+            _services.move_to_end(key)
+            cache_result("google_service", True)
+            return entry[1]
+    cache_result("google_service", False)
+
+    service = build_service(token, api, version, user_email)
+
+    with _services_lock:
+        _services[key] = (token, service)
+        _services.move_to_end(key)
+        while len(_services) > SERVICE_CACHE_SIZE:
+            _services.popitem(last=False)
+    return service
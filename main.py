@@ -2,6 +2,11 @@ import os
 from google.adk.cli.fast_api import get_fast_api_app
 import uvicorn
 from dotenv import load_dotenv
+from fastapi.responses import PlainTextResponse
+from client_registry import registry
+import metrics
+import agent_sessions
+from api_executor import quota_metric_lines
 
 # Load environment variables
 load_dotenv()
@@ -13,12 +18,29 @@ def create_app():
 
     return get_fast_api_app(
         agents_dir=agent_dir,
-        session_service_uri=None,
+        # Persistent SQLite sessions with bounded history per turn
+        session_service_uri=agent_sessions.session_service_uri(),
         allow_origins=allowed_origins,
         web=True
     )
 
 app = create_app()
+metrics.add_http_metrics(app)
+
+@app.get("/health")
+async def health():
+    # Shared clients are closed by the registry's atexit hook on shutdown
+    sessions = await agent_sessions.active_service.metrics() if agent_sessions.active_service else None
+    return {"status": "OK", "clients": registry.stats(), "sessions": sessions}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    extra = quota_metric_lines()
+    if agent_sessions.active_service:
+        sessions = await agent_sessions.active_service.metrics()
+        for key, value in sessions.items():
+            extra += metrics.gauge_lines(f"smartsolve_agent_session_{key}", f"Agent session store {key}.", value)
+    return metrics.render(extra)
 
 if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")
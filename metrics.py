@@ -0,0 +1,214 @@
+"""Process-local metrics rendered in the Prometheus text format.
+
+Counters and histograms keep plain dicts keyed by label values, so
+recording a sample costs a dict lookup and, for histograms, a bisect.
+Both the agent and the backend expose render() on /metrics.
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_metrics = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        lines.extend(f"{self.name}{_label_text(self.labels, key)} {value}" for key, value in items)
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+def gauge_lines(name, documentation, value, labels=None):
+    """Lines for a gauge whose value is read at scrape time."""
+    label_text = _label_text(labels.keys(), labels.values()) if labels else ""
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name}{label_text} {value}"]
+
+def labeled_gauge_lines(name, documentation, samples, label):
+    """Lines for a gauge with one label, from (label value, value) pairs."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    lines.extend(f"{name}{_label_text((label,), (key,))} {value}" for key, value in samples)
+    return lines
+
+def render(extra_lines=()):
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+TOOL_LATENCY = Histogram(
+    "smartsolve_tool_duration_seconds", "Agent tool call latency.", ["tool", "outcome"]
+)
+TOOL_RESULT_BYTES = Histogram(
+    "smartsolve_tool_result_bytes", "Size of agent tool results as JSON.", ["tool"], BYTES_BUCKETS
+)
+HTTP_LATENCY = Histogram(
+    "smartsolve_http_request_duration_seconds", "HTTP endpoint latency.", ["method", "route", "status"]
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "smartsolve_http_response_bytes", "HTTP response body size.", ["route"], BYTES_BUCKETS
+)
+GOOGLE_API_CALLS = Counter(
+    "smartsolve_google_api_calls_total", "Google API requests executed.", ["api", "outcome"]
+)
+GOOGLE_API_LATENCY = Histogram(
+    "smartsolve_google_api_duration_seconds", "Google API request latency.", ["api"]
+)
+FIRESTORE_OPS = Counter(
+    "smartsolve_firestore_operations_total", "Firestore document reads and writes.", ["collection", "op"]
+)
+GOOGLE_API_RETRIES = Counter(
+    "smartsolve_google_api_retries_total", "Google API attempts retried after backing off.", ["api", "reason"]
+)
+GOOGLE_API_QUOTA_USED = Counter(
+    "smartsolve_google_api_quota_used_total", "Rate limit tokens spent, one per request or batch part.", ["api"]
+)
+GOOGLE_API_THROTTLED = Counter(
+    "smartsolve_google_api_throttled_total", "Google API requests delayed or rejected by the per-user rate limit.",
+    ["api", "result"]
+)
+GOOGLE_API_CIRCUIT = Counter(
+    "smartsolve_google_api_circuit_transitions_total", "Circuit breaker state changes per API.", ["api", "state"]
+)
+TOKEN_REFRESHES = Counter(
+    "smartsolve_token_refreshes_total", "OAuth access token refreshes.", ["outcome"]
+)
+CACHE_REQUESTS = Counter(
+    "smartsolve_cache_requests_total", "Cache lookups by result.", ["cache", "result"]
+)
+PRECOMPUTE_RUNS = Counter(
+    "smartsolve_precompute_runs_total", "Background precompute jobs by result.", ["result"]
+)
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+def google_api_name(request):
+    """The API a request targets, read from its method ID (e.g. gmail.users.messages.list)."""
+    method_id = getattr(request, 'methodId', None)
+    return method_id.split('.', 1)[0] if method_id else "batch"
+
+def _result_size(result):
+    try:
+        return len(json.dumps(result, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+def _outcome(result):
+    return "error" if isinstance(result, dict) and "error" in result else "ok"
+
+def instrument_tool(fn):
+    """Wrap an agent tool to record its latency and result size.
+
+    functools.wraps keeps the name, docstring and signature that ADK reads
+    to build the tool declaration.
+    """
+    name = fn.__name__
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "exception"
+            try:
+                result = await fn(*args, **kwargs)
+                outcome = _outcome(result)
+                TOOL_RESULT_BYTES.observe(_result_size(result), name)
+                return result
+            finally:
+                TOOL_LATENCY.observe(time.perf_counter() - start, name, outcome)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "exception"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = _outcome(result)
+                TOOL_RESULT_BYTES.observe(_result_size(result), name)
+                return result
+            finally:
+                TOOL_LATENCY.observe(time.perf_counter() - start, name, outcome)
+    return wrapper
+
+def add_http_metrics(app):
+    """Record latency and response size for every route of a FastAPI app."""
+    @app.middleware("http")
+    async def record_request(request, call_next):
+        start = time.perf_counter()
+        response = None
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            # The route template keeps per-user paths from exploding the label set
+            path = getattr(route, "path", "unmatched")
+            HTTP_LATENCY.observe(time.perf_counter() - start, request.method, path, status)
+            if response is not None:
+                length = response.headers.get("content-length")
+                if length is not None:
+                    HTTP_RESPONSE_BYTES.observe(int(length), path)
@@ -0,0 +1,135 @@
+"""Result cache for /optimize keyed by a fingerprint of the schedule.
+
+The key is a SHA-256 over the user's tasks and events after dropping
+fields that change without changing the schedule (etags, links,
+timestamps). Fresh entries are returned directly; stale ones are
+returned immediately while a single background refresh replaces them.
+
+Entries live in a byte-bounded in-process LRU by default. Set
+OPTIMIZE_CACHE_REDIS_URL to share them between instances (needs the
+optional redis package).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from metrics import CACHE_REQUESTS
+
+# Seconds an entry is served without refreshing
+OPTIMIZE_CACHE_TTL = int(os.getenv("OPTIMIZE_CACHE_TTL", 600))
+# Seconds a stale entry may still be served while it refreshes
+OPTIMIZE_CACHE_STALE_TTL = int(os.getenv("OPTIMIZE_CACHE_STALE_TTL", 86400))
+OPTIMIZE_CACHE_MAX_BYTES = int(os.getenv("OPTIMIZE_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+OPTIMIZE_CACHE_REDIS_URL = os.getenv("OPTIMIZE_CACHE_REDIS_URL")
+
+# Google API fields that do not affect the schedule itself
+VOLATILE_FIELDS = {
+    'etag', 'kind', 'selfLink', 'htmlLink', 'webViewLink', 'hangoutLink', 'links',
+    'updated', 'created', 'iCalUID', 'sequence', 'position', 'creator', 'organizer',
+    'reminders', 'conferenceData'
+}
+
+def normalize(items):
+    """Drop volatile fields and order items by ID so equal schedules hash equally."""
+    cleaned = [{k: v for k, v in item.items() if k not in VOLATILE_FIELDS} for item in items]
+    return sorted(cleaned, key=lambda item: str(item.get('id', '')))
+
+def fingerprint(user_email, tasks, events):
+    payload = json.dumps(
+        {"user": user_email, "tasks": normalize(tasks), "events": normalize(events)},
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    return f"optimize:{user_email}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+class LocalCacheBackend:
+    """In-process LRU bounded by the total size of the stored values."""
+    def __init__(self, max_bytes=OPTIMIZE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key, entry, ttl):
+        size = len(json.dumps(entry, default=str))
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self._entries[key] = (entry, size)
+        self.size += size
+        while self.size > self.max_bytes and self._entries:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+class RedisCacheBackend:
+    """Shared backend for running several backend instances."""
+    def __init__(self, url):
+        import redis.asyncio as aioredis
+        self._redis = aioredis.from_url(url)
+
+    async def get(self, key):
+        value = await self._redis.get(key)
+        return json.loads(value) if value else None
+
+    async def set(self, key, entry, ttl):
+        await self._redis.set(key, json.dumps(entry, default=str), ex=ttl)
+
+class OptimizeCache:
+    def __init__(self, backend=None, ttl=OPTIMIZE_CACHE_TTL, stale_ttl=OPTIMIZE_CACHE_STALE_TTL):
+        self.backend = backend or LocalCacheBackend()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._inflight = {}
+
+    async def get_or_compute(self, key, compute):
+        """Return the cached result for key, computing it with compute() on a miss.
+
+        compute is an async callable. Results containing "error" are
+        returned but never cached.
+        """
+        entry = await self.backend.get(key)
+        if entry is not None:
+            age = time.time() - entry["stored_at"]
+            if age < self.ttl:
+                CACHE_REQUESTS.inc("optimize", "hit")
+                return entry["value"]
+            if age < self.stale_ttl:
+                # Stale-while-revalidate: answer now, refresh in the background
+                CACHE_REQUESTS.inc("optimize", "stale")
+                self._refresh(key, compute)
+                return entry["value"]
+        CACHE_REQUESTS.inc("optimize", "miss")
+        return await asyncio.shield(self._refresh(key, compute))
+
+    def _refresh(self, key, compute):
+        # Concurrent misses for the same schedule share one agent call
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute_and_store(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _compute_and_store(self, key, compute):
+        value = await compute()
+        if "error" not in value:
+            try:
+                await self.backend.set(key, {"value": value, "stored_at": time.time()}, self.stale_ttl)
+            except Exception as e:
+                print(f"DEBUG: Failed to cache optimize result: {str(e)}")
+        return value
+
+def create_optimize_cache():
+    if OPTIMIZE_CACHE_REDIS_URL:
+        try:
+            return OptimizeCache(RedisCacheBackend(OPTIMIZE_CACHE_REDIS_URL))
+        except ImportError:
+            print("DEBUG: redis package not installed, using in-process optimize cache")
+    return OptimizeCache()
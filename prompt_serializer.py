@@ -0,0 +1,125 @@
+"""Compact text form of a schedule for LLM prompts.
+
+Tasks and events are projected to the fields the model reasons about,
+times are shortened to local wall-clock form, and instances of the same
+recurring event collapse into one line. When the result would exceed the
+token budget, the least relevant items (completed tasks, past events,
+anything far from now) are dropped first.
+"""
+import math
+import os
+import time
+from datetime import datetime
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 1500))
+# Longest notes or location text kept per item
+PROMPT_TEXT_LIMIT = 120
+
+def estimate_tokens(text):
+    """Rough token count; about four characters per token for English text."""
+    return math.ceil(len(text) / 4)
+
+def _clip(text, limit=PROMPT_TEXT_LIMIT):
+    text = ' '.join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + '...'
+
+def _parse(value):
+    """Return (timestamp, compact text, all_day) for a Google time value, or Nones."""
+    if isinstance(value, dict):
+        value = value.get('dateTime') or value.get('date')
+    if not value:
+        return None, None, False
+    value = str(value)
+    try:
+        if len(value) == 10:
+            return datetime.strptime(value, '%Y-%m-%d').timestamp(), value, True
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None, value, False
+    # Wall-clock time as the calendar shows it; the offset is dropped
+    return parsed.timestamp(), parsed.strftime('%Y-%m-%d %H:%M'), False
+
+def task_line(task):
+    due_ts, due, _ = _parse(task.get('due'))
+    parts = [_clip(task.get('title') or 'Untitled', 80)]
+    if due:
+        # The Tasks API only stores a date; the time is always midnight UTC
+        parts.append(f"due {due[:10]}")
+    if task.get('status') == 'completed':
+        parts.append("done")
+    elif task.get('notes'):
+        parts.append(f"notes: {_clip(task['notes'])}")
+    return due_ts, ' | '.join(parts)
+
+def _event_key(event):
+    # Only instances of one series are grouped; one-off events stay apart
+    return event.get('recurringEventId') or event.get('id') or id(event)
+
+def group_events(events):
+    """Group recurring instances; returns lists of events, each ordered by start."""
+    groups = {}
+    for event in events:
+        groups.setdefault(_event_key(event), []).append(event)
+    for instances in groups.values():
+        instances.sort(key=lambda event: _parse(event.get('start'))[0] or 0)
+    return list(groups.values())
+
+def event_line(instances, now):
+    # Describe the series by its next instance, or its last one if all are past
+    upcoming = [event for event in instances if (_parse(event.get('end'))[0] or 0) > now]
+    event = upcoming[0] if upcoming else instances[-1]
+    start_ts, start, all_day = _parse(event.get('start'))
+    end_ts, end, _ = _parse(event.get('end'))
+
+    parts = [_clip(event.get('summary') or 'Busy', 80)]
+    if all_day:
+        parts.append(f"{start} all day")
+    elif start and not end:
+        parts.append(start)
+    elif start:
+        # Same-day events only repeat the clock time for the end
+        parts.append(f"{start}-{end[11:] if end[:10] == start[:10] else end}")
+    if len(instances) > 1:
+        parts.append(f"recurring x{len(instances)}")
+    if event.get('location'):
+        parts.append(f"at {_clip(event['location'], 60)}")
+    return start_ts, end_ts, ' | '.join(parts)
+
+def _relevance(tier, ts, now):
+    """Lower sorts first: open items before finished ones, then closeness to now."""
+    return (tier, abs(ts - now) if ts is not None else math.inf)
+
+def serialize_schedule(tasks, events, budget=PROMPT_TOKEN_BUDGET, now=None):
+    """Render tasks and events as compact prompt text within budget tokens."""
+    now = now if now is not None else time.time()
+    ranked = []
+    for task in tasks:
+        due_ts, line = task_line(task)
+        tier = 2 if task.get('status') == 'completed' else (0 if due_ts is not None else 1)
+        ranked.append((_relevance(tier, due_ts, now), 'task', due_ts, line))
+    for instances in group_events(events):
+        start_ts, end_ts, line = event_line(instances, now)
+        tier = 2 if end_ts is not None and end_ts <= now else 0
+        ranked.append((_relevance(tier, start_ts, now), 'event', start_ts, line))
+    ranked.sort(key=lambda entry: entry[0])
+
+    kept = {'task': [], 'event': []}
+    omitted = {'task': 0, 'event': 0}
+    # Headers and omission notes are small; reserve room for them up front
+    used = estimate_tokens("Tasks:\nEvents:\n") + 16
+    for _, kind, ts, line in ranked:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            omitted[kind] += 1
+            continue
+        kept[kind].append((ts if ts is not None else math.inf, line))
+        used += cost
+
+    sections = []
+    for kind, header in (('task', 'Tasks'), ('event', 'Events')):
+        # Shown in time order; relevance only decides what is kept
+        lines = [f"- {line}" for _, line in sorted(kept[kind], key=lambda entry: entry[0])]
+        if omitted[kind]:
+            lines.append(f"(+{omitted[kind]} less relevant {header.lower()} omitted)")
+        sections.append(f"{header}:\n" + ("\n".join(lines) if lines else "none"))
+    return "\n".join(sections)
@@ -0,0 +1,148 @@
+"""Maps each user to their ADK session ID, with expiry.
+
+SESSION_STORE picks the backend:
+
+- memory (default): per-process LRU, bounded by SESSION_STORE_MAX_ENTRIES
+- sqlite: a file at SESSION_STORE_PATH, shared by workers on one host
+- redis: any server speaking the Redis protocol at SESSION_STORE_REDIS_URL,
+  shared by every instance (needs the optional redis package)
+
+Entries expire SESSION_TTL seconds after they were last used.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_TTL = int(os.getenv("SESSION_TTL", 24 * 3600))
+SESSION_STORE_MAX_ENTRIES = int(os.getenv("SESSION_STORE_MAX_ENTRIES", 10000))
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "data/sessions.db")
+SESSION_STORE_REDIS_URL = os.getenv("SESSION_STORE_REDIS_URL", "redis://localhost:6379/0")
+
+class SessionStore:
+    """Storage interface for user -> session ID. Reads extend the entry's TTL."""
+    async def get(self, user_email):
+        raise NotImplementedError
+
+    async def set(self, user_email, session_id):
+        raise NotImplementedError
+
+    async def delete(self, user_email):
+        raise NotImplementedError
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, ttl=SESSION_TTL, max_entries=SESSION_STORE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # user_email -> (session_id, expires_at), least recently used first
+        self._entries = OrderedDict()
+
+    async def get(self, user_email):
+        entry = self._entries.get(user_email)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self._entries[user_email]
+            return None
+        self._entries[user_email] = (entry[0], time.time() + self.ttl)
+        self._entries.move_to_end(user_email)
+        return entry[0]
+
+    async def set(self, user_email, session_id):
+        self._entries[user_email] = (session_id, time.time() + self.ttl)
+        self._entries.move_to_end(user_email)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, user_email):
+        self._entries.pop(user_email, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteSessionStore(SessionStore):
+    """On-disk store; queries run in worker threads so the event loop never waits on SQLite."""
+    def __init__(self, path=SESSION_STORE_PATH, ttl=SESSION_TTL):
+        self.ttl = ttl
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            # WAL lets several uvicorn workers read while one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS sessions (
+                user_email TEXT PRIMARY KEY, session_id TEXT, expires_at REAL)""")
+
+    async def get(self, user_email):
+        return await asyncio.to_thread(self._get, user_email)
+
+    async def set(self, user_email, session_id):
+        await asyncio.to_thread(self._set, user_email, session_id)
+
+    async def delete(self, user_email):
+        await asyncio.to_thread(self._delete, user_email)
+
+    def _get(self, user_email):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT session_id FROM sessions WHERE user_email = ? AND expires_at > ?",
+                (user_email, now)
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    "UPDATE sessions SET expires_at = ? WHERE user_email = ?", (now + self.ttl, user_email)
+                )
+        return row[0] if row else None
+
+    def _set(self, user_email, session_id):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (user_email, session_id, expires_at) VALUES (?, ?, ?)",
+                (user_email, session_id, now + self.ttl)
+            )
+            # New sessions are rare, so expired rows are swept here
+            self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def _delete(self, user_email):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE user_email = ?", (user_email,))
+
+class RedisSessionStore(SessionStore):
+    """Uses only GET, SET EX, EXPIRE and DEL, so simple Redis stand-ins work too."""
+    def __init__(self, url=SESSION_STORE_REDIS_URL, ttl=SESSION_TTL):
+        import redis.asyncio as aioredis
+        self.ttl = ttl
+        self._redis = aioredis.from_url(url, decode_responses=True)
+
+    def _key(self, user_email):
+        return f"session:{user_email}"
+
+    async def get(self, user_email):
+        session_id = await self._redis.get(self._key(user_email))
+        if session_id:
+            await self._redis.expire(self._key(user_email), self.ttl)
+        return session_id
+
+    async def set(self, user_email, session_id):
+        await self._redis.set(self._key(user_email), session_id, ex=self.ttl)
+
+    async def delete(self, user_email):
+        await self._redis.delete(self._key(user_email))
+
+def create_session_store(kind=SESSION_STORE):
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    if kind == "redis":
+        try:
+            return RedisSessionStore()
+        except ImportError:
+            print("DEBUG: redis package not installed, using in-process session store")
+    elif kind != "memory":
+        print(f"DEBUG: Unknown SESSION_STORE '{kind}', using in-process session store")
+    return MemorySessionStore()
@@ -1,61 +1,38 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import hashlib
 from google.adk.agents.llm_agent import Agent
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.cloud import firestore
-from google.auth.transport.requests import Request
 import json
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import os
 from dotenv import load_dotenv
 from typing import List, Dict
+from token_vault import get_vault
+from google_services import get_service
+from api_executor import execute, execute_async, execute_batch, run_blocking
+from calendar_store import calendar_store, event_time
+from tasks_store import tasklist_id_of, tasks_store
+from .gmail_mirror import (GMAIL_BULK_LIMIT, GMAIL_MIRROR_ENABLED, fetch_message_metadata, list_message_ids,
+                           mirror, parse_mirror_query)
+from .scoring import default_scorer
+from .free_slots import free_windows
+from .priority_store import flush_priority_writes, priority_store
+from .precompute import PrecomputeScheduler
+from metrics import cache_result, instrument_tool
 
 # Load environment variables
 load_dotenv()
 
 def get_user_token(user_email: str) -> str:
-    """Retrieve user's Google OAuth token directly from Firestore."""
-    print(f"DEBUG: Getting token from Firestore for: {user_email}")
+    """Retrieve user's Google OAuth token through the shared credential cache."""
+    print(f"DEBUG: Getting token for: {user_email}")
     try:
-        db = firestore.Client(database='smartsolve')
-        doc_ref = db.collection('user_tokens').document(user_email)
-        doc = doc_ref.get()
+        credentials = get_vault().get_token(user_email)
         
-        if not doc.exists:
+        if not credentials:
             print("DEBUG: No token found in Firestore")
             return None
         
-        token_data = doc.to_dict()
-        print("DEBUG: Token retrieved from Firestore")
-        
-        # Create credentials and refresh if needed
-        with open("client-secret.json", 'r') as f:
-            client_data = json.load(f)["web"]
-        
-        credentials = Credentials(
-            token=token_data["access_token"],
-            refresh_token=token_data["refresh_token"],
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=client_data["client_id"],
-            client_secret=client_data["client_secret"]
-        )
-        
-        # Refresh if expired
-        if credentials.expired:
-            print("DEBUG: Token expired, refreshing...")
-            credentials.refresh(Request())
-            # Update Firestore with new token
-            doc_ref.set({
-                "access_token": credentials.token,
-                "refresh_token": credentials.refresh_token,
-                "token_uri": credentials.token_uri,
-                "client_id": credentials.client_id,
-                "client_secret": credentials.client_secret,
-                "expires_at": credentials.expiry.isoformat() if credentials.expiry else None,
-                "updated_at": firestore.SERVER_TIMESTAMP
-            })
-        
         return credentials.token
     except Exception as e:
         print(f"DEBUG: Firestore error: {str(e)}")
@@ -85,58 +62,70 @@ async def get_gmail_messages(user_email: str, query: str = "", max_results: int
         tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y/%m/%d')
         date_to = tomorrow
     
+    token = await run_blocking(get_user_token, user_email)
+    if not token:
+        return {"error": "User not authenticated"}
+    
+    service = get_service(user_email, token, 'gmail', 'v1')
+    
+    # Answer date, label and sender searches from the local mirror when we can
+    filters = parse_mirror_query(query) if GMAIL_MIRROR_ENABLED else None
+    if filters is not None:
+        try:
+            emails = await run_blocking(
+                mirror.search, user_email, service, date_from, date_to,
+                filters["labels"], filters["senders"], max_results
+            )
+            cache_result("gmail_mirror", emails is not None)
+            if emails is not None:
+                return {"emails": emails, "total": len(emails)}
+        except Exception as e:
+            print(f"DEBUG: Gmail mirror unavailable, querying API: {str(e)}")
+    
     date_query = f"after:{date_from} before:{date_to}"
     if query:
         query = f"{query} {date_query}"
     else:
         query = date_query
     
-    token = get_user_token(user_email)
-    if not token:
-        return {"error": "User not authenticated"}
-    
-    credentials = Credentials(token=token)
-    service = build('gmail', 'v1', credentials=credentials)
-    
     try:
-        results = service.users().messages().list(
-            userId='me', q=query, maxResults=max_results
-        ).execute()
+        # Page through message IDs until we have enough
+        message_ids = []
+        page_token = None
+        while len(message_ids) < max_results:
+            results = await execute_async(service.users().messages().list(
+                userId='me', q=query, maxResults=min(max_results - len(message_ids), 500),
+                pageToken=page_token
+            ))
+            message_ids.extend(msg['id'] for msg in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
         
-        messages = results.get('messages', [])
         email_list = []
-        
-        # Process in chunks to prevent timeout
-        for msg in messages[:5]:
-            message = service.users().messages().get(userId='me', id=msg['id']).execute()
-            headers = message['payload'].get('headers', [])
+        for message in await run_blocking(fetch_message_metadata, service, message_ids):
+            headers = message.get('payload', {}).get('headers', [])
             subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
             sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown')
-            email_list.append({"subject": subject, "from": sender, "id": msg['id']})
-            
-            # Yield control periodically
-            await asyncio.sleep(0)
+            date = next((h['value'] for h in headers if h['name'] == 'Date'), '')
+            email_list.append({"subject": subject, "from": sender, "date": date, "id": message['id']})
         
-        return {"emails": email_list, "total": len(messages)}
+        return {"emails": email_list, "total": len(message_ids)}
     except Exception as e:
         return {"error": str(e)}
 
 async def get_calendar_events(user_email: str, max_results: int = 10) -> dict:
     """Fetch upcoming calendar events. Optimized for parallel execution."""
-    token = get_user_token(user_email)
+    token = await run_blocking(get_user_token, user_email)
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('calendar', 'v3', credentials=credentials)
+    service = get_service(user_email, token, 'calendar', 'v3')
     
     try:
-        now = datetime.utcnow().isoformat() + 'Z'
-        events_result = service.events().list(
-            calendarId='primary', timeMin=now, maxResults=max_results,
-            singleEvents=True, orderBy='startTime'
-        ).execute()
-        events = events_result.get('items', [])
+        # Served from the synced event store; only changes hit the API
+        await run_blocking(calendar_store.sync, user_email, service)
+        events = calendar_store.upcoming(user_email, limit=max_results)
         
         event_list = []
         for event in events:
@@ -146,20 +135,18 @@ async def get_calendar_events(user_email: str, max_results: int = 10) -> dict:
                 "start": start,
                 "id": event['id']
             })
-            await asyncio.sleep(0)  # Yield control
         
         return {"events": event_list}
     except Exception as e:
         return {"error": str(e)}
 
 def create_calendar_event(user_email: str, title: str, start_time: str, end_time: str, description: str = "") -> dict:
-    """Create a new calendar event."""
+    """Create a new calendar event. Reports any existing events it overlaps."""
     token = get_user_token(user_email)
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('calendar', 'v3', credentials=credentials)
+    service = get_service(user_email, token, 'calendar', 'v3')
     
     event = {
         'summary': title,
@@ -169,8 +156,170 @@ def create_calendar_event(user_email: str, title: str, start_time: str, end_time
     }
     
     try:
-        created_event = service.events().insert(calendarId='primary', body=event).execute()
-        return {"success": True, "event_id": created_event['id'], "link": created_event.get('htmlLink')}
+        created_event = execute(service.events().insert(calendarId='primary', body=event))
+        result = {"success": True, "event_id": created_event['id'], "link": created_event.get('htmlLink')}
+        
+        try:
+            calendar_store.sync(user_email, service)
+            calendar_store.record(user_email, created_event)
+            conflicts = calendar_store.conflicts(
+                user_email, event_time(created_event['start']), event_time(created_event['end']),
+                ignore_id=created_event['id']
+            )
+            if conflicts:
+                result["conflicts"] = [conflict.get('summary', 'No Title') for conflict in conflicts]
+        except Exception as e:
+            print(f"DEBUG: Conflict check failed: {str(e)}")
+        return result
+    except Exception as e:
+        return {"error": str(e)}
+
+def create_calendar_events_bulk(user_email: str, events: str) -> dict:
+    """Create many calendar events in one batch request. Pass events as JSON string.
+
+    Each event is an object with title, start_time, end_time and optional
+    description, the same fields create_calendar_event takes. Returns a
+    result per event in the given order; one failure does not stop the rest.
+    """
+    try:
+        event_list = json.loads(events) if isinstance(events, str) else events
+    except ValueError as e:
+        return {"error": f"Invalid events JSON: {str(e)}"}
+
+    token = get_user_token(user_email)
+    if not token:
+        return {"error": "User not authenticated"}
+    
+    service = get_service(user_email, token, 'calendar', 'v3')
+    
+    try:
+        requests = [
+            service.events().insert(calendarId='primary', body={
+                'summary': event['title'],
+                'description': event.get('description', ''),
+                'start': {'dateTime': event['start_time'], 'timeZone': 'UTC'},
+                'end': {'dateTime': event['end_time'], 'timeZone': 'UTC'},
+            })
+            for event in event_list
+        ]
+    except (KeyError, TypeError) as e:
+        return {"error": f"Each event needs title, start_time and end_time: {str(e)}"}
+
+    try:
+        responses = execute_batch(service, requests)
+    except Exception as e:
+        return {"error": str(e)}
+
+    results = []
+    created = []
+    for index, (event, (response, exception)) in enumerate(zip(event_list, responses)):
+        if exception is not None or response is None:
+            results.append({"index": index, "title": event['title'], "success": False,
+                            "error": str(exception) if exception else "No response"})
+        else:
+            result = {"index": index, "title": event['title'], "success": True,
+                      "event_id": response['id'], "link": response.get('htmlLink')}
+            created.append((result, response))
+            results.append(result)
+
+    try:
+        calendar_store.sync(user_email, service)
+        for _, created_event in created:
+            calendar_store.record(user_email, created_event)
+        # Checked after recording them all, so events in the batch can conflict with each other
+        for result, created_event in created:
+            conflicts = calendar_store.conflicts(
+                user_email, event_time(created_event['start']), event_time(created_event['end']),
+                ignore_id=created_event['id']
+            )
+            if conflicts:
+                result["conflicts"] = [conflict.get('summary', 'No Title') for conflict in conflicts]
+    except Exception as e:
+        print(f"DEBUG: Conflict check failed: {str(e)}")
+
+    return {"created": len(created), "failed": len(results) - len(created), "results": results}
+
+def find_free_slots(user_email: str, date_from: str = "", date_to: str = "", min_duration_minutes: int = 30,
+                    buffer_minutes: int = 10, work_start: str = "08:00", work_end: str = "19:00",
+                    include_weekends: bool = True, prefer_longest: bool = False, max_results: int = 10) -> dict:
+    """Find free time windows in the user's calendar, ready to schedule into.
+    
+    Use this instead of working out gaps from raw event lists.
+    
+    Args:
+        user_email: User's email address (required)
+        date_from: First day in YYYY-MM-DD format (optional, default: today)
+        date_to: Last day in YYYY-MM-DD format, inclusive (optional, default: 6 days after date_from)
+        min_duration_minutes: Shortest window worth returning (optional, default: 30)
+        buffer_minutes: Time kept clear before and after every event (optional, default: 10)
+        work_start: Start of working hours in HH:MM (optional, default: 08:00)
+        work_end: End of working hours in HH:MM (optional, default: 19:00)
+        include_weekends: Whether Saturday and Sunday count (optional, default: True)
+        prefer_longest: Rank longest windows first instead of earliest (optional, default: False)
+        max_results: Maximum number of windows to return (optional, default: 10)
+    """
+    token = get_user_token(user_email)
+    if not token:
+        return {"error": "User not authenticated"}
+    
+    service = get_service(user_email, token, 'calendar', 'v3')
+    
+    try:
+        first_day = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else datetime.now().date()
+        last_day = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else first_day + timedelta(days=6)
+        day_start = datetime.strptime(work_start, '%H:%M').time()
+        day_end = datetime.strptime(work_end, '%H:%M').time()
+        
+        # Prefer the local event store; fall back to a single freebusy query
+        try:
+            calendar_store.sync(user_email, service)
+            time_zone = calendar_store.time_zone(user_email) or 'UTC'
+            tz = ZoneInfo(time_zone)
+            range_start = datetime.combine(first_day, day_start, tz).timestamp()
+            range_end = datetime.combine(last_day, day_end, tz).timestamp()
+            busy = [
+                (event_time(event['start'], tz), event_time(event['end'], tz))
+                for event in calendar_store.conflicts(user_email, range_start, range_end)
+            ]
+            source = "calendar_store"
+        except Exception as e:
+            print(f"DEBUG: Event store unavailable, using freebusy: {str(e)}")
+            # Working hours are in the calendar's zone, as on the store path
+            time_zone = calendar_store.time_zone(user_email) or execute(
+                service.calendars().get(calendarId='primary')
+            ).get('timeZone') or 'UTC'
+            tz = ZoneInfo(time_zone)
+            range_start = datetime.combine(first_day, day_start, tz)
+            range_end = datetime.combine(last_day, day_end, tz)
+            result = execute(service.freebusy().query(body={
+                "timeMin": range_start.isoformat(),
+                "timeMax": range_end.isoformat(),
+                "items": [{"id": "primary"}]
+            }))
+            busy = [
+                (event_time({'dateTime': period['start']}), event_time({'dateTime': period['end']}))
+                for period in result.get('calendars', {}).get('primary', {}).get('busy', [])
+            ]
+            source = "freebusy"
+        
+        windows = free_windows(
+            busy, first_day, last_day, tz, work_start=day_start, work_end=day_end,
+            min_minutes=min_duration_minutes, buffer_minutes=buffer_minutes,
+            not_before=datetime.now().timestamp(), include_weekends=include_weekends
+        )
+        if prefer_longest:
+            windows.sort(key=lambda window: window[1] - window[0], reverse=True)
+        
+        return {
+            "slots": [{
+                "start": datetime.fromtimestamp(start, tz).isoformat(),
+                "end": datetime.fromtimestamp(end, tz).isoformat(),
+                "minutes": int((end - start) // 60)
+            } for start, end in windows[:max_results]],
+            "total_found": len(windows),
+            "time_zone": time_zone,
+            "source": source
+        }
     except Exception as e:
         return {"error": str(e)}
 
@@ -180,15 +329,14 @@ def search_drive_files(user_email: str, query: str, max_results: int = 10) -> di
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('drive', 'v3', credentials=credentials)
+    service = get_service(user_email, token, 'drive', 'v3')
     
     try:
-        results = service.files().list(
+        results = execute(service.files().list(
             q=f"name contains '{query}'",
             pageSize=max_results,
             fields="files(id, name, mimeType, modifiedTime)"
-        ).execute()
+        ))
         files = results.get('files', [])
         
         return {"files": files}
@@ -201,8 +349,7 @@ def create_task(user_email: str, title: str, notes: str = "", due_date: str = ""
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('tasks', 'v1', credentials=credentials)
+    service = get_service(user_email, token, 'tasks', 'v1')
     
     task = {
         'title': title,
@@ -212,23 +359,85 @@ def create_task(user_email: str, title: str, notes: str = "", due_date: str = ""
         task['due'] = due_date
     
     try:
-        created_task = service.tasks().insert(tasklist='@default', body=task).execute()
+        created_task = execute(service.tasks().insert(tasklist='@default', body=task))
+        tasks_store.record(user_email, tasklist_id_of(created_task), created_task)
         return {"success": True, "task_id": created_task['id'], "title": created_task['title']}
     except Exception as e:
         return {"error": str(e)}
 
-async def get_tasks(user_email: str, max_results: int = 15) -> dict:
-    """Get user's tasks from Google Tasks. Optimized for parallel execution."""
+def create_tasks_bulk(user_email: str, tasks: str) -> dict:
+    """Create many Google Tasks in one batch request. Pass tasks as JSON string.
+
+    Each task is an object with title and optional notes and due_date, the
+    same fields create_task takes. Returns a result per task in the given
+    order; one failure does not stop the rest.
+    """
+    try:
+        task_list = json.loads(tasks) if isinstance(tasks, str) else tasks
+    except ValueError as e:
+        return {"error": f"Invalid tasks JSON: {str(e)}"}
+
     token = get_user_token(user_email)
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('tasks', 'v1', credentials=credentials)
+    service = get_service(user_email, token, 'tasks', 'v1')
+    
+    requests = []
+    try:
+        for task in task_list:
+            body = {'title': task['title'], 'notes': task.get('notes', '')}
+            if task.get('due_date'):
+                body['due'] = task['due_date']
+            requests.append(service.tasks().insert(tasklist='@default', body=body))
+    except (KeyError, TypeError) as e:
+        return {"error": f"Each task needs a title: {str(e)}"}
+
+    try:
+        responses = execute_batch(service, requests)
+    except Exception as e:
+        return {"error": str(e)}
+
+    results = []
+    for index, (task, (response, exception)) in enumerate(zip(task_list, responses)):
+        if exception is not None or response is None:
+            results.append({"index": index, "title": task['title'], "success": False,
+                            "error": str(exception) if exception else "No response"})
+        else:
+            tasks_store.record(user_email, tasklist_id_of(response), response)
+            results.append({"index": index, "title": response['title'], "success": True,
+                            "task_id": response['id']})
+
+    created = sum(1 for result in results if result["success"])
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+async def get_tasks(user_email: str, max_results: int = 15, status: str = "", due_within_days: int = None) -> dict:
+    """Get user's tasks from all Google Tasks lists. Optimized for parallel execution.
+    
+    Args:
+        user_email: User's email address (required)
+        max_results: Maximum number of tasks to return (optional, default: 15)
+        status: 'needsAction' for incomplete or 'completed' (optional, default: incomplete first, then completed)
+        due_within_days: Only tasks overdue or due within this many days (optional)
+    """
+    token = await run_blocking(get_user_token, user_email)
+    if not token:
+        return {"error": "User not authenticated"}
+    
+    service = get_service(user_email, token, 'tasks', 'v1')
     
     try:
-        results = service.tasks().list(tasklist='@default', maxResults=max_results).execute()
-        tasks = results.get('items', [])
+        # Served from the synced task store; only changes hit the API
+        await run_blocking(tasks_store.sync, user_email, service)
+        due_before = None
+        if due_within_days is not None:
+            due_before = (datetime.now() + timedelta(days=due_within_days)).timestamp()
+        if status:
+            tasks = tasks_store.query(user_email, status=status, due_before=due_before, limit=max_results)
+        else:
+            tasks = tasks_store.query(user_email, status='needsAction', due_before=due_before, limit=max_results)
+            tasks += tasks_store.query(user_email, status='completed', due_before=due_before,
+                                       limit=max_results - len(tasks))[:max_results - len(tasks)]
         
         task_list = []
         for task in tasks:
@@ -239,7 +448,6 @@ async def get_tasks(user_email: str, max_results: int = 15) -> dict:
                 "status": task.get('status', ''),
                 "id": task['id']
             })
-            await asyncio.sleep(0)  # Yield control
         
         return {"tasks": task_list}
     except Exception as e:
@@ -251,15 +459,14 @@ def get_contacts(user_email: str, max_results: int = 50) -> dict:
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('people', 'v1', credentials=credentials)
+    service = get_service(user_email, token, 'people', 'v1')
     
     try:
-        results = service.people().connections().list(
+        results = execute(service.people().connections().list(
             resourceName='people/me',
             pageSize=max_results,
             personFields='names,emailAddresses,phoneNumbers'
-        ).execute()
+        ))
         connections = results.get('connections', [])
         
         contact_list = []
@@ -292,33 +499,20 @@ def get_current_datetime() -> dict:
 def store_priority_tasks(user_email: str, tasks: str) -> dict:
     """Store user's top 5 priority tasks in Firestore. Pass tasks as JSON string."""
     try:
-        import json
         tasks_list = json.loads(tasks) if isinstance(tasks, str) else tasks
-        
-        db = firestore.Client(database='smartsolve')
-        doc_ref = db.collection('priority_tasks').document(user_email)
-        
-        doc_ref.set({
-            "tasks": tasks_list[:5],  # Limit to top 5
-            "updated_at": firestore.SERVER_TIMESTAMP,
-            "user_email": user_email
-        })
-        
-        return {"success": True, "message": f"Stored {len(tasks_list[:5])} priority tasks"}
+        message = priority_store.mutate(user_email, {"op": "store", "tasks": tasks_list})
+        return {"success": True, "message": message}
     except Exception as e:
         return {"error": str(e)}
 
 def get_priority_tasks(user_email: str) -> dict:
     """Get user's stored priority tasks from Firestore."""
     try:
-        db = firestore.Client(database='smartsolve')
-        doc_ref = db.collection('priority_tasks').document(user_email)
-        doc = doc_ref.get()
+        data = priority_store.read(user_email)
         
-        if not doc.exists:
+        if data is None:
             return {"tasks": [], "message": "No priority tasks found"}
         
-        data = doc.to_dict()
         return {
             "tasks": data.get("tasks", []),
             "updated_at": data.get("updated_at"),
@@ -330,53 +524,21 @@ def get_priority_tasks(user_email: str) -> dict:
 def update_priority_task(user_email: str, task_index: int, updated_task: str) -> dict:
     """Update a specific priority task. Pass updated_task as JSON string."""
     try:
-        import json
         task_dict = json.loads(updated_task) if isinstance(updated_task, str) else updated_task
-        
-        db = firestore.Client(database='smartsolve')
-        doc_ref = db.collection('priority_tasks').document(user_email)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            return {"error": "No priority tasks found to update"}
-        
-        data = doc.to_dict()
-        tasks = data.get("tasks", [])
-        
-        if 0 <= task_index < len(tasks):
-            tasks[task_index] = task_dict
-            doc_ref.update({
-                "tasks": tasks,
-                "updated_at": firestore.SERVER_TIMESTAMP
-            })
-            return {"success": True, "message": f"Updated task {task_index + 1}"}
-        else:
-            return {"error": "Invalid task index"}
+        message = priority_store.mutate(user_email, {"op": "update", "index": task_index, "task": task_dict})
+        return {"success": True, "message": message}
+    except LookupError:
+        return {"error": "No priority tasks found to update"}
     except Exception as e:
         return {"error": str(e)}
 
 def delete_priority_task(user_email: str, task_index: int) -> dict:
     """Delete a specific priority task."""
     try:
-        db = firestore.Client(database='smartsolve')
-        doc_ref = db.collection('priority_tasks').document(user_email)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            return {"error": "No priority tasks found to delete"}
-        
-        data = doc.to_dict()
-        tasks = data.get("tasks", [])
-        
-        if 0 <= task_index < len(tasks):
-            deleted_task = tasks.pop(task_index)
-            doc_ref.update({
-                "tasks": tasks,
-                "updated_at": firestore.SERVER_TIMESTAMP
-            })
-            return {"success": True, "message": f"Deleted task: {deleted_task.get('title', 'Unknown')}"}
-        else:
-            return {"error": "Invalid task index"}
+        message = priority_store.mutate(user_email, {"op": "delete", "index": task_index})
+        return {"success": True, "message": message}
+    except LookupError:
+        return {"error": "No priority tasks found to delete"}
     except Exception as e:
         return {"error": str(e)}
 
@@ -386,8 +548,7 @@ def send_email(user_email: str, to: str, subject: str, body: str, cc: str = "",
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('gmail', 'v1', credentials=credentials)
+    service = get_service(user_email, token, 'gmail', 'v1')
     
     try:
         import base64
@@ -406,10 +567,10 @@ def send_email(user_email: str, to: str, subject: str, body: str, cc: str = "",
         
         raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
         
-        result = service.users().messages().send(
+        result = execute(service.users().messages().send(
             userId='me',
             body={'raw': raw_message}
-        ).execute()
+        ))
         
         return {"success": True, "message_id": result['id']}
     except Exception as e:
@@ -421,11 +582,10 @@ def delete_email(user_email: str, message_id: str) -> dict:
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('gmail', 'v1', credentials=credentials)
+    service = get_service(user_email, token, 'gmail', 'v1')
     
     try:
-        service.users().messages().delete(userId='me', id=message_id).execute()
+        execute(service.users().messages().delete(userId='me', id=message_id))
         return {"success": True, "message": f"Email {message_id} deleted"}
     except Exception as e:
         return {"error": str(e)}
@@ -440,8 +600,7 @@ def modify_email_labels(user_email: str, message_id: str, add_labels: str = "",
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('gmail', 'v1', credentials=credentials)
+    service = get_service(user_email, token, 'gmail', 'v1')
     
     try:
         body = {}
@@ -450,31 +609,86 @@ def modify_email_labels(user_email: str, message_id: str, add_labels: str = "",
         if remove_labels:
             body['removeLabelIds'] = [label.strip() for label in remove_labels.split(',')]
         
-        result = service.users().messages().modify(
+        result = execute(service.users().messages().modify(
             userId='me',
             id=message_id,
             body=body
-        ).execute()
+        ))
         
         return {"success": True, "message_id": result['id']}
     except Exception as e:
         return {"error": str(e)}
 
+def _bulk_message_ids(service, message_ids: str, query: str, max_messages: int):
+    """Resolve the target of a bulk Gmail tool: explicit IDs or a search query.
+
+    Returns (ids, truncated), where truncated means more than max_messages matched.
+    """
+    if message_ids:
+        ids = [message_id.strip() for message_id in message_ids.split(',') if message_id.strip()]
+    else:
+        # One extra ID tells a query that hit the cap apart from one that matched exactly
+        ids = list_message_ids(service, query, max_messages + 1)
+    return ids[:max_messages], len(ids) > max_messages
+
+def modify_emails_bulk(user_email: str, message_ids: str = "", query: str = "", add_labels: str = "",
+                       remove_labels: str = "", max_messages: int = 5000) -> dict:
+    """Modify labels on many emails at once (archive, mark read, star, ...).
+    
+    Pass either message_ids as a comma-separated string or a Gmail search
+    query such as 'from:newsletter@example.com older_than:30d'. Query
+    matches are found server-side, so there is no need to list them first.
+    Archive: remove_labels='INBOX'. Mark read: remove_labels='UNREAD'.
+    Move to trash: add_labels='TRASH'.
+    """
+    if not message_ids and not query:
+        return {"error": "Pass message_ids or a query"}
+    if not add_labels and not remove_labels:
+        return {"error": "Pass add_labels or remove_labels"}
+
+    token = get_user_token(user_email)
+    if not token:
+        return {"error": "User not authenticated"}
+    
+    service = get_service(user_email, token, 'gmail', 'v1')
+    
+    try:
+        ids, truncated = _bulk_message_ids(service, message_ids, query, max_messages)
+        body = {}
+        if add_labels:
+            body['addLabelIds'] = [label.strip() for label in add_labels.split(',')]
+        if remove_labels:
+            body['removeLabelIds'] = [label.strip() for label in remove_labels.split(',')]
+        
+        for i in range(0, len(ids), GMAIL_BULK_LIMIT):
+            chunk = ids[i:i + GMAIL_BULK_LIMIT]
+            execute(service.users().messages().batchModify(userId='me', body=dict(body, ids=chunk)))
+            if GMAIL_MIRROR_ENABLED:
+                # Keep mirror searches consistent with the change until the next history sync
+                try:
+                    mirror.apply_label_changes(user_email, chunk, body.get('addLabelIds', ()),
+                                               body.get('removeLabelIds', ()))
+                except Exception as e:
+                    print(f"DEBUG: Could not update Gmail mirror: {str(e)}")
+        
+        return {"success": True, "modified": len(ids), "truncated": truncated}
+    except Exception as e:
+        return {"error": str(e)}
+
 def reply_to_email(user_email: str, message_id: str, reply_body: str) -> dict:
     """Reply to an email."""
     token = get_user_token(user_email)
     if not token:
         return {"error": "User not authenticated"}
     
-    credentials = Credentials(token=token)
-    service = build('gmail', 'v1', credentials=credentials)
+    service = get_service(user_email, token, 'gmail', 'v1')
     
     try:
         import base64
         from email.mime.text import MIMEText
         
         # Get original message
-        original = service.users().messages().get(userId='me', id=message_id).execute()
+        original = execute(service.users().messages().get(userId='me', id=message_id))
         headers = original['payload'].get('headers', [])
         
         original_subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
@@ -490,98 +704,109 @@ def reply_to_email(user_email: str, message_id: str, reply_body: str) -> dict:
         
         raw_reply = base64.urlsafe_b64encode(reply.as_bytes()).decode()
         
-        result = service.users().messages().send(
+        result = execute(service.users().messages().send(
             userId='me',
             body={
                 'raw': raw_reply,
                 'threadId': thread_id
             }
-        ).execute()
+        ))
         
         return {"success": True, "message_id": result['id']}
     except Exception as e:
         return {"error": str(e)}
 
+# How many items of each kind generate_priority_tasks scores
+PRIORITY_EMAIL_LIMIT = int(os.getenv("PRIORITY_EMAIL_LIMIT", 200))
+PRIORITY_EVENT_LIMIT = int(os.getenv("PRIORITY_EVENT_LIMIT", 100))
+PRIORITY_TASK_LIMIT = int(os.getenv("PRIORITY_TASK_LIMIT", 1000))
+
+async def gather_priority_sources(user_email: str):
+    """Fetch the emails, events and tasks priority scoring looks at.
+
+    Returns (emails, events, tasks, failed) where failed names the
+    sources that could not be loaded and came back empty.
+    """
+    # Execute all API calls in parallel; each fetch runs on the Google API
+    # worker pool, so the fan-out takes as long as the slowest call
+    emails, events, tasks = await asyncio.gather(
+        get_gmail_messages(user_email, max_results=PRIORITY_EMAIL_LIMIT),
+        get_calendar_events(user_email, max_results=PRIORITY_EVENT_LIMIT),
+        get_tasks(user_email, max_results=PRIORITY_TASK_LIMIT, status='needsAction'),
+        return_exceptions=True
+    )
+    
+    # Handle exceptions gracefully
+    failed = []
+    if isinstance(emails, Exception) or "error" in emails:
+        emails = {"emails": []}
+        failed.append("gmail")
+    if isinstance(events, Exception) or "error" in events:
+        events = {"events": []}
+        failed.append("calendar")
+    if isinstance(tasks, Exception) or "error" in tasks:
+        tasks = {"tasks": []}
+        failed.append("tasks")
+    return emails.get('emails', []), events.get('events', []), tasks.get('tasks', []), failed
+
 async def generate_priority_tasks(user_email: str) -> dict:
     """Analyze user data in parallel and generate top 5 priority tasks."""
     print("DEBUG: Generating priority tasks with parallel execution...")
     
-    # Execute all API calls in parallel
     try:
-        emails_task = get_gmail_messages(user_email, max_results=10)
-        events_task = get_calendar_events(user_email, max_results=10)
-        tasks_task = get_tasks(user_email, max_results=15)
-        
-        # Wait for all tasks to complete
-        emails, events, tasks = await asyncio.gather(
-            emails_task, events_task, tasks_task,
-            return_exceptions=True
-        )
-        
-        # Handle exceptions gracefully
-        if isinstance(emails, Exception) or "error" in emails:
-            emails = {"emails": []}
-        if isinstance(events, Exception) or "error" in events:
-            events = {"events": []}
-        if isinstance(tasks, Exception) or "error" in tasks:
-            tasks = {"tasks": []}
-        
+        email_list, event_list, task_list, _ = await gather_priority_sources(user_email)
     except Exception as e:
         return {"error": f"Parallel execution failed: {str(e)}"}
     
-    priority_tasks = []
-    
-    # Analyze emails for urgent items
-    urgent_keywords = ['urgent', 'asap', 'deadline', 'due', 'important', 'reminder', 'action required']
-    for email in emails.get('emails', []):
-        subject = email.get('subject', '').lower()
-        if any(keyword in subject for keyword in urgent_keywords):
-            priority_tasks.append({
-                "title": f"Respond to: {email.get('subject', 'Email')}",
-                "source": "email",
-                "priority": "high",
-                "from": email.get('from', 'Unknown'),
-                "type": "communication"
-            })
-    
-    # Analyze calendar for today's events
-    today = datetime.now().strftime('%Y-%m-%d')
-    for event in events.get('events', []):
-        if today in event.get('start', ''):
-            priority_tasks.append({
-                "title": f"Attend: {event.get('summary', 'Meeting')}",
-                "source": "calendar",
-                "priority": "high",
-                "time": event.get('start', ''),
-                "type": "meeting"
-            })
-    
-    # Add incomplete Google Tasks
-    for task in tasks.get('tasks', []):
-        if task.get('status') != 'completed':
-            priority_tasks.append({
-                "title": task.get('title', 'Task'),
-                "source": "google_tasks",
-                "priority": "medium",
-                "notes": task.get('notes', ''),
-                "type": "task"
-            })
-    
-    # Sort by priority and limit to top 5
-    priority_order = {'high': 3, 'medium': 2, 'low': 1}
-    priority_tasks.sort(key=lambda x: priority_order.get(x['priority'], 0), reverse=True)
-    top_5_tasks = priority_tasks[:5]
+    # Score everything in one pass and keep the top 5
+    top_5_tasks, total_analyzed = default_scorer.top_k(email_list, event_list, task_list, k=5)
     
-    # Store in Firestore
-    store_result = store_priority_tasks(user_email, top_5_tasks)
+    # Store in Firestore right away, even with write-behind on; the dashboard reads it next
+    try:
+        message = await run_blocking(
+            priority_store.mutate, user_email, {"op": "generate", "tasks": top_5_tasks}, defer=False
+        )
+        store_result = {"success": True, "message": message}
+    except Exception as e:
+        store_result = {"error": str(e)}
     
     return {
         "generated_tasks": top_5_tasks,
-        "total_analyzed": len(priority_tasks),
+        "total_analyzed": total_analyzed,
         "storage_result": store_result,
-        "summary": f"Generated {len(top_5_tasks)} priority tasks from {len(emails.get('emails', []))} emails, {len(events.get('events', []))} events, and {len(tasks.get('tasks', []))} tasks (parallel execution)."
+        "summary": f"Generated {len(top_5_tasks)} priority tasks from {len(email_list)} emails, {len(event_list)} events, and {len(task_list)} tasks (parallel execution)."
     }
 
+async def refresh_priority_tasks(user_email: str, previous: str = None):
+    """Background job: rescore and store priority tasks unless the inputs are unchanged.
+
+    Lists the user or the agent edited are left alone until the next
+    explicit generate_priority_tasks.
+    """
+    stored = await run_blocking(priority_store.read, user_email)
+    if stored is not None and stored.get("source", "edited") != "generated":
+        return previous, False
+    email_list, event_list, task_list, failed = await gather_priority_sources(user_email)
+    if failed:
+        # Keep the last good list rather than storing one built from partial data
+        raise RuntimeError(f"Could not load {', '.join(failed)}")
+    fingerprint = hashlib.sha256(
+        json.dumps([email_list, event_list, task_list], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    if fingerprint == previous:
+        return fingerprint, False
+    top_5_tasks, _ = default_scorer.top_k(email_list, event_list, task_list, k=5)
+    await run_blocking(priority_store.mutate, user_email, {"op": "refresh", "tasks": top_5_tasks}, defer=False)
+    return fingerprint, True
+
+priority_scheduler = PrecomputeScheduler(refresh_priority_tasks)
+
+def after_turn(callback_context):
+    """Commit the turn's queued writes and keep the user's precomputed data warm."""
+    flush_priority_writes(callback_context)
+    priority_scheduler.touch(getattr(callback_context, 'user_id', None))
+    return None
+
 root_agent = Agent(
     model='gemini-2.5-flash',
     name='personal_life_assistant',
@@ -602,9 +827,9 @@ When a user provides a topic for a "Study Plan" or "Project Plan":
 
 Scanning: Automatically call get_current_tasks and get_calendar_events for the upcoming 7 days.
 
-Time Boxing: Identify free blocks between 8:00 AM and 7:00 PM.
+Time Boxing: Call find_free_slots once for the upcoming 7 days (working hours 8:00 AM to 7:00 PM) to get the free blocks. Do not work out gaps from raw event lists.
 
-Execution: 1. Break the topic into logical sub-steps/milestones. 2. Automatically find the earliest available gaps and create Google Calendar events titled "Focus: [Sub-topic]". 3. Create corresponding Google Tasks with specific deadlines for each block.
+Execution: 1. Break the topic into logical sub-steps/milestones. 2. Automatically find the earliest available gaps and create Google Calendar events titled "Focus: [Sub-topic]". 3. Create corresponding Google Tasks with specific deadlines for each block. Create all the events with one create_calendar_events_bulk call and all the tasks with one create_tasks_bulk call instead of one call per item.
 
 Constraint: Do not ask for permission to schedule unless the calendar is completely full. Act first, then present the organized plan.
 
@@ -626,7 +851,8 @@ Example: "You have a meeting at 10 AM. I’ve identified an urgent email from Da
 4. Advanced Autonomous Use Cases
 
 **Smart Email Triage & Auto-Response**:
-- When detecting emails with meeting requests, automatically check calendar availability and suggest 3 time slots
+- To archive, label or trash many emails, call modify_emails_bulk once with a Gmail search query instead of acting on messages one by one
+- When detecting emails with meeting requests, call find_free_slots and suggest 3 of the returned time slots
 - For emails marked "urgent" from VIPs, create immediate calendar blocks for response time
 - Auto-categorize emails by type (action required, FYI, meeting request) and create tasks accordingly
 - Detect follow-up emails and automatically move related tasks to higher priority
@@ -732,7 +958,11 @@ Agent: Responds: "I've organized your day. Your 3 unread emails are summarized b
     *Today's Date: {datetime.datetime.now().strftime("%Y-%m-%d")}*
    
     """,
-    tools=[get_current_datetime, get_gmail_messages, send_email, reply_to_email, delete_email, modify_email_labels,
-           get_calendar_events, create_calendar_event, search_drive_files, create_task, get_tasks, get_contacts,
-           store_priority_tasks, get_priority_tasks, update_priority_task, delete_priority_task, generate_priority_tasks],
+    after_agent_callback=after_turn,
+    # Each tool is wrapped to record latency and result size on /metrics
+    tools=[instrument_tool(tool) for tool in [get_current_datetime, get_gmail_messages, send_email, reply_to_email, delete_email, modify_email_labels,
+           modify_emails_bulk,
+           get_calendar_events, create_calendar_event, create_calendar_events_bulk, find_free_slots, search_drive_files,
+           create_task, create_tasks_bulk, get_tasks, get_contacts,
+           store_priority_tasks, get_priority_tasks, update_priority_task, delete_priority_task, generate_priority_tasks]],
 )
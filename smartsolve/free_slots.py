@@ -0,0 +1,51 @@
+"""Free time windows from busy intervals.
+
+Busy intervals are padded with the buffer, merged into a sorted list of
+disjoint intervals and walked once per day of the requested range.
+"""
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+
+def merge_intervals(intervals):
+    """Merge overlapping (start, end) pairs into sorted, disjoint intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+def free_windows(busy, first_day, last_day, tz, work_start=time(8), work_end=time(19),
+                 min_minutes=30, buffer_minutes=0, not_before=None, include_weekends=True):
+    """Return (start, end) timestamps of free windows inside working hours.
+
+    busy holds (start, end) timestamps. Each day from first_day to
+    last_day (inclusive dates) contributes the gaps between busy
+    intervals that are at least min_minutes long, after keeping
+    buffer_minutes clear on either side of every busy interval.
+    """
+    buffer = buffer_minutes * 60
+    min_length = min_minutes * 60
+    merged = merge_intervals((start - buffer, end + buffer) for start, end in busy)
+    # Disjoint and sorted, so ends are sorted too
+    ends = [interval[1] for interval in merged]
+
+    windows = []
+    day = first_day
+    while day <= last_day:
+        if include_weekends or day.weekday() < 5:
+            day_start = datetime.combine(day, work_start, tz).timestamp()
+            day_end = datetime.combine(day, work_end, tz).timestamp()
+            cursor = max(day_start, not_before) if not_before else day_start
+            i = bisect_right(ends, cursor)
+            while i < len(merged) and merged[i][0] < day_end:
+                if merged[i][0] - cursor >= min_length:
+                    windows.append((cursor, merged[i][0]))
+                cursor = max(cursor, merged[i][1])
+                i += 1
+            if day_end - cursor >= min_length:
+                windows.append((cursor, day_end))
+        day += timedelta(days=1)
+    return windows
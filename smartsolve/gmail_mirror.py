@@ -0,0 +1,407 @@
+"""Per-user local mirror of Gmail message metadata.
+
+The first sync lists recent messages and loads their headers in batches.
+It can take thousands of requests, so it runs in a background thread and
+searches go to the API until it finishes. Later syncs apply only the
+changes reported by users.history.list, and a background full resync runs
+when Gmail no longer has the stored historyId. Label changes the agent
+makes are applied to the mirror right away.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List
+from googleapiclient.errors import HttpError
+from api_executor import execute, execute_batch
+
+GMAIL_MIRROR_ENABLED = os.getenv("GMAIL_MIRROR_ENABLED", "true").lower() == "true"
+GMAIL_MIRROR_PATH = os.getenv("GMAIL_MIRROR_PATH", "data/gmail_mirror.db")
+# Seconds a mirror is considered fresh before the next delta sync
+GMAIL_MIRROR_MAX_AGE = int(os.getenv("GMAIL_MIRROR_MAX_AGE", 60))
+# How far back the full sync reaches; older queries go to the API
+GMAIL_MIRROR_WINDOW_DAYS = int(os.getenv("GMAIL_MIRROR_WINDOW_DAYS", 30))
+
+# Gmail accepts at most 100 calls per batch request
+GMAIL_BATCH_SIZE = 100
+GMAIL_METADATA_HEADERS = ['Subject', 'From', 'Date']
+# batchModify accepts at most 1000 IDs per call
+GMAIL_BULK_LIMIT = 1000
+
+# Search operators the mirror can answer, mapped to system label IDs
+SYSTEM_LABELS = {
+    'is:unread': 'UNREAD',
+    'is:starred': 'STARRED',
+    'is:important': 'IMPORTANT',
+    'in:inbox': 'INBOX',
+    'in:sent': 'SENT',
+    'label:inbox': 'INBOX',
+    'label:unread': 'UNREAD',
+    'label:starred': 'STARRED',
+    'label:important': 'IMPORTANT',
+    'label:sent': 'SENT',
+}
+HIDDEN_LABELS = ('SPAM', 'TRASH')
+
+def fetch_message_metadata(service, message_ids: List[str], missing: set = None, failed: set = None) -> List[dict]:
+    """Fetch header metadata for many messages with batched Gmail requests.
+
+    Uses format=metadata so only the Subject, From and Date headers are
+    returned. Messages that fail to load are skipped; IDs that no longer
+    exist are added to missing and IDs that failed otherwise to failed,
+    when those are given.
+    """
+    requests = [
+        service.users().messages().get(
+            userId='me', id=message_id, format='metadata', metadataHeaders=GMAIL_METADATA_HEADERS
+        )
+        for message_id in message_ids
+    ]
+    messages = []
+    for message_id, (response, exception) in zip(message_ids, execute_batch(service, requests, GMAIL_BATCH_SIZE)):
+        if exception is None:
+            messages.append(response)
+        elif missing is not None and isinstance(exception, HttpError) and exception.resp.status == 404:
+            missing.add(message_id)
+        else:
+            print(f"DEBUG: Failed to fetch message {message_id}: {str(exception)}")
+            if failed is not None:
+                failed.add(message_id)
+    return messages
+
+def list_message_ids(service, query: str, limit: int) -> List[str]:
+    """Return up to limit IDs of messages matching a Gmail search query."""
+    message_ids = []
+    page_token = None
+    while len(message_ids) < limit:
+        result = execute(service.users().messages().list(
+            userId='me', q=query, maxResults=min(limit - len(message_ids), 500),
+            pageToken=page_token, fields='messages/id,nextPageToken'
+        ))
+        message_ids.extend(message['id'] for message in result.get('messages', []))
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            break
+    return message_ids
+
+def message_header(message, name, default=''):
+    headers = message.get('payload', {}).get('headers', [])
+    return next((h['value'] for h in headers if h['name'] == name), default)
+
+def parse_mirror_query(query: str):
+    """Translate a Gmail search query into mirror filters.
+
+    Returns a dict of labels and senders, or None when the query uses
+    anything the mirror cannot answer exactly.
+    """
+    labels = []
+    senders = []
+    for term in query.split():
+        lowered = term.lower()
+        if lowered in SYSTEM_LABELS:
+            labels.append(SYSTEM_LABELS[lowered])
+        elif lowered.startswith('from:') and len(term) > 5:
+            senders.append(term[5:])
+        else:
+            return None
+    return {"labels": labels, "senders": senders}
+
+class MirrorStore:
+    """Storage interface for mirrored message metadata."""
+    def get_state(self, user_email):
+        raise NotImplementedError
+
+    def set_state(self, user_email, history_id, synced_at, window_start):
+        raise NotImplementedError
+
+    def replace_all(self, user_email, messages):
+        raise NotImplementedError
+
+    def upsert_messages(self, user_email, messages):
+        raise NotImplementedError
+
+    def delete_messages(self, user_email, message_ids):
+        raise NotImplementedError
+
+    def relabel_messages(self, user_email, message_ids, add=(), remove=()):
+        raise NotImplementedError
+
+    def search(self, user_email, after_ts, before_ts, labels=(), senders=(), limit=10):
+        raise NotImplementedError
+
+class SQLiteMirrorStore(MirrorStore):
+    """Default on-disk store. One database file holds every user's mirror."""
+    def __init__(self, path=GMAIL_MIRROR_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS messages (
+                user_email TEXT, id TEXT, thread_id TEXT, labels TEXT,
+                subject TEXT, sender TEXT, date TEXT, internal_date INTEGER, snippet TEXT,
+                PRIMARY KEY (user_email, id))""")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS messages_by_date ON messages (user_email, internal_date)"
+            )
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS sync_state (
+                user_email TEXT PRIMARY KEY, history_id TEXT, synced_at REAL, window_start REAL)""")
+
+    def get_state(self, user_email):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history_id, synced_at, window_start FROM sync_state WHERE user_email = ?",
+                (user_email,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"history_id": row[0], "synced_at": row[1], "window_start": row[2]}
+
+    def set_state(self, user_email, history_id, synced_at, window_start):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                (user_email, history_id, synced_at, window_start)
+            )
+
+    def replace_all(self, user_email, messages):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE user_email = ?", (user_email,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._row(user_email, message) for message in messages]
+            )
+
+    def upsert_messages(self, user_email, messages):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._row(user_email, message) for message in messages]
+            )
+
+    def delete_messages(self, user_email, message_ids):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM messages WHERE user_email = ? AND id = ?",
+                [(user_email, message_id) for message_id in message_ids]
+            )
+
+    def relabel_messages(self, user_email, message_ids, add=(), remove=()):
+        message_ids = list(message_ids)
+        with self._lock, self._conn:
+            rows = []
+            # Stay under SQLite's limit on bound parameters
+            for i in range(0, len(message_ids), 500):
+                chunk = message_ids[i:i + 500]
+                rows += self._conn.execute(
+                    f"SELECT id, labels FROM messages WHERE user_email = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [user_email, *chunk]
+                ).fetchall()
+            updates = []
+            for message_id, labels in rows:
+                current = [label for label in labels.split(',') if label]
+                kept = [label for label in current if label not in remove]
+                new = kept + [label for label in add if label not in kept]
+                updates.append((',' + ','.join(new) + ',', user_email, message_id))
+            self._conn.executemany("UPDATE messages SET labels = ? WHERE user_email = ? AND id = ?", updates)
+
+    def search(self, user_email, after_ts, before_ts, labels=(), senders=(), limit=10):
+        sql = ("SELECT id, thread_id, labels, subject, sender, date, snippet FROM messages "
+               "WHERE user_email = ? AND internal_date >= ? AND internal_date < ?")
+        params = [user_email, int(after_ts * 1000), int(before_ts * 1000)]
+        for label in labels:
+            sql += " AND labels LIKE ?"
+            params.append(f"%,{label},%")
+        for label in HIDDEN_LABELS:
+            if label not in labels:
+                sql += " AND labels NOT LIKE ?"
+                params.append(f"%,{label},%")
+        for sender in senders:
+            sql += " AND sender LIKE ?"
+            params.append(f"%{sender}%")
+        sql += " ORDER BY internal_date DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{
+            "id": row[0],
+            "thread_id": row[1],
+            "labels": [label for label in row[2].split(',') if label],
+            "subject": row[3],
+            "from": row[4],
+            "date": row[5],
+            "snippet": row[6]
+        } for row in rows]
+
+    def _row(self, user_email, message):
+        return (
+            user_email,
+            message['id'],
+            message.get('threadId'),
+            ',' + ','.join(message.get('labelIds', [])) + ',',
+            message_header(message, 'Subject', 'No Subject'),
+            message_header(message, 'From', 'Unknown'),
+            message_header(message, 'Date'),
+            int(message.get('internalDate', 0)),
+            message.get('snippet', '')
+        )
+
+class GmailMirror:
+    """Keeps each user's mirror in step with Gmail and answers simple searches."""
+    def __init__(self, store=None, max_age=GMAIL_MIRROR_MAX_AGE, window_days=GMAIL_MIRROR_WINDOW_DAYS):
+        self._store = store
+        self.max_age = max_age
+        self.window_days = window_days
+        self._locks = {}
+        self._lock = threading.Lock()
+        # Users whose full sync is running in the background
+        self._full_syncs = set()
+
+    @property
+    def store(self):
+        # Opened on first use so importing the agent never touches the disk
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = SQLiteMirrorStore()
+        return self._store
+
+    def _lock_for(self, user_email):
+        with self._lock:
+            return self._locks.setdefault(user_email, threading.Lock())
+
+    def sync(self, user_email, service, force=False):
+        """Bring the mirror up to date unless it was synced within max_age seconds.
+
+        Returns the sync state, or None while a full sync runs in the
+        background or after a sync that could not load every changed
+        message, when the mirror cannot answer yet.
+        """
+        # Checked before taking the user's lock, which the full sync holds
+        if user_email in self._full_syncs:
+            return None
+        with self._lock_for(user_email):
+            state = self.store.get_state(user_email)
+            if state and not force and time.time() - state["synced_at"] < self.max_age:
+                return state
+            if state is None:
+                self._start_full_sync(user_email, service)
+                return None
+            try:
+                return self._delta_sync(user_email, service, state)
+            except HttpError as e:
+                # Gmail answers 404 once the stored historyId is too old
+                if e.resp.status != 404:
+                    raise
+                print(f"DEBUG: Gmail history expired for {user_email}, resyncing")
+                self._start_full_sync(user_email, service)
+                return None
+
+    def _start_full_sync(self, user_email, service):
+        with self._lock:
+            if user_email in self._full_syncs:
+                return
+            self._full_syncs.add(user_email)
+        threading.Thread(
+            target=self._background_full_sync, args=(user_email, service),
+            name=f"gmail-mirror-{user_email}", daemon=True
+        ).start()
+
+    def _background_full_sync(self, user_email, service):
+        try:
+            with self._lock_for(user_email):
+                self._full_sync(user_email, service)
+        except Exception as e:
+            print(f"DEBUG: Gmail mirror full sync failed for {user_email}: {str(e)}")
+        finally:
+            with self._lock:
+                self._full_syncs.discard(user_email)
+
+    def apply_label_changes(self, user_email, message_ids, add=(), remove=()):
+        """Record label changes the agent just made, ahead of the next history sync."""
+        self.store.relabel_messages(user_email, message_ids, add, remove)
+
+    def search(self, user_email, service, date_from, date_to, labels=(), senders=(), max_results=10):
+        """Answer a date-range search from the mirror.
+
+        Dates use Gmail's YYYY/MM/DD form. Returns None when the mirror is
+        not ready yet or the range starts before the mirrored window.
+        """
+        after_ts = datetime.strptime(date_from, '%Y/%m/%d').timestamp()
+        before_ts = datetime.strptime(date_to, '%Y/%m/%d').timestamp()
+        state = self.sync(user_email, service)
+        if state is None or after_ts < state["window_start"]:
+            return None
+        return self.store.search(user_email, after_ts, before_ts, labels, senders, max_results)
+
+    def _full_sync(self, user_email, service):
+        print(f"DEBUG: Full Gmail mirror sync for {user_email}")
+        # Read the historyId first so changes made during the sync are replayed later
+        history_id = execute(service.users().getProfile(userId='me'))['historyId']
+        window_start = (datetime.now() - timedelta(days=self.window_days)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+
+        message_ids = []
+        page_token = None
+        while True:
+            results = execute(service.users().messages().list(
+                userId='me', q=f"after:{window_start.strftime('%Y/%m/%d')}",
+                maxResults=500, pageToken=page_token
+            ))
+            message_ids.extend(msg['id'] for msg in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        failed = set()
+        messages = fetch_message_metadata(service, message_ids, failed=failed)
+        if failed:
+            # Leave the mirror unsynced; the next search starts another full sync
+            raise RuntimeError(f"Could not load {len(failed)} of {len(message_ids)} messages")
+        self.store.replace_all(user_email, messages)
+        self.store.set_state(user_email, history_id, time.time(), window_start.timestamp())
+        return self.store.get_state(user_email)
+
+    def _delta_sync(self, user_email, service, state):
+        changed = set()
+        deleted = set()
+        history_id = state["history_id"]
+        page_token = None
+        while True:
+            results = execute(service.users().history().list(
+                userId='me', startHistoryId=state["history_id"],
+                maxResults=500, pageToken=page_token
+            ))
+            for record in results.get('history', []):
+                for item in record.get('messagesAdded', []):
+                    changed.add(item['message']['id'])
+                    deleted.discard(item['message']['id'])
+                for key in ('labelsAdded', 'labelsRemoved'):
+                    for item in record.get(key, []):
+                        changed.add(item['message']['id'])
+                for item in record.get('messagesDeleted', []):
+                    deleted.add(item['message']['id'])
+                    changed.discard(item['message']['id'])
+            history_id = results.get('historyId', history_id)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        failed = set()
+        if changed:
+            # Messages deleted after the change was recorded come back as 404s
+            messages = fetch_message_metadata(service, sorted(changed), missing=deleted, failed=failed)
+            self.store.upsert_messages(user_email, messages)
+        if deleted:
+            self.store.delete_messages(user_email, sorted(deleted))
+        if failed:
+            # Keep the old historyId so the next sync replays these changes
+            print(f"DEBUG: Gmail mirror delta incomplete for {user_email}, {len(failed)} messages failed")
+            return None
+
+        self.store.set_state(user_email, history_id, time.time(), state["window_start"])
+        return self.store.get_state(user_email)
+
+mirror = GmailMirror()
@@ -0,0 +1,115 @@
+"""Background refresh of per-user precomputed data.
+
+Users become active when they finish an agent turn. Every active user
+is refreshed on their own jittered interval by a job running in a
+dedicated thread and event loop, with at most PRECOMPUTE_CONCURRENCY jobs
+at once. A failing user backs off exponentially. Users idle for longer
+than PRECOMPUTE_ACTIVE_WINDOW are dropped.
+
+A job receives the fingerprint its previous run returned and may skip
+work when its inputs still match it. Every PRECOMPUTE_MAX_SKIP_AGE
+seconds it is called without one, because time-based scores go stale
+even when the inputs stay the same.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from metrics import PRECOMPUTE_RUNS
+
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true"
+PRECOMPUTE_INTERVAL = int(os.getenv("PRECOMPUTE_INTERVAL", 300))
+PRECOMPUTE_CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", 4))
+PRECOMPUTE_ACTIVE_WINDOW = int(os.getenv("PRECOMPUTE_ACTIVE_WINDOW", 24 * 3600))
+PRECOMPUTE_MAX_BACKOFF = int(os.getenv("PRECOMPUTE_MAX_BACKOFF", 3600))
+PRECOMPUTE_MAX_SKIP_AGE = int(os.getenv("PRECOMPUTE_MAX_SKIP_AGE", 3600))
+# Fraction of the interval added or removed at random
+PRECOMPUTE_JITTER = 0.2
+# Seconds between checks for due users
+PRECOMPUTE_TICK = 5
+
+def jittered(seconds, jitter=PRECOMPUTE_JITTER):
+    return seconds * random.uniform(1 - jitter, 1 + jitter)
+
+class UserSchedule:
+    def __init__(self, now):
+        self.last_active = now
+        # First run soon after the user shows up, spread over a few ticks
+        self.next_run = now + random.uniform(0, PRECOMPUTE_TICK * 3)
+        self.failures = 0
+        self.fingerprint = None
+        self.computed_at = 0.0
+        self.running = False
+
+class PrecomputeScheduler:
+    def __init__(self, job, interval=PRECOMPUTE_INTERVAL, concurrency=PRECOMPUTE_CONCURRENCY,
+                 enabled=PRECOMPUTE_ENABLED):
+        """job is an async callable (user_email, previous_fingerprint) -> (fingerprint, computed)."""
+        self.job = job
+        self.interval = interval
+        self.concurrency = concurrency
+        self.enabled = enabled
+        self._users = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def touch(self, user_email):
+        """Mark a user as active, starting the scheduler on first use."""
+        if not self.enabled or not user_email:
+            return
+        now = time.time()
+        with self._lock:
+            schedule = self._users.get(user_email)
+            if schedule is None:
+                self._users[user_email] = UserSchedule(now)
+            else:
+                schedule.last_active = now
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=asyncio.run, args=(self._run(),), name="precompute", daemon=True
+                )
+                self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            return {"active_users": len(self._users)}
+
+    def _due(self, now):
+        with self._lock:
+            for user_email in [u for u, s in self._users.items() if now - s.last_active > PRECOMPUTE_ACTIVE_WINDOW]:
+                del self._users[user_email]
+            due = [(u, s) for u, s in self._users.items() if not s.running and s.next_run <= now]
+            for _, schedule in due:
+                schedule.running = True
+            return due
+
+    async def _run(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        pending = set()
+        while True:
+            for user_email, schedule in self._due(time.time()):
+                task = asyncio.create_task(self._refresh(slots, user_email, schedule))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.sleep(PRECOMPUTE_TICK)
+
+    async def _refresh(self, slots, user_email, schedule):
+        async with slots:
+            now = time.time()
+            previous = schedule.fingerprint if now - schedule.computed_at < PRECOMPUTE_MAX_SKIP_AGE else None
+            try:
+                fingerprint, computed = await self.job(user_email, previous)
+                schedule.fingerprint = fingerprint
+                schedule.failures = 0
+                if computed:
+                    schedule.computed_at = time.time()
+                PRECOMPUTE_RUNS.inc("computed" if computed else "unchanged")
+                delay = jittered(self.interval)
+            except Exception as e:
+                schedule.failures += 1
+                PRECOMPUTE_RUNS.inc("failed")
+                delay = jittered(min(self.interval * 2 ** schedule.failures, PRECOMPUTE_MAX_BACKOFF))
+                print(f"DEBUG: Precompute failed for {user_email} ({schedule.failures} in a row): {str(e)}")
+            schedule.next_run = time.time() + delay
+            schedule.running = False
@@ -0,0 +1,187 @@
+"""Priority task list storage with atomic edits and optional write-behind.
+
+Each user's list lives in one priority_tasks document. Edits run inside a
+Firestore transaction, so an edit from the agent and one from the
+dashboard cannot overwrite each other. Storing or generating a whole new
+list reads nothing, so it is a single set(). With PRIORITY_WRITE_BEHIND set,
+edits made during one agent turn are queued instead and committed
+together in a single transaction when the turn ends.
+
+The document records whether its list was generated by scoring or
+edited by hand. Background refreshes only replace generated lists, and
+that check runs inside the same transaction as the write.
+"""
+import atexit
+import os
+import threading
+from google.cloud import firestore
+from client_registry import get_firestore_client
+from metrics import FIRESTORE_OPS
+
+PRIORITY_WRITE_BEHIND = os.getenv("PRIORITY_WRITE_BEHIND", "false").lower() == "true"
+# Most tasks kept in a user's list
+PRIORITY_TASK_LIMIT = 5
+# Ops that replace the whole list. generate is an explicit rescore; refresh
+# is a background rescore that leaves edited lists alone.
+REPLACE_OPS = ("store", "generate", "refresh")
+# Replace ops written without reading the document first
+BLIND_REPLACE_OPS = ("store", "generate")
+
+def apply_op(tasks, op):
+    """Apply one edit to a task list and return (new list, message).
+
+    Raises IndexError when an update or delete points past the list.
+    """
+    if op["op"] in REPLACE_OPS:
+        tasks = list(op["tasks"][:PRIORITY_TASK_LIMIT])
+        return tasks, f"Stored {len(tasks)} priority tasks"
+    index = op["index"]
+    if not 0 <= index < len(tasks):
+        raise IndexError("Invalid task index")
+    tasks = list(tasks)
+    if op["op"] == "update":
+        tasks[index] = op["task"]
+        return tasks, f"Updated task {index + 1}"
+    deleted = tasks.pop(index)
+    return tasks, f"Deleted task: {deleted.get('title', 'Unknown')}"
+
+class PriorityTaskStore:
+    def __init__(self, write_behind=PRIORITY_WRITE_BEHIND):
+        self.write_behind = write_behind
+        # user_email -> {"base": tasks as last read, "ops": queued edits}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _doc(self, user_email):
+        return get_firestore_client().collection('priority_tasks').document(user_email)
+
+    def read(self, user_email):
+        """Return the stored document as a dict, or None, including queued edits.
+
+        A list with queued edits has no source, so it counts as edited.
+        """
+        with self._lock:
+            pending = self._pending.get(user_email)
+            if pending is not None:
+                tasks = pending["base"]
+                for op in pending["ops"]:
+                    tasks, _ = apply_op(tasks, op)
+                return {"tasks": tasks, "pending_writes": len(pending["ops"])}
+        FIRESTORE_OPS.inc("priority_tasks", "read")
+        doc = self._doc(user_email).get()
+        return doc.to_dict() if doc.exists else None
+
+    def mutate(self, user_email, op, defer=None):
+        """Apply an edit now, or queue it until flush() when deferring.
+
+        Returns the edit's message. Raises LookupError when there is no
+        list to edit and IndexError for an out-of-range index.
+        """
+        defer = self.write_behind if defer is None else defer
+        if not defer:
+            # Queued edits are committed first so the write-through lands on top of them
+            self.flush(user_email)
+            if op["op"] in BLIND_REPLACE_OPS:
+                return self._replace(user_email, op)
+            return self._commit(user_email, [op])
+
+        while True:
+            with self._lock:
+                pending = self._pending.get(user_email)
+                if pending is not None:
+                    tasks = pending["base"]
+                    for queued in pending["ops"]:
+                        tasks, _ = apply_op(tasks, queued)
+                    # Validate against what the user will see once the queue is committed
+                    _, message = apply_op(tasks, op)
+                    pending["ops"].append(op)
+                    return message
+            # First edit of the turn: read the list outside the lock, then queue on top of it
+            FIRESTORE_OPS.inc("priority_tasks", "read")
+            doc = self._doc(user_email).get()
+            if not doc.exists and op["op"] not in REPLACE_OPS:
+                raise LookupError("No priority tasks found")
+            base = doc.to_dict().get("tasks", []) if doc.exists else []
+            with self._lock:
+                self._pending.setdefault(user_email, {"base": base, "ops": []})
+
+    def _replace(self, user_email, op):
+        """Write a whole new list with a single set()."""
+        tasks, message = apply_op([], op)
+        FIRESTORE_OPS.inc("priority_tasks", "write")
+        self._doc(user_email).set({
+            "tasks": tasks,
+            "source": "generated" if op["op"] == "generate" else "edited",
+            "updated_at": firestore.SERVER_TIMESTAMP,
+            "user_email": user_email
+        })
+        return message
+
+    def _commit(self, user_email, ops):
+        """Apply edits to the current document in one transaction."""
+        if not ops:
+            return None
+        db = get_firestore_client()
+        doc_ref = self._doc(user_email)
+        FIRESTORE_OPS.inc("priority_tasks", "transaction")
+
+        @firestore.transactional
+        def run(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists and ops[0]["op"] not in REPLACE_OPS:
+                raise LookupError("No priority tasks found")
+            data = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            tasks = data.get("tasks", [])
+            # Lists stored before sources were recorded are treated as edited
+            source = data.get("source", "edited") if snapshot.exists else None
+            message = None
+            changed = False
+            for op in ops:
+                if op["op"] == "refresh" and source not in (None, "generated"):
+                    message = "Kept the edited priority tasks"
+                    continue
+                try:
+                    tasks, message = apply_op(tasks, op)
+                except IndexError:
+                    if len(ops) == 1:
+                        raise
+                    # A concurrent edit moved the list under a queued one
+                    print(f"DEBUG: Dropped stale priority task edit for {user_email}: {op}")
+                    continue
+                source = "generated" if op["op"] in ("generate", "refresh") else "edited"
+                changed = True
+            if changed:
+                transaction.set(doc_ref, {
+                    "tasks": tasks,
+                    "source": source,
+                    "updated_at": firestore.SERVER_TIMESTAMP,
+                    "user_email": user_email
+                })
+            return message
+
+        return run(db.transaction())
+
+    def flush(self, user_email=None):
+        """Commit queued edits for one user, or for everyone when no user is given."""
+        with self._lock:
+            if user_email is None:
+                pending, self._pending = self._pending, {}
+            else:
+                entry = self._pending.pop(user_email, None)
+                pending = {user_email: entry} if entry else {}
+        for email, entry in pending.items():
+            if not entry["ops"]:
+                continue
+            try:
+                self._commit(email, entry["ops"])
+            except Exception as e:
+                print(f"DEBUG: Failed to flush priority tasks for {email}: {str(e)}")
+
+priority_store = PriorityTaskStore()
+atexit.register(priority_store.flush)
+
+def flush_priority_writes(callback_context):
+    """after_agent_callback that commits the turn's queued priority task edits."""
+    if priority_store.write_behind:
+        priority_store.flush(getattr(callback_context, 'user_id', None))
+    return None
@@ -0,0 +1,222 @@
+"""Weighted priority scoring for emails, calendar events and tasks.
+
+Keyword and VIP sender rules live in one RuleMatcher, which scans a
+field of every item at once. Events whose start date is outside the
+window are ruled out without parsing, and only the top k candidates are
+kept, so ranking thousands of items costs a heap rather than a sort.
+"""
+import heapq
+import os
+import time
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from itertools import accumulate
+from operator import itemgetter
+
+URGENT_KEYWORDS = ['urgent', 'asap', 'deadline', 'due', 'important', 'reminder', 'action required']
+
+DEFAULT_WEIGHTS = {
+    "urgency": 3.0,      # per urgent keyword hit, capped at MAX_KEYWORD_HITS
+    "sender": 4.0,       # email from a VIP sender
+    "due": 6.0,          # task due now; decays with days until due
+    "event": 5.0,        # event starting now; decays over EVENT_HORIZON
+    "task": 1.0,         # baseline for any incomplete task
+}
+
+MAX_KEYWORD_HITS = 2
+# Events further out than this are not considered
+EVENT_HORIZON = 24 * 3600
+# Largest UTC offset in use (UTC+14), in seconds
+MAX_UTC_OFFSET = 14 * 3600
+HIGH_PRIORITY_SCORE = 5.0
+MEDIUM_PRIORITY_SCORE = 2.0
+
+def _env_list(name):
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+@lru_cache(maxsize=4096)
+def parse_time(value):
+    """Parse an RFC 3339 timestamp or YYYY-MM-DD date to a Unix timestamp.
+
+    Cached, since task due dates repeat and every refresh rescans them.
+    """
+    if not value:
+        return None
+    try:
+        if value[-1] == 'Z':
+            value = value[:-1] + '+00:00'
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+def priority_label(score):
+    if score >= HIGH_PRIORITY_SCORE:
+        return "high"
+    if score >= MEDIUM_PRIORITY_SCORE:
+        return "medium"
+    return "low"
+
+class RuleMatcher:
+    """Finds literal rules, such as keywords and VIP senders, in many texts at once.
+
+    Each rule maps to a kind. The texts are lowercased and concatenated,
+    and every rule is located with str.find. That scan runs in C, and
+    is several times faster than a regex alternation, which the engine
+    steps through one character at a time. Matches are mapped back to
+    their text by offset.
+    """
+    def __init__(self, rules):
+        self.rules = {rule.lower(): kind for rule, kind in rules.items() if rule}
+
+    def counts(self, texts, kind, cap=MAX_KEYWORD_HITS):
+        """Return {text index: matches of rules of this kind}, for texts with any, capped at cap."""
+        joined = "".join(texts)
+        lowered = joined.lower()
+        if len(lowered) != len(joined):
+            # A few characters lowercase to two; keep offsets per text exact
+            texts = [text.lower() for text in texts]
+            lowered = "".join(texts)
+        ends = list(accumulate(map(len, texts)))
+        find = lowered.find
+        counts = {}
+        for rule, rule_kind in self.rules.items():
+            if rule_kind != kind:
+                continue
+            size = len(rule)
+            at = find(rule)
+            while at != -1:
+                i = bisect_right(ends, at)
+                if at + size > ends[i]:
+                    # Runs into the next text
+                    at = find(rule, at + 1)
+                    continue
+                if counts.get(i, 0) < cap:
+                    counts[i] = counts.get(i, 0) + 1
+                at = find(rule, at + size)
+        return counts
+
+class PriorityScorer:
+    """Scores emails, events and tasks with one rule matcher."""
+    def __init__(self, keywords=None, vip_senders=None, weights=None):
+        keywords = keywords or URGENT_KEYWORDS
+        vip_senders = vip_senders or []
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.matcher = RuleMatcher(dict(
+            [(keyword, "keyword") for keyword in keywords] + [(vip, "vip") for vip in vip_senders]
+        ))
+
+    def candidates(self, emails, events, tasks, now, k=None):
+        """Score items and return (candidates, total).
+
+        candidates holds (score, kind, item) for every item scoring above
+        zero, or when k is given, only for those that can still reach the
+        top k. total counts every item scoring above zero either way.
+        """
+        weights = self.weights
+        urgency, sender = weights["urgency"], weights["sender"]
+        scored = []
+        add = scored.append
+
+        subject_hits = self.matcher.counts([email.get('subject') or '' for email in emails], "keyword")
+        vips = self.matcher.counts([email.get('from') or '' for email in emails], "vip")
+        # Only emails with a match can score
+        for i in sorted(subject_hits.keys() | vips.keys()):
+            score = subject_hits.get(i, 0) * urgency + (sender if i in vips else 0.0)
+            if score > 0:
+                add((score, "email", emails[i]))
+
+        # A start date outside these days cannot be inside the event window
+        # in any time zone, so most events are ruled out without parsing.
+        # Strings compare by prefix, so this also admits any time on last_day.
+        first_day = time.strftime('%Y-%m-%d', time.gmtime(now - 3600 - MAX_UTC_OFFSET))
+        after_last_day = time.strftime('%Y-%m-%d', time.gmtime(now + EVENT_HORIZON + MAX_UTC_OFFSET + 86400))
+        window_start, window_end = now - 3600, now + EVENT_HORIZON
+        event_weight = weights["event"]
+        for event in [event for event in events if first_day <= (event.get('start') or '') < after_last_day]:
+            at = parse_time(event['start'])
+            if at is not None and window_start <= at <= window_end:
+                score = event_weight * (1.0 - max(at - now, 0) / EVENT_HORIZON)
+                if score > 0:
+                    add((score, "calendar", event))
+
+        task_weight, due_weight = weights["task"], weights["due"]
+        open_tasks = [task for task in tasks if task.get('status') != 'completed']
+        due_values = [task.get('due') for task in open_tasks]
+        # Due dates repeat, so each distinct one is parsed and scored once
+        due_scores = {}
+        for value in set(due_values):
+            due = parse_time(value)
+            due_scores[value] = task_weight + (
+                0.0 if due is None else due_weight / (1.0 + max(due - now, 0) / 86400)
+            )
+        # Each task's score without keyword hits, which can only add to it
+        floors = list(map(due_scores.__getitem__, due_values))
+
+        def score_tasks(indices):
+            hits = self.matcher.counts([open_tasks[i].get('title') or '' for i in indices], "keyword")
+            return [(floors[i] + hits.get(j, 0) * urgency, i) for j, i in enumerate(indices)]
+
+        if k is None or task_weight <= 0 or due_weight < 0 or urgency < 0:
+            task_scores = score_tasks(range(len(open_tasks)))
+            total = len(scored) + sum(1 for score, _ in task_scores if score > 0)
+        else:
+            # Only titles that can change the top k are scanned. First come the
+            # tasks already at the k-th best guaranteed score; after that, the
+            # rest whose best case, with every keyword hit, still reaches the
+            # k-th best score found so far. Every open task scores above zero.
+            kth = lambda scores: scores[k - 1] if len(scores) >= k else float('-inf')
+            known = [entry[0] for entry in scored]
+            guaranteed = kth(heapq.nlargest(k, known + heapq.nlargest(k, floors)))
+            first = [i for i, floor in enumerate(floors) if floor >= guaranteed]
+            task_scores = score_tasks(first)
+            best = kth(heapq.nlargest(k, known + [score for score, _ in task_scores]))
+            reach = MAX_KEYWORD_HITS * urgency
+            task_scores += score_tasks([i for i, floor in enumerate(floors) if floor < guaranteed and floor + reach >= best])
+            task_scores.sort(key=itemgetter(1))
+            total = len(scored) + len(open_tasks)
+        for score, i in task_scores:
+            if score > 0:
+                add((score, "google_tasks", open_tasks[i]))
+        return scored, total
+
+    def top_k(self, emails, events, tasks, k=5, now=None):
+        """Return the k highest-scoring items, best first, and how many were candidates."""
+        now = now if now is not None else time.time()
+        scored, total = self.candidates(emails, events, tasks, now, k)
+        # nlargest is stable, so ties keep input order without comparing dicts
+        top = heapq.nlargest(k, scored, key=itemgetter(0))
+        # Output dicts are only built for the winners
+        return [priority_item(score, kind, item) for score, kind, item in top], total
+
+def priority_item(score, kind, item):
+    if kind == "email":
+        result = {
+            "title": f"Respond to: {item.get('subject', 'Email')}",
+            "source": "email",
+            "from": item.get('from', 'Unknown'),
+            "type": "communication"
+        }
+    elif kind == "calendar":
+        result = {
+            "title": f"Attend: {item.get('summary', 'Meeting')}",
+            "source": "calendar",
+            "time": item.get('start', ''),
+            "type": "meeting"
+        }
+    else:
+        result = {
+            "title": item.get('title', 'Task'),
+            "source": "google_tasks",
+            "notes": item.get('notes', ''),
+            "due": item.get('due', ''),
+            "type": "task"
+        }
+    result["score"] = round(score, 2)
+    result["priority"] = priority_label(score)
+    return result
+
+default_scorer = PriorityScorer(
+    keywords=_env_list("PRIORITY_KEYWORDS") or URGENT_KEYWORDS,
+    vip_senders=_env_list("PRIORITY_VIP_SENDERS")
+)
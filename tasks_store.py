@@ -0,0 +1,159 @@
+"""Per-user Google Tasks store kept current with updatedMin.
+
+The first sync walks every task list with full pagination. Later syncs
+ask each list only for tasks updated since the previous sync, including
+deleted and hidden ones, and apply those changes to the local copy.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from api_executor import execute
+from metrics import cache_result
+
+# Seconds a synced task set is served without asking the API for changes
+TASKS_SYNC_MAX_AGE = int(os.getenv("TASKS_SYNC_MAX_AGE", 30))
+# Overlap between incremental syncs to absorb clock skew with Google
+TASKS_SYNC_SKEW = 60
+
+def due_time(task):
+    """Return the task's due date as a Unix timestamp, or None."""
+    if not task.get('due'):
+        return None
+    return datetime.fromisoformat(task['due'].replace('Z', '+00:00')).timestamp()
+
+def tasklist_id_of(task):
+    """Read the task list ID from a task's selfLink."""
+    return task.get('selfLink', '').split('/lists/')[-1].split('/')[0]
+
+def rfc3339(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+class UserTasks:
+    """One user's tasks across all lists, indexed by status and due date."""
+    def __init__(self):
+        self.tasks = {}
+        self.lists = {}
+        self.synced_at = 0.0
+        self.by_status = {}
+        # (sorted due timestamps, matching task IDs), swapped as one tuple
+        self.due_index = ([], [])
+
+    def apply(self, tasklist_id, task):
+        if task.get('deleted'):
+            self.tasks.pop(task['id'], None)
+        else:
+            self.tasks[task['id']] = dict(task, tasklist=tasklist_id)
+
+    def reindex(self):
+        by_status = {}
+        due = []
+        for task_id, task in list(self.tasks.items()):
+            by_status.setdefault(task.get('status', 'needsAction'), set()).add(task_id)
+            ts = due_time(task)
+            if ts is not None:
+                due.append((ts, task_id))
+        due.sort()
+        self.by_status = by_status
+        self.due_index = ([entry[0] for entry in due], [entry[1] for entry in due])
+
+class TasksStore:
+    def __init__(self, max_age=TASKS_SYNC_MAX_AGE):
+        self.max_age = max_age
+        self._users = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _lock_for(self, user_email):
+        with self._lock:
+            return self._locks.setdefault(user_email, threading.Lock())
+
+    def sync(self, user_email, service, force=False):
+        """Bring the user's tasks up to date unless synced within max_age seconds."""
+        user = self._users.get(user_email)
+        fresh = bool(user and not force and time.time() - user.synced_at < self.max_age)
+        cache_result("tasks_store", fresh)
+        if fresh:
+            return user
+
+        with self._lock_for(user_email):
+            user = self._users.get(user_email)
+            if user and not force and time.time() - user.synced_at < self.max_age:
+                return user
+            if user is None:
+                user = UserTasks()
+                self._sync(user, service, updated_min=None)
+                self._users[user_email] = user
+            else:
+                self._sync(user, service, updated_min=user.synced_at)
+            return user
+
+    def _sync(self, user, service, updated_min):
+        # Take the timestamp first so edits made during the sync are seen next time
+        started_at = time.time()
+        lists = {}
+        page_token = None
+        while True:
+            result = execute(service.tasklists().list(maxResults=100, pageToken=page_token))
+            for tasklist in result.get('items', []):
+                lists[tasklist['id']] = tasklist.get('title', '')
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+
+        # Lists that disappeared take their tasks with them
+        for task_id in [task_id for task_id, task in user.tasks.items() if task['tasklist'] not in lists]:
+            del user.tasks[task_id]
+
+        for tasklist_id in lists:
+            params = {"showCompleted": True, "showHidden": True, "maxResults": 100}
+            if updated_min is not None and tasklist_id in user.lists:
+                params["updatedMin"] = rfc3339(updated_min - TASKS_SYNC_SKEW)
+                params["showDeleted"] = True
+            page_token = None
+            while True:
+                result = execute(service.tasks().list(tasklist=tasklist_id, pageToken=page_token, **params))
+                for task in result.get('items', []):
+                    user.apply(tasklist_id, task)
+                page_token = result.get('nextPageToken')
+                if not page_token:
+                    break
+
+        user.lists = lists
+        user.reindex()
+        user.synced_at = started_at
+
+    def record(self, user_email, tasklist_id, task):
+        """Apply a task the agent just created or changed, without waiting for the next sync."""
+        user = self._users.get(user_email)
+        if user is None:
+            return
+        with self._lock_for(user_email):
+            user.apply(tasklist_id, task)
+            user.reindex()
+
+    def query(self, user_email, status=None, due_after=None, due_before=None, limit=None):
+        """Return tasks filtered by status and due-date range, soonest due first.
+
+        status is 'needsAction' or 'completed'. Tasks without a due date are
+        only included when no due range is given, after the dated ones.
+        """
+        user = self._users.get(user_email)
+        if user is None:
+            return []
+        wanted = user.by_status.get(status, set()) if status else None
+
+        due, due_ids = user.due_index
+        lo = bisect_left(due, due_after) if due_after is not None else 0
+        hi = bisect_right(due, due_before) if due_before is not None else len(due)
+        results = [user.tasks[task_id] for task_id in due_ids[lo:hi]
+                   if task_id in user.tasks and (wanted is None or task_id in wanted)]
+
+        if due_after is None and due_before is None:
+            dated = set(due_ids)
+            results.extend(task for task_id, task in list(user.tasks.items())
+                           if task_id not in dated and (wanted is None or task_id in wanted))
+        return results[:limit] if limit else results
+
+tasks_store = TasksStore()
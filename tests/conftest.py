@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The modules live at the repository root and are not installed as a package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+# As in the benchmarks, smartsolve modules are imported without loading the ADK agent
+sys.path.insert(0, os.path.join(ROOT, "smartsolve"))
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from googleapiclient.errors import HttpError
+from httplib2 import Response
+
+import api_executor
+from api_executor import CircuitBreaker, CircuitOpenError, TokenBucket, execute_batch, is_idempotent
+
+def request(method, method_id):
+    return SimpleNamespace(method=method, methodId=method_id)
+
+class FakeBatch:
+    """Answers every part with its own ID, or fails as a whole."""
+    def __init__(self, callback, error):
+        self.callback = callback
+        self.error = error
+        self.parts = []
+
+    def add(self, request, request_id):
+        self.parts.append(request_id)
+
+    def execute(self):
+        if self.error is not None:
+            raise self.error
+        for request_id in self.parts:
+            self.callback(request_id, {"id": request_id}, None)
+
+class FakeService:
+    def __init__(self, failing_batches):
+        self.failing_batches = failing_batches
+        self.batches = 0
+
+    def new_batch_http_request(self, callback):
+        self.batches += 1
+        error = self.failing_batches.get(self.batches)
+        return FakeBatch(callback, error)
+
+def test_reads_and_listed_posts_are_idempotent():
+    assert is_idempotent(request("GET", "gmail.users.messages.list"))
+    assert is_idempotent(request("DELETE", "calendar.events.delete"))
+    assert is_idempotent(request("POST", "gmail.users.messages.batchModify"))
+
+def test_inserts_sends_and_batch_delete_are_not():
+    assert not is_idempotent(request("POST", "calendar.events.insert"))
+    assert not is_idempotent(request("POST", "gmail.users.messages.send"))
+    # Nothing sends batchDelete any more, so it is not vouched for either
+    assert not is_idempotent(request("POST", "gmail.users.messages.batchDelete"))
+    assert not is_idempotent(SimpleNamespace())
+
+def test_failed_chunk_is_reported_without_losing_other_chunks():
+    error = HttpError(Response({"status": 400}), b"bad batch")
+    service = FakeService({2: error})
+    requests = [request("POST", "tasks.tasks.insert") for _ in range(5)]
+    results = execute_batch(service, requests, batch_size=2)
+    assert service.batches == 3
+    assert results[:2] == [({"id": "0"}, None), ({"id": "1"}, None)]
+    assert results[2:4] == [(None, error), (None, error)]
+    assert results[4] == ({"id": "4"}, None)
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(api_executor.time, "monotonic", clock)
+    return clock
+
+def test_token_bucket_borrows_up_to_max_wait_and_refills(clock):
+    bucket = TokenBucket(rate=2, capacity=4)
+    assert bucket.reserve(4, max_wait=0) == 0
+    # Two more tokens are a second away; taken only if that wait is allowed
+    assert bucket.reserve(2, max_wait=0.5) == 1.0
+    assert bucket.tokens == 0
+    assert bucket.reserve(2, max_wait=1) == 1.0
+    assert bucket.tokens == -2
+    clock.now += 3
+    assert bucket.reserve(4, max_wait=0) == 0
+    clock.now += 100
+    # Refill stops at capacity
+    assert bucket.reserve(5, max_wait=10) == 0.5
+
+def test_circuit_opens_after_threshold_and_probes_after_cooldown(clock):
+    breaker = CircuitBreaker("gmail", threshold=2, cooldown=30)
+    breaker.record_outage()
+    breaker.before_call()
+    breaker.record_outage()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 30
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    # Only one probe goes through at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+def test_failed_probe_reopens_and_inconclusive_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker("gmail", threshold=1, cooldown=30)
+    breaker.record_outage()
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_outage()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_inconclusive()
+    # A 404 says nothing about health, so the next call probes at once
+    breaker.before_call()
+    assert breaker.state == "half_open"
@@ -0,0 +1,48 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from calendar_store import CalendarStore, UserCalendar, event_time
+
+def store_with(events, time_zone="America/New_York"):
+    store = CalendarStore()
+    calendar = UserCalendar()
+    calendar.time_zone = time_zone
+    for event in events:
+        calendar.apply(event)
+    calendar.reindex()
+    store._calendars["user@example.com"] = calendar
+    return store
+
+def test_all_day_dates_start_at_midnight_in_the_calendar_zone():
+    tz = ZoneInfo("America/New_York")
+    assert event_time({"date": "2026-10-20"}, tz) == datetime(2026, 10, 20, tzinfo=tz).timestamp()
+    assert event_time({"dateTime": "2026-10-20T04:00:00Z"}, tz) == datetime(2026, 10, 20, tzinfo=tz).timestamp()
+
+def test_opaque_all_day_events_conflict_like_freebusy():
+    tz = ZoneInfo("America/New_York")
+    store = store_with([
+        {"id": "off", "summary": "Out", "start": {"date": "2026-10-20"}, "end": {"date": "2026-10-21"}},
+        {"id": "holiday", "summary": "Holiday", "transparency": "transparent",
+         "start": {"date": "2026-10-20"}, "end": {"date": "2026-10-21"}},
+        {"id": "meet", "summary": "Meet", "start": {"dateTime": "2026-10-20T10:00:00-04:00"},
+         "end": {"dateTime": "2026-10-20T11:00:00-04:00"},
+         "attendees": [{"self": True, "responseStatus": "declined"}]},
+    ])
+    noon = datetime(2026, 10, 20, 12, tzinfo=tz).timestamp()
+    assert [event["id"] for event in store.conflicts("user@example.com", noon, noon + 3600)] == ["off"]
+    # Just before midnight New York time, the all-day event has not started
+    before = datetime(2026, 10, 19, 23, tzinfo=tz).timestamp()
+    assert store.conflicts("user@example.com", before, before + 1800) == []
+
+def test_between_orders_by_start_and_includes_long_events():
+    store = store_with([
+        {"id": "b", "start": {"dateTime": "2026-10-20T09:00:00Z"}, "end": {"dateTime": "2026-10-20T10:00:00Z"}},
+        {"id": "a", "start": {"dateTime": "2026-10-18T09:00:00Z"}, "end": {"dateTime": "2026-10-22T10:00:00Z"}},
+        {"id": "c", "start": {"dateTime": "2026-10-21T09:00:00Z"}, "end": {"dateTime": "2026-10-21T10:00:00Z"}},
+    ], time_zone="UTC")
+    start = datetime.fromisoformat("2026-10-20T08:00:00+00:00").timestamp()
+    assert [event["id"] for event in store.between("user@example.com", start, start + 6 * 3600)] == ["a", "b"]
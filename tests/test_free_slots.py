@@ -0,0 +1,38 @@
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo
+
+from free_slots import free_windows, merge_intervals
+
+TZ = ZoneInfo("Europe/Berlin")
+DAY = date(2026, 10, 20)  # a Tuesday
+
+def at(hour, minute=0, day=DAY):
+    return datetime.combine(day, time(hour, minute), TZ).timestamp()
+
+def test_merge_intervals_joins_overlapping_and_touching():
+    assert merge_intervals([(5, 7), (1, 3), (2, 4), (7, 9)]) == [[1, 4], [5, 9]]
+
+def test_gaps_between_busy_intervals_inside_working_hours():
+    busy = [(at(9), at(10)), (at(12), at(13, 30))]
+    windows = free_windows(busy, DAY, DAY, TZ, work_start=time(8), work_end=time(18))
+    assert windows == [(at(8), at(9)), (at(10), at(12)), (at(13, 30), at(18))]
+
+def test_buffer_and_minimum_length():
+    busy = [(at(9), at(10)), (at(10, 50), at(11))]
+    windows = free_windows(busy, DAY, DAY, TZ, work_start=time(8), work_end=time(12),
+                           min_minutes=30, buffer_minutes=10)
+    # 10:10-10:40 is exactly 30 minutes; 11:10-12:00 is 50
+    assert windows == [(at(8), at(8, 50)), (at(10, 10), at(10, 40)), (at(11, 10), at(12))]
+
+def test_event_spanning_days_blocks_both():
+    busy = [(at(17), at(9, day=date(2026, 10, 21)))]
+    windows = free_windows(busy, DAY, date(2026, 10, 21), TZ, work_start=time(8), work_end=time(18))
+    assert windows == [(at(8), at(17)), (at(9, day=date(2026, 10, 21)), at(18, day=date(2026, 10, 21)))]
+
+def test_not_before_and_weekends():
+    saturday = date(2026, 10, 24)
+    windows = free_windows([], DAY, saturday, TZ, work_start=time(8), work_end=time(18),
+                           not_before=at(15), include_weekends=False)
+    assert windows[0] == (at(15), at(18))
+    assert all(datetime.fromtimestamp(start, TZ).weekday() < 5 for start, _ in windows)
+    assert len(windows) == 4
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("google.cloud.firestore")
+
+from priority_store import PRIORITY_TASK_LIMIT, PriorityTaskStore, apply_op
+
+TASKS = [{"title": "a"}, {"title": "b"}, {"title": "c"}]
+
+def test_replace_ops_keep_at_most_the_limit():
+    many = [{"title": str(i)} for i in range(PRIORITY_TASK_LIMIT + 3)]
+    for name in ("store", "generate", "refresh"):
+        tasks, message = apply_op(TASKS, {"op": name, "tasks": many})
+        assert tasks == many[:PRIORITY_TASK_LIMIT]
+        assert message == f"Stored {PRIORITY_TASK_LIMIT} priority tasks"
+
+def test_update_and_delete_return_new_lists():
+    tasks, message = apply_op(TASKS, {"op": "update", "index": 1, "task": {"title": "B"}})
+    assert [t["title"] for t in tasks] == ["a", "B", "c"]
+    assert message == "Updated task 2"
+    tasks, message = apply_op(TASKS, {"op": "delete", "index": 0})
+    assert [t["title"] for t in tasks] == ["b", "c"]
+    assert message == "Deleted task: a"
+    # The input list is never changed in place
+    assert [t["title"] for t in TASKS] == ["a", "b", "c"]
+
+@pytest.mark.parametrize("index", [-1, 3])
+def test_out_of_range_index_raises(index):
+    with pytest.raises(IndexError):
+        apply_op(TASKS, {"op": "delete", "index": index})
+
+class FakeDoc:
+    def __init__(self):
+        self.written = []
+
+    def set(self, data):
+        self.written.append(data)
+
+def test_store_and_generate_write_with_one_set(monkeypatch):
+    store = PriorityTaskStore(write_behind=False)
+    doc = FakeDoc()
+    monkeypatch.setattr(store, "_doc", lambda user_email: doc)
+    monkeypatch.setattr(store, "_commit", lambda *args: pytest.fail("replace ops must not open a transaction"))
+    store.mutate("user@example.com", {"op": "generate", "tasks": TASKS})
+    store.mutate("user@example.com", {"op": "store", "tasks": TASKS[:1]})
+    assert [(data["source"], len(data["tasks"])) for data in doc.written] == [("generated", 3), ("edited", 1)]
+
+def test_flush_skips_empty_queues(monkeypatch):
+    store = PriorityTaskStore(write_behind=True)
+    store._pending["user@example.com"] = {"base": TASKS, "ops": []}
+    monkeypatch.setattr(store, "_commit", lambda *args: pytest.fail("nothing to commit"))
+    store.flush()
+    assert store._pending == {}
@@ -0,0 +1,47 @@
+from bench_prompt_size import fixtures
+from prompt_serializer import estimate_tokens, event_line, group_events, serialize_schedule
+
+NOW = 1_800_000_000
+
+def test_compact_prompt_is_at_least_80_percent_smaller():
+    tasks, events = fixtures(40, 14)
+    raw = f"Analyze and optimize this schedule: Tasks: {tasks}, Events: {events}"
+    compact = "Analyze and optimize this schedule:\n" + serialize_schedule(tasks, events, budget=10**6)
+
+    assert "omitted" not in compact
+    assert len(compact.encode()) <= 0.2 * len(raw.encode())
+    assert estimate_tokens(compact) <= 0.2 * estimate_tokens(raw)
+
+def test_budget_truncation_stays_under_limit():
+    tasks, events = fixtures(200, 30)
+    for budget in (100, 300, 1500):
+        text = serialize_schedule(tasks, events, budget=budget)
+        assert estimate_tokens(text) <= budget
+        assert "omitted" in text
+
+def test_recurring_instances_collapse_to_one_line():
+    tasks, events = fixtures(0, 5)
+    text = serialize_schedule([], events, budget=10**6)
+    assert text.count("Daily standup") == 1
+    assert "recurring x5" in text
+
+def test_one_off_events_with_same_title_and_time_stay_apart():
+    events = [
+        {"id": "a", "summary": "Sync", "start": {"dateTime": "2026-10-20T10:00:00+00:00"},
+         "end": {"dateTime": "2026-10-20T11:00:00+00:00"}},
+        {"id": "b", "summary": "Sync", "start": {"dateTime": "2026-10-21T10:00:00+00:00"},
+         "end": {"dateTime": "2026-10-21T11:00:00+00:00"}},
+    ]
+    assert len(group_events(events)) == 2
+
+def test_event_without_end_prints_start_alone():
+    event = {"id": "a", "summary": "Open", "start": {"dateTime": "2026-10-21T10:00:00+00:00"}}
+    _, _, line = event_line([event], NOW)
+    assert line == "Open | 2026-10-21 10:00"
+
+def test_completed_tasks_are_dropped_before_open_ones():
+    tasks = [{"title": f"Done {i}", "status": "completed"} for i in range(50)]
+    tasks.append({"title": "Still open", "status": "needsAction", "due": "2026-10-20T00:00:00.000Z"})
+    text = serialize_schedule(tasks, [], budget=40, now=NOW)
+    assert "Still open | due 2026-10-20" in text
+    assert "less relevant tasks omitted" in text
@@ -0,0 +1,80 @@
+import random
+from datetime import datetime, timezone
+
+from bench_scoring import synthetic_items
+from scoring import MAX_KEYWORD_HITS, PriorityScorer, RuleMatcher, parse_time, priority_item
+
+NOW = datetime.now(timezone.utc).timestamp()
+
+def reference(scorer, emails, events, tasks, now):
+    """Score every item one at a time, as the engine is meant to."""
+    w = scorer.weights
+    keywords = [rule for rule, kind in scorer.matcher.rules.items() if kind == "keyword"]
+    vips = [rule for rule, kind in scorer.matcher.rules.items() if kind == "vip"]
+
+    def hits(text):
+        text = (text or '').lower()
+        return min(sum(text.count(keyword) for keyword in keywords), MAX_KEYWORD_HITS)
+
+    scored = []
+    for email in emails:
+        sender = (email.get('from') or '').lower()
+        score = hits(email.get('subject')) * w["urgency"] + (w["sender"] if any(v in sender for v in vips) else 0.0)
+        scored.append((score, "email", email))
+    for event in events:
+        at = parse_time(event.get('start'))
+        if at is not None and now - 3600 <= at <= now + 24 * 3600:
+            scored.append((w["event"] * (1.0 - max(at - now, 0) / (24 * 3600)), "calendar", event))
+    for task in tasks:
+        if task.get('status') == 'completed':
+            continue
+        due = parse_time(task.get('due'))
+        score = w["task"] + (0.0 if due is None else w["due"] / (1.0 + max(due - now, 0) / 86400))
+        scored.append((score + hits(task.get('title')) * w["urgency"], "google_tasks", task))
+    scored = [entry for entry in scored if entry[0] > 0]
+    return sorted(scored, key=lambda entry: -entry[0]), len(scored)
+
+def test_top_k_matches_full_sort():
+    emails, events, tasks = synthetic_items(3000, seed=3)
+    scorer = PriorityScorer(vip_senders=['user1@example.com', 'ceo@'])
+    ranked, total = reference(scorer, emails, events, tasks, NOW)
+    for k in (1, 5, 50, 5000):
+        top, analyzed = scorer.top_k(emails, events, tasks, k=k, now=NOW)
+        assert top == [priority_item(*entry) for entry in ranked[:k]]
+        assert analyzed == total
+
+def test_top_k_matches_full_sort_with_custom_weights():
+    emails, events, tasks = synthetic_items(600, seed=11)
+    rng = random.Random(5)
+    for _ in range(20):
+        weights = {name: rng.choice([0.0, 0.5, 2.0, 9.0]) for name in ("urgency", "sender", "due", "event", "task")}
+        scorer = PriorityScorer(vip_senders=['user7@'], weights=weights)
+        ranked, total = reference(scorer, emails, events, tasks, NOW)
+        top, analyzed = scorer.top_k(emails, events, tasks, k=5, now=NOW)
+        assert top == [priority_item(*entry) for entry in ranked[:5]]
+        assert analyzed == total
+
+def test_rule_matcher_counts_per_text_and_caps():
+    matcher = RuleMatcher({"urgent": "keyword", "due": "keyword", "boss@": "vip"})
+    texts = ["URGENT: due today, urgent", "", "nothing", "urg", "ent due"]
+    assert matcher.counts(texts, "keyword") == {0: 2, 4: 1}
+    assert matcher.counts(texts, "keyword", cap=5) == {0: 3, 4: 1}
+    assert matcher.counts(["a@x", "Boss@x"], "vip") == {1: 1}
+
+def test_rule_matcher_handles_characters_that_lowercase_longer():
+    # "İ" lowercases to two characters, which would shift joined offsets
+    matcher = RuleMatcher({"asap": "keyword"})
+    assert matcher.counts(["İİİ", "reply asap"], "keyword") == {1: 1}
+
+def test_events_outside_window_are_not_candidates():
+    scorer = PriorityScorer()
+    now = datetime(2026, 10, 17, 12, tzinfo=timezone.utc).timestamp()
+    events = [
+        {"summary": "soon", "start": "2026-10-17T13:00:00Z"},
+        {"summary": "next week", "start": "2026-10-24T13:00:00Z"},
+        {"summary": "far offset", "start": "2026-10-16T23:30:00-14:00"},
+        {"summary": "undated", "start": ""},
+    ]
+    top, total = scorer.top_k([], events, [], k=5, now=now)
+    assert [item["title"] for item in top] == ["Attend: soon", "Attend: far offset"]
+    assert total == 2
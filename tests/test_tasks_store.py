@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from tasks_store import TasksStore, UserTasks, due_time
+
+USER = "user@example.com"
+
+def store_with(tasks):
+    store = TasksStore()
+    user = UserTasks()
+    for task in tasks:
+        user.apply("list1", task)
+    user.reindex()
+    store._users[USER] = user
+    return store
+
+def task(task_id, due=None, status="needsAction"):
+    return {"id": task_id, "title": task_id, "status": status, **({"due": due} if due else {})}
+
+STORE_TASKS = [
+    task("later", "2026-10-25T00:00:00.000Z"),
+    task("undated"),
+    task("soon", "2026-10-18T00:00:00.000Z"),
+    task("done", "2026-10-19T00:00:00.000Z", status="completed"),
+    task("done-undated", status="completed"),
+]
+
+def ids(tasks):
+    return [t["id"] for t in tasks]
+
+def test_query_orders_by_due_with_undated_last():
+    store = store_with(STORE_TASKS)
+    assert ids(store.query(USER)) == ["soon", "done", "later", "undated", "done-undated"]
+    assert ids(store.query(USER, limit=2)) == ["soon", "done"]
+
+def test_query_filters_status_and_due_range():
+    store = store_with(STORE_TASKS)
+    assert ids(store.query(USER, status="needsAction")) == ["soon", "later", "undated"]
+    assert ids(store.query(USER, status="completed")) == ["done", "done-undated"]
+    # A due range leaves out undated tasks; both ends are inclusive
+    before = due_time(task("x", "2026-10-19T00:00:00.000Z"))
+    assert ids(store.query(USER, due_before=before)) == ["soon", "done"]
+    assert ids(store.query(USER, status="needsAction", due_after=before)) == ["later"]
+
+def test_deleted_tasks_leave_the_index():
+    store = store_with(STORE_TASKS)
+    store.record(USER, "list1", {"id": "soon", "deleted": True})
+    assert "soon" not in ids(store.query(USER))
+    assert store.query("nobody@example.com") == []
@@ -1,18 +1,65 @@
 import json
-import os
+import threading
 from datetime import datetime, timedelta
-from google.auth.transport.requests import Request
+from functools import lru_cache
 from google.oauth2.credentials import Credentials
 from google.cloud import firestore
+from client_registry import get_auth_request, get_firestore_client
+from metrics import FIRESTORE_OPS, TOKEN_REFRESHES, cache_result
+
+# Refresh access tokens this long before Google considers them expired
+EXPIRY_MARGIN = timedelta(minutes=5)
+# Cache lifetime for credentials whose expiry is unknown
+DEFAULT_CACHE_TTL = timedelta(minutes=5)
+
+@lru_cache(maxsize=1)
+def load_client_secret():
+    """Load the OAuth web client config once per process."""
+    with open("client-secret.json", 'r') as f:
+        return json.load(f)["web"]
+
+class CredentialCache:
+    """In-process credential cache keyed by user email.
+
+    Entries expire with the access token. Each user has their own lock so
+    concurrent misses collapse into one Firestore read and one refresh.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_email):
+        entry = self._entries.get(user_email)
+        if entry and datetime.utcnow() < entry[1]:
+            return entry[0]
+        return None
+
+    def put(self, user_email, credentials):
+        if credentials.expiry:
+            expires_at = credentials.expiry - EXPIRY_MARGIN
+        else:
+            expires_at = datetime.utcnow() + DEFAULT_CACHE_TTL
+        self._entries[user_email] = (credentials, expires_at)
+
+    def invalidate(self, user_email):
+        self._entries.pop(user_email, None)
+
+    def lock_for(self, user_email):
+        with self._lock:
+            return self._locks.setdefault(user_email, threading.Lock())
+
+# Shared by every TokenVault in the process
+credential_cache = CredentialCache()
 
 class TokenVault:
     def __init__(self):
-        # Set the path to the firestore key file
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'firestore-key.json'
-        self.db = firestore.Client(database='smartsolve')
+        self.db = get_firestore_client()
         self.collection = 'user_tokens'
-    
+        self.cache = credential_cache
+
     def store_token(self, user_email, credentials):
+        FIRESTORE_OPS.inc(self.collection, "write")
         doc_ref = self.db.collection(self.collection).document(user_email)
         doc_ref.set({
             "access_token": credentials.token,
@@ -23,14 +70,49 @@ class TokenVault:
             "expires_at": credentials.expiry.isoformat() if credentials.expiry else None,
             "updated_at": firestore.SERVER_TIMESTAMP
         })
-    
+        self.cache.put(user_email, credentials)
+
     def get_token(self, user_email):
+        credentials = self.cache.get(user_email)
+        cache_result("credentials", credentials is not None)
+        if credentials:
+            return credentials
+
+        # Only one thread per user reads Firestore and refreshes; the rest
+        # wait here and pick up its result from the cache.
+        with self.cache.lock_for(user_email):
+            credentials = self.cache.get(user_email)
+            if credentials:
+                return credentials
+
+            credentials = self._load_token(user_email)
+            if credentials is None:
+                return None
+
+            if self._needs_refresh(credentials):
+                try:
+                    credentials.refresh(get_auth_request())
+                except Exception:
+                    TOKEN_REFRESHES.inc("error")
+                    raise
+                TOKEN_REFRESHES.inc("ok")
+                self.store_token(user_email, credentials)
+            else:
+                self.cache.put(user_email, credentials)
+
+            return credentials
+
+    def invalidate(self, user_email):
+        self.cache.invalidate(user_email)
+
+    def _load_token(self, user_email):
+        FIRESTORE_OPS.inc(self.collection, "read")
         doc_ref = self.db.collection(self.collection).document(user_email)
         doc = doc_ref.get()
-        
+
         if not doc.exists:
             return None
-        
+
         token_data = doc.to_dict()
         credentials = Credentials(
             token=token_data["access_token"],
@@ -39,18 +121,31 @@ class TokenVault:
             client_id=token_data.get("client_id") or self._get_client_id(),
             client_secret=token_data.get("client_secret") or self._get_client_secret()
         )
-        
-        # Refresh if expired
-        if credentials.expired:
-            credentials.refresh(Request())
-            self.store_token(user_email, credentials)
-        
+        if token_data.get("expires_at"):
+            credentials.expiry = datetime.fromisoformat(token_data["expires_at"])
         return credentials
-    
+
+    def _needs_refresh(self, credentials):
+        # Without a known expiry we cannot tell how long the token is good for,
+        # so refresh once to learn it.
+        if not credentials.expiry:
+            return bool(credentials.refresh_token)
+        return datetime.utcnow() >= credentials.expiry - EXPIRY_MARGIN
+
     def _get_client_id(self):
-        with open("client-secret.json", 'r') as f:
-            return json.load(f)["web"]["client_id"]
-    
+        return load_client_secret()["client_id"]
+
     def _get_client_secret(self):
-        with open("client-secret.json", 'r') as f:
-            return json.load(f)["web"]["client_secret"]
\ No newline at end of file
+        return load_client_secret()["client_secret"]
+
+_vault = None
+_vault_lock = threading.Lock()
+
+def get_vault():
+    """Return the process-wide TokenVault."""
+    global _vault
+    if _vault is None:
+        with _vault_lock:
+            if _vault is None:
+                _vault = TokenVault()
+    return _vault